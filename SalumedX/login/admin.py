@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Producto, Farmacia, Sucursal, ProductoFarmacia, Medico, Paciente, Receta, DetalleReceta, DetallePrescripcion
+from .models import Producto, Farmacia, Sucursal, ProductoFarmacia, ResumenPrecioProducto, Medico, Paciente, Receta, DetalleReceta, DetallePrescripcion
 
 # Register your models here.
 
@@ -46,6 +46,17 @@ class SucursalAdmin(admin.ModelAdmin):
     list_filter = ('farmacia',)
     search_fields = ('ubicacion', 'farmacia__nombre_comercial')
 
+# Resumen de precios (se mantiene automáticamente, solo lectura)
+@admin.register(ResumenPrecioProducto)
+class ResumenPrecioProductoAdmin(admin.ModelAdmin):
+    list_display = ('producto', 'precio_minimo', 'precio_maximo', 'precio_promedio', 'total_farmacias', 'farmacia_mas_barata')
+    search_fields = ('producto__nombre_comercial', 'producto__nombre_generico')
+    readonly_fields = ('producto', 'precio_minimo', 'precio_maximo', 'precio_promedio',
+                       'total_farmacias', 'farmacia_mas_barata', 'fecha_actualizacion')
+
+    def has_add_permission(self, request):
+        return False
+
 # Registrar otros modelos
 admin.site.register(Medico)
 admin.site.register(Paciente)
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class LoginConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'login'
+
+    def ready(self):
+        # Registrar señales (índice de búsqueda, etc.)
+        from login import signals  # noqa: F401
@@ -0,0 +1,43 @@
+"""
+Autenticación de DRF a partir del resultado de JWTAuthenticationMiddleware.
+
+El middleware ya verificó el token (login/services/cache_autenticacion.py) y
+cargó el usuario; esta clase solo se lo entrega a DRF, así cada petición hace
+una sola verificación del JWT y a lo sumo una consulta del usuario, en lugar
+de repetir ambas en rest_framework_simplejwt.authentication.JWTAuthentication.
+
+Responde igual que la clase de simplejwt a la que reemplaza en
+REST_FRAMEWORK['DEFAULT_AUTHENTICATION_CLASSES']:
+- Sin header 'Authorization: Bearer ...' no autentica (sigue SessionAuthentication)
+- Token inválido, expirado, de refresco o de un usuario inexistente o inactivo: 401
+  con code 'token_not_valid'
+"""
+from rest_framework.authentication import BaseAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from login.middleware import autenticar_jwt
+
+
+class JWTMiddlewareAuthentication(BaseAuthentication):
+    """
+    Usa request.jwt_user / request.jwt_payload del middleware como (user, auth) de DRF
+    """
+    www_authenticate_realm = 'api'
+
+    def authenticate(self, request):
+        django_request = request._request
+        if not hasattr(django_request, 'jwt_user'):
+            # Petición que no pasó por el middleware (ej: APIRequestFactory)
+            autenticar_jwt(django_request)
+
+        user = django_request.jwt_user
+        if user is not None:
+            return user, django_request.jwt_payload
+
+        if not request.META.get('HTTP_AUTHORIZATION', '').startswith('Bearer '):
+            return None
+        if django_request.jwt_expired:
+            raise InvalidToken('Token expirado')
+        raise InvalidToken(django_request.jwt_error or 'Usuario no encontrado o inactivo')
+
+    def authenticate_header(self, request):
+        return f'Bearer realm="{self.www_authenticate_realm}"'
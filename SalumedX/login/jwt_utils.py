@@ -145,9 +145,112 @@ def format_remaining_time(remaining_time):
     return f"{minutes}m"
 
 
+class TokenInfo:
+    """
+    Resultado de inspeccionar un token JWT una sola vez
+    
+    Si el middleware ya verificó el token (request.jwt_payload), se usa ese
+    payload sin volver a decodificar; si no, se decodifica una vez (firma
+    verificada, expiración calculada aquí a partir de 'exp').
+    """
+    
+    def __init__(self, token=None, payload=None, signature_valid=False):
+        self.token = token
+        self.payload = payload
+        self.signature_valid = signature_valid
+        self.now = datetime.now()
+    
+    @classmethod
+    def from_token(cls, token):
+        try:
+            payload = jwt.decode(
+                token,
+                settings.SECRET_KEY,
+                algorithms=['HS256'],
+                options={'verify_exp': False}
+            )
+            return cls(token, payload, signature_valid=True)
+        except jwt.InvalidTokenError:
+            return cls(token)
+    
+    @classmethod
+    def from_request(cls, request):
+        auth_header = request.META.get('HTTP_AUTHORIZATION', '')
+        if not auth_header.startswith('Bearer '):
+            return cls()
+        
+        token = auth_header.split(' ')[1]
+        payload = getattr(request, 'jwt_payload', None)
+        if payload is not None:
+            # Ya verificado por JWTAuthenticationMiddleware para este mismo header
+            return cls(token, payload, signature_valid=True)
+        return cls.from_token(token)
+    
+    @property
+    def has_token(self):
+        return self.token is not None
+    
+    @property
+    def user_id(self):
+        return self.payload.get('user_id') if self.payload else None
+    
+    @property
+    def expiration_time(self):
+        exp_timestamp = self.payload.get('exp') if self.payload else None
+        return datetime.fromtimestamp(exp_timestamp) if exp_timestamp else None
+    
+    @property
+    def remaining_time(self):
+        """timedelta hasta la expiración, o None si ya expiró o no tiene 'exp'"""
+        exp_time = self.expiration_time
+        if not exp_time or self.now >= exp_time:
+            return None
+        return exp_time - self.now
+    
+    @property
+    def expired(self):
+        """True si expiró o no es válido (igual que is_token_expired)"""
+        if not self.signature_valid:
+            return True
+        exp_time = self.expiration_time
+        return bool(exp_time) and self.now >= exp_time
+    
+    def as_dict(self):
+        if not self.has_token:
+            return {
+                'has_token': False,
+                'error': 'No token provided'
+            }
+        
+        token = self.token
+        exp_time = self.expiration_time
+        remaining = self.remaining_time
+        info = {
+            'has_token': True,
+            'token': token[:20] + '...' if len(token) > 20 else token,
+            'expired': self.expired,
+            'user_id': self.user_id,
+            'expiration_time': exp_time.isoformat() if exp_time else None,
+            'remaining_time': format_remaining_time(remaining) if remaining else 'Expirado',
+            'remaining_seconds': int(remaining.total_seconds()) if remaining else 0
+        }
+        
+        # Agregar información adicional del payload
+        if self.payload:
+            info['payload'] = {
+                'username': self.payload.get('username'),
+                'email': self.payload.get('email'),
+                'tipo_usuario': self.payload.get('tipo_usuario'),
+                'is_staff': self.payload.get('is_staff', False)
+            }
+        
+        return info
+
+
 def get_token_info(request):
     """
     Obtiene información completa sobre el token JWT del request
+    (una sola decodificación, o ninguna si el middleware ya lo verificó)
     
     Args:
         request: Request de Django
@@ -155,39 +258,4 @@ def get_token_info(request):
     Returns:
         dict: Información del token (user_id, expiración, tiempo restante, etc.)
     """
-    auth_header = request.META.get('HTTP_AUTHORIZATION', '')
-    
-    if not auth_header.startswith('Bearer '):
-        return {
-            'has_token': False,
-            'error': 'No token provided'
-        }
-    
-    token = auth_header.split(' ')[1]
-    
-    # Obtener información del token
-    payload = get_token_payload(token)
-    exp_time = get_token_expiration_time(token)
-    remaining = get_token_remaining_time(token)
-    expired = is_token_expired(token)
-    
-    info = {
-        'has_token': True,
-        'token': token[:20] + '...' if len(token) > 20 else token,
-        'expired': expired,
-        'user_id': payload.get('user_id') if payload else None,
-        'expiration_time': exp_time.isoformat() if exp_time else None,
-        'remaining_time': format_remaining_time(remaining) if remaining else 'Expirado',
-        'remaining_seconds': int(remaining.total_seconds()) if remaining else 0
-    }
-    
-    # Agregar información adicional del payload
-    if payload:
-        info['payload'] = {
-            'username': payload.get('username'),
-            'email': payload.get('email'),
-            'tipo_usuario': payload.get('tipo_usuario'),
-            'is_staff': payload.get('is_staff', False)
-        }
-    
-    return info
+    return TokenInfo.from_request(request).as_dict()
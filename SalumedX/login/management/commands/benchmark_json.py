@@ -0,0 +1,120 @@
+import io
+import json
+import time
+from datetime import date, datetime, time as hora, timedelta
+from decimal import Decimal
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from login.management.commands.benchmark_serializacion import instancias_sinteticas
+from login.parsers import JSONRapidoParser, orjson
+from login.renderers import JSONRapidoRenderer
+from login.serializers import ProductoSerializer, ProductoFarmaciaSerializer, SucursalSerializer
+from login.services.serializacion_rapida import serializar_rapido
+
+
+class Command(BaseCommand):
+    help = (
+        'Compara JSONRapidoRenderer/JSONRapidoParser con los de DRF en los listados grandes '
+        'y en cuerpos POST masivos: verifica que el resultado sea idéntico y mide ambos'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--filas', type=int, default=10000, help='Filas por listado / elementos por cuerpo')
+        parser.add_argument('--repeticiones', type=int, default=5, help='Se toma el mejor tiempo')
+
+    def _medir(self, funcion, repeticiones):
+        mejor = None
+        for _ in range(repeticiones):
+            inicio = time.perf_counter()
+            resultado = funcion()
+            duracion = time.perf_counter() - inicio
+            mejor = duracion if mejor is None else min(mejor, duracion)
+        return resultado, mejor
+
+    def _respuestas(self, filas):
+        """Cuerpos de respuesta con la forma de los listados grandes"""
+        productos, precios, sucursales = instancias_sinteticas(filas)
+        precios_data = serializar_rapido(precios, ProductoFarmaciaSerializer)
+
+        catalogo = []
+        for producto, precio in zip(productos, precios_data):
+            producto_dict = serializar_rapido(producto, ProductoSerializer, many=False)
+            producto_dict['precios_por_farmacia'] = [precio]
+            producto_dict['precio_minimo'] = producto_dict['precio_maximo'] = float(precio['precio'])
+            producto_dict['precio_promedio'] = float(precio['precio'])
+            catalogo.append(producto_dict)
+
+        ahora = timezone.now()
+        # Valores que llegan al renderer sin pasar por un serializer (estadísticas, fechas)
+        crudos = [
+            {'precio': Decimal(i) / 100, 'fecha': ahora - timedelta(minutes=i, microseconds=i),
+             'local': datetime(2024, 1, 1, 8) + timedelta(seconds=i), 'hora': hora(i % 24, i % 60),
+             'dia': date(2024, 1, 1) + timedelta(days=i % 365), 'nombre': f'Ítem {i}'}
+            for i in range(filas)
+        ]
+        return (
+            ('/productos/', {'success': True, 'productos': catalogo, 'total': len(catalogo)}),
+            ('/productos-farmacias/', {'success': True, 'resultados': precios_data, 'total': len(precios_data)}),
+            ('/sucursales/', {'sucursales': serializar_rapido(sucursales, SucursalSerializer)}),
+            ('Decimal/datetime sin serializar', {'filas': crudos}),
+        )
+
+    def _cuerpos(self, filas):
+        """Cuerpos POST masivos"""
+        receta = {
+            'paciente': 1, 'fecha_emision': '2024-05-01', 'diagnostico': 'Control',
+            'detalles': [
+                {'producto': i, 'cantidad': 1 + i % 3, 'dosis': '500mg cada 8 horas',
+                 'presentacion': 'Tabletas', 'duracion_tratamiento': '7 días',
+                 'instrucciones': 'Tomar después de las comidas'}
+                for i in range(1, filas + 1)
+            ],
+        }
+        precios = {'precios': [
+            {'producto': i, 'farmacia': 1 + i % 50, 'precio': round(1.25 + i % 997, 2)}
+            for i in range(1, filas + 1)
+        ]}
+        return (
+            ('POST /recetas/ (detalles)', json.dumps(receta, ensure_ascii=False).encode()),
+            ('POST precios masivos', json.dumps(precios).encode()),
+        )
+
+    def handle(self, *args, **options):
+        filas = options['filas']
+        repeticiones = options['repeticiones']
+        if orjson is None:
+            self.stdout.write(self.style.WARNING(
+                'orjson no está instalado: JSONRapidoRenderer/JSONRapidoParser usan json estándar'
+            ))
+
+        diferencias = 0
+        drf_renderer, rapido_renderer = JSONRenderer(), JSONRapidoRenderer()
+        for nombre, datos in self._respuestas(filas):
+            esperado, t_drf = self._medir(lambda: drf_renderer.render(datos), repeticiones)
+            obtenido, t_rapido = self._medir(lambda: rapido_renderer.render(datos), repeticiones)
+            iguales = esperado == obtenido
+            diferencias += not iguales
+            self.stdout.write(
+                f'render {nombre}: {len(esperado) / 1024:.0f} KB | DRF {t_drf * 1000:.1f} ms | '
+                f'rápido {t_rapido * 1000:.1f} ms | x{(t_drf / t_rapido) if t_rapido else 0:.1f} | '
+                f'{"idéntico" if iguales else "DIFERENTE"}'
+            )
+
+        drf_parser, rapido_parser = JSONParser(), JSONRapidoParser()
+        for nombre, cuerpo in self._cuerpos(filas):
+            esperado, t_drf = self._medir(lambda: drf_parser.parse(io.BytesIO(cuerpo)), repeticiones)
+            obtenido, t_rapido = self._medir(lambda: rapido_parser.parse(io.BytesIO(cuerpo)), repeticiones)
+            iguales = esperado == obtenido
+            diferencias += not iguales
+            self.stdout.write(
+                f'parse {nombre}: {len(cuerpo) / 1024:.0f} KB | DRF {t_drf * 1000:.1f} ms | '
+                f'rápido {t_rapido * 1000:.1f} ms | x{(t_drf / t_rapido) if t_rapido else 0:.1f} | '
+                f'{"idéntico" if iguales else "DIFERENTE"}'
+            )
+
+        if diferencias:
+            self.stderr.write(self.style.ERROR(f'{diferencias} casos con resultado diferente'))
+        else:
+            self.stdout.write(self.style.SUCCESS('Resultado idéntico en todos los casos'))
@@ -0,0 +1,121 @@
+import json
+import time
+from datetime import timedelta
+from decimal import Decimal
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from rest_framework.utils.encoders import JSONEncoder
+from login.models import Producto, Farmacia, ProductoFarmacia, Sucursal
+from login.serializers import ProductoSerializer, ProductoFarmaciaSerializer, SucursalSerializer
+from login.services.serializacion_rapida import serializar_rapido
+
+
+def instancias_sinteticas(filas):
+    """
+    Instancias en memoria (sin guardar) con sus relaciones asignadas
+
+    Returns:
+        tuple: (productos, precios, sucursales), cada uno con 'filas' elementos
+    """
+    ahora = timezone.now()
+    farmacias = [
+        Farmacia(id_farmacia=i, nombre_comercial=f'Farmacia {i}', horario_atencion='08:00 - 22:00')
+        for i in range(1, 51)
+    ]
+    productos = [
+        Producto(
+            id_producto=i, nombre_generico=f'Paracetamol {i}', nombre_comercial=f'Analgésico {i}',
+            principio_activo='Paracetamol', categoria='Analgésicos', presentacion='Tabletas',
+            concentracion='500mg', requiere_receta=bool(i % 2)
+        )
+        for i in range(1, filas + 1)
+    ]
+    precios = []
+    for i, producto in enumerate(productos, 1):
+        precio = ProductoFarmacia(
+            id_producto_farmacia=i, producto=producto, farmacia=farmacias[i % 50],
+            precio=Decimal(i % 997) + Decimal('0.25')
+        )
+        precio.fecha_actualizacion = ahora - timedelta(seconds=i)
+        precios.append(precio)
+    sucursales = [
+        Sucursal(
+            id_sucursal=i, farmacia=farmacias[i % 50], ubicacion=f'Guayaquil {i}',
+            latitud=Decimal('-2.170998') + Decimal(i) / 10 ** 6,
+            longitud=Decimal('-79.922359') - Decimal(i) / 10 ** 6
+        )
+        for i in range(1, filas + 1)
+    ]
+    return productos, precios, sucursales
+
+
+def _json(datos):
+    return json.dumps(datos, cls=JSONEncoder, sort_keys=False)
+
+
+class Command(BaseCommand):
+    help = (
+        'Compara la serialización precompilada con la de DRF: verifica que la salida '
+        'sea idéntica y mide el tiempo de ambas rutas'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--filas', type=int, default=10000, help='Filas sintéticas por serializer')
+        parser.add_argument('--repeticiones', type=int, default=3, help='Se toma el mejor tiempo')
+        parser.add_argument('--bd', action='store_true',
+                            help='Usar las filas de la base de datos en lugar de datos sintéticos')
+
+    def _de_bd(self, filas):
+        return (
+            list(Producto.objects.all()[:filas]),
+            list(ProductoFarmacia.objects.select_related('producto', 'farmacia')[:filas]),
+            list(Sucursal.objects.select_related('farmacia')[:filas]),
+        )
+
+    def _medir(self, funcion, repeticiones):
+        mejor = None
+        for _ in range(repeticiones):
+            inicio = time.perf_counter()
+            resultado = funcion()
+            duracion = time.perf_counter() - inicio
+            mejor = duracion if mejor is None else min(mejor, duracion)
+        return resultado, mejor
+
+    def handle(self, *args, **options):
+        filas = options['filas']
+        repeticiones = options['repeticiones']
+        productos, precios, sucursales = (
+            self._de_bd(filas) if options['bd'] else instancias_sinteticas(filas)
+        )
+
+        casos = (
+            ('ProductoSerializer', ProductoSerializer, productos),
+            ('ProductoFarmaciaSerializer', ProductoFarmaciaSerializer, precios),
+            ('SucursalSerializer', SucursalSerializer, sucursales),
+        )
+        diferencias = 0
+        for nombre, serializer_class, instancias in casos:
+            drf, t_drf = self._medir(
+                lambda: serializer_class(instancias, many=True).data, repeticiones
+            )
+            rapido, t_rapido = self._medir(
+                lambda: serializar_rapido(instancias, serializer_class), repeticiones
+            )
+
+            # Paridad: mismo JSON (incluido el orden de las claves) fila por fila
+            distintas = sum(1 for a, b in zip(drf, rapido) if _json(a) != _json(b))
+            distintas += abs(len(drf) - len(rapido))
+            diferencias += distintas
+
+            filas_por_seg = lambda t: int(len(instancias) / t) if t else 0
+            self.stdout.write(
+                f'{nombre}: {len(instancias)} filas | '
+                f'DRF {t_drf * 1000:.1f} ms ({filas_por_seg(t_drf)} filas/s) | '
+                f'rápida {t_rapido * 1000:.1f} ms ({filas_por_seg(t_rapido)} filas/s) | '
+                f'x{(t_drf / t_rapido) if t_rapido else 0:.1f} | diferencias: {distintas}'
+            )
+
+        if diferencias:
+            self.stderr.write(self.style.ERROR(f'La salida difiere en {diferencias} filas'))
+        else:
+            self.stdout.write(self.style.SUCCESS('Salida idéntica en todos los serializers'))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from login.services.sincronizacion import purgar_eliminados, RETENCION_DIAS
+
+
+class Command(BaseCommand):
+    help = 'Borra los registros de precios eliminados más antiguos que la retención de /sync/precios/'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dias', type=int, default=RETENCION_DIAS, help='Días de retención')
+        parser.add_argument('--database', default='default', help='Alias de base de datos')
+
+    def handle(self, *args, **options):
+        total = purgar_eliminados(dias=options['dias'], using=options['database'])
+        self.stdout.write(self.style.SUCCESS(f'Registros de eliminación borrados: {total}'))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from login.services.resumen_precios import reconstruir_resumenes
+
+
+class Command(BaseCommand):
+    help = 'Reconstruye desde cero la tabla ResumenPrecioProducto a partir de ProductoFarmacia'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='default', help='Alias de base de datos')
+
+    def handle(self, *args, **options):
+        total = reconstruir_resumenes(using=options['database'])
+        self.stdout.write(self.style.SUCCESS(f'Resumen de precios reconstruido: {total} productos'))
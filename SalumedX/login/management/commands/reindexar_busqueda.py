@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand, CommandError
+from login.models import Producto
+from login.services.busqueda import indice_disponible, reconstruir_indice
+
+
+class Command(BaseCommand):
+    help = 'Reconstruye desde cero el índice de búsqueda de texto completo de Producto'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='default', help='Alias de base de datos')
+
+    def handle(self, *args, **options):
+        using = options['database']
+        if not indice_disponible(using):
+            raise CommandError(
+                'El índice de búsqueda no existe en esta base de datos. Ejecuta "python manage.py migrate".'
+            )
+
+        total = reconstruir_indice(Producto.objects.using(using).iterator(), using=using)
+        self.stdout.write(self.style.SUCCESS(f'Índice de búsqueda reconstruido: {total} productos'))
@@ -5,11 +5,11 @@ Maneja automáticamente la expiración de tokens
 """
 import jwt
 from datetime import datetime
-from django.conf import settings
 from django.http import JsonResponse
 from django.utils.functional import SimpleLazyObject
 from django.contrib.auth.models import AnonymousUser
-from login.models import User
+from login.services.cache_autenticacion import obtener_usuario, verificar_token
+from login.services.principal import resolver_principal
 
 
 def get_user_from_jwt(request):
@@ -25,12 +25,13 @@ def get_user_from_jwt(request):
     token = auth_header.split(' ')[1]
     
     try:
-        # Validar token localmente (firma + expiración automática)
-        payload = jwt.decode(
-            token,
-            settings.SECRET_KEY,
-            algorithms=['HS256']
-        )
+        # Validar token localmente (firma + expiración automática); una vez por token y proceso
+        payload = verificar_token(token)
+        
+        # Solo access tokens (igual que DRF/simplejwt): un refresh token no autentica
+        if payload.get('token_type') != 'access':
+            request.jwt_error = 'Token inválido: se requiere un access token'
+            return None
         
         # Extraer información del payload
         user_id = payload.get('user_id')
@@ -47,19 +48,16 @@ def get_user_from_jwt(request):
                 request.jwt_expired = True
                 return None
         
-        # Obtener usuario de la base de datos local
-        try:
-            user = User.objects.get(id=user_id)
-            if not user.is_active:
-                return None
-            
-            # Guardar información adicional del token
-            request.jwt_payload = payload
-            request.jwt_expired = False
-            
-            return user
-        except User.DoesNotExist:
+        # Obtener usuario (caché por proceso; consulta la base de datos solo si no está)
+        user = obtener_usuario(user_id)
+        if user is None:
             return None
+        
+        # Guardar información adicional del token
+        request.jwt_payload = payload
+        request.jwt_expired = False
+        
+        return user
             
     except jwt.ExpiredSignatureError:
         # Token expirado
@@ -76,6 +74,25 @@ def get_user_from_jwt(request):
         return None
 
 
+def autenticar_jwt(request):
+    """
+    Valida el JWT de la petición una sola vez y deja el resultado en
+    request.jwt_user, jwt_payload, jwt_expired y jwt_error
+    (lo usan el middleware y login.authentication para DRF)
+    
+    También asigna request.principal (rol y perfil del usuario, ver
+    login/services/principal.py), que se resuelve recién cuando una vista lo lee
+    """
+    request.jwt_expired = False
+    request.jwt_error = None
+    request.jwt_payload = None
+    request.jwt_user = get_user_from_jwt(request)
+    request.principal = SimpleLazyObject(
+        lambda: resolver_principal(getattr(request, 'user', None), request.jwt_payload)
+    )
+    return request.jwt_user
+
+
 class JWTAuthenticationMiddleware:
     """
     Middleware que valida JWT localmente desde auth-service
@@ -89,22 +106,13 @@ class JWTAuthenticationMiddleware:
         self.get_response = get_response
     
     def __call__(self, request):
-        # Inicializar flags
-        request.jwt_expired = False
-        request.jwt_error = None
-        request.jwt_payload = None
-        
-        # Extraer usuario del JWT
-        jwt_user = get_user_from_jwt(request)
-        
-        # Asignar jwt_user (lazy)
-        request.jwt_user = jwt_user
+        # Extraer usuario del JWT (DRF lo reutiliza, ver login/authentication.py)
+        jwt_user = autenticar_jwt(request)
         
-        # Asignar request.user para compatibilidad con DRF
-        # Si no hay sesión de Django activa, usar el usuario JWT
-        if not hasattr(request, 'user') or isinstance(request.user, AnonymousUser):
-            if jwt_user:
-                request.user = jwt_user
+        # Asignar request.user para vistas de Django
+        # Si no hay sesión de Django activa, usar el usuario JWT (la sesión solo se consulta si hay JWT)
+        if jwt_user and (not hasattr(request, 'user') or isinstance(request.user, AnonymousUser)):
+            request.user = jwt_user
         
         response = self.get_response(request)
         
@@ -0,0 +1,90 @@
+# Índice de búsqueda de texto completo para Producto (ver login/services/busqueda.py)
+#
+# Las tablas, el SQL y la normalización del texto están copiados aquí a propósito:
+# la migración no importa login.services.busqueda (ni login.models) para que cambios
+# futuros en ese módulo no alteren lo que hace esta migración.
+
+import unicodedata
+
+from django.db import migrations
+from django.db.utils import OperationalError
+
+TABLA_FTS_SQLITE = 'login_producto_fts'
+TABLA_BUSQUEDA_POSTGRES = 'login_producto_busqueda'
+
+
+def normalizar_texto(texto):
+    """Minúsculas y sin tildes (igual que busqueda.normalizar_texto al crear esta migración)"""
+    if not texto:
+        return ''
+    descompuesto = unicodedata.normalize('NFKD', texto)
+    return ''.join(c for c in descompuesto if not unicodedata.combining(c)).lower()
+
+
+def crear_indice(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == 'sqlite':
+        try:
+            schema_editor.execute(
+                f'CREATE VIRTUAL TABLE IF NOT EXISTS {TABLA_FTS_SQLITE} USING fts5('
+                "nombre_comercial, nombre_generico, principio_activo, tokenize='unicode61')"
+            )
+        except OperationalError:
+            # SQLite sin FTS5: la búsqueda seguirá usando icontains
+            return
+        insertar = (
+            f'INSERT INTO {TABLA_FTS_SQLITE} '
+            '(rowid, nombre_comercial, nombre_generico, principio_activo) '
+            'VALUES (%s, %s, %s, %s)'
+        )
+    elif connection.vendor == 'postgresql':
+        schema_editor.execute(
+            f'CREATE TABLE IF NOT EXISTS {TABLA_BUSQUEDA_POSTGRES} ('
+            'producto_id integer PRIMARY KEY REFERENCES login_producto (id_producto) '
+            'ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED, '
+            'documento tsvector NOT NULL)'
+        )
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS {TABLA_BUSQUEDA_POSTGRES}_documento_gin '
+            f'ON {TABLA_BUSQUEDA_POSTGRES} USING GIN (documento)'
+        )
+        insertar = (
+            f'INSERT INTO {TABLA_BUSQUEDA_POSTGRES} (producto_id, documento) VALUES ('
+            "%s, setweight(to_tsvector('simple', %s), 'A') || "
+            "setweight(to_tsvector('simple', %s), 'A') || "
+            "setweight(to_tsvector('simple', %s), 'B')) "
+            'ON CONFLICT (producto_id) DO UPDATE SET documento = EXCLUDED.documento'
+        )
+    else:
+        return
+
+    Producto = apps.get_model('login', 'Producto')
+    productos = Producto.objects.using(connection.alias).values_list(
+        'pk', 'nombre_comercial', 'nombre_generico', 'principio_activo'
+    )
+    filas = [
+        (pk, normalizar_texto(comercial), normalizar_texto(generico), normalizar_texto(activo))
+        for pk, comercial, generico, activo in productos.iterator()
+    ]
+    if filas:
+        with connection.cursor() as cursor:
+            cursor.executemany(insertar, filas)
+
+
+def eliminar_indice(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == 'sqlite':
+        schema_editor.execute(f'DROP TABLE IF EXISTS {TABLA_FTS_SQLITE}')
+    elif connection.vendor == 'postgresql':
+        schema_editor.execute(f'DROP TABLE IF EXISTS {TABLA_BUSQUEDA_POSTGRES}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('login', '0007_remove_producto_precio_base_delete_consultaproducto'),
+    ]
+
+    operations = [
+        migrations.RunPython(crear_indice, eliminar_indice),
+    ]
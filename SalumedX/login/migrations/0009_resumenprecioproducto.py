@@ -0,0 +1,69 @@
+# Generated by Django 5.2.7 on 2026-10-18 07:15
+#
+# El cálculo está copiado aquí a propósito (igual que en 0008): la migración no
+# importa login.services.resumen_precios para que cambios futuros en ese módulo
+# no alteren lo que hace esta migración.
+
+from decimal import Decimal, ROUND_HALF_UP
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Avg, Count, Max, Min
+
+
+def llenar_resumenes(apps, schema_editor):
+    """Un resumen por producto con precios (igual que resumen_precios.reconstruir_resumenes al crear esta migración)"""
+    ProductoFarmacia = apps.get_model('login', 'ProductoFarmacia')
+    ResumenPrecioProducto = apps.get_model('login', 'ResumenPrecioProducto')
+    alias = schema_editor.connection.alias
+    precios = ProductoFarmacia.objects.using(alias)
+
+    stats = precios.values('producto_id').annotate(
+        minimo=Min('precio'), maximo=Max('precio'), promedio=Avg('precio'), total=Count('pk')
+    ).order_by()
+
+    # Primera farmacia de cada producto al recorrer los precios ordenados = la más barata
+    mas_barata = {}
+    for producto_id, farmacia_id in precios.order_by(
+        'producto_id', 'precio', 'farmacia_id'
+    ).values_list('producto_id', 'farmacia_id').iterator():
+        mas_barata.setdefault(producto_id, farmacia_id)
+
+    ResumenPrecioProducto.objects.using(alias).bulk_create([
+        ResumenPrecioProducto(
+            producto_id=fila['producto_id'],
+            precio_minimo=fila['minimo'],
+            precio_maximo=fila['maximo'],
+            precio_promedio=Decimal(fila['promedio']).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP),
+            total_farmacias=fila['total'],
+            farmacia_mas_barata_id=mas_barata.get(fila['producto_id']),
+        )
+        for fila in stats
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('login', '0008_indice_busqueda_producto'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumenPrecioProducto',
+            fields=[
+                ('producto', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='resumen_precios', serialize=False, to='login.producto')),
+                ('precio_minimo', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('precio_maximo', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('precio_promedio', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('total_farmacias', models.PositiveIntegerField(default=0)),
+                ('fecha_actualizacion', models.DateTimeField(auto_now=True)),
+                ('farmacia_mas_barata', models.ForeignKey(blank=True, help_text='Farmacia con el precio mínimo', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='login.farmacia')),
+            ],
+            options={
+                'verbose_name': 'Resumen de Precios de Producto',
+                'verbose_name_plural': 'Resúmenes de Precios de Productos',
+            },
+        ),
+        migrations.RunPython(llenar_resumenes, migrations.RunPython.noop),
+    ]
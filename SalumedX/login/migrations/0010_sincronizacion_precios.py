@@ -0,0 +1,36 @@
+# Generated by Django 5.2.7 on 2026-10-18 07:32
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('login', '0009_resumenprecioproducto'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PrecioEliminado',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('id_producto_farmacia', models.IntegerField(help_text='ID del ProductoFarmacia eliminado')),
+                ('id_producto', models.IntegerField()),
+                ('id_farmacia', models.IntegerField()),
+                ('fecha_eliminacion', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'verbose_name': 'Precio Eliminado',
+                'verbose_name_plural': 'Precios Eliminados',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='productofarmacia',
+            index=models.Index(fields=['fecha_actualizacion', 'id_producto_farmacia'], name='login_pf_fecha_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='precioeliminado',
+            index=models.Index(fields=['fecha_eliminacion', 'id'], name='login_precio_elim_fecha_idx'),
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.7 on 2026-10-18 07:54
+
+from django.db import migrations, models
+
+
+def calcular_geohash(apps, schema_editor):
+    """Completa Sucursal.geohash de las filas existentes"""
+    from login.services.geohash import codificar
+
+    Sucursal = apps.get_model('login', 'Sucursal')
+    sucursales = Sucursal.objects.using(schema_editor.connection.alias)
+    lote = []
+    for sucursal in sucursales.only('id_sucursal', 'latitud', 'longitud').iterator(chunk_size=2000):
+        sucursal.geohash = codificar(sucursal.latitud, sucursal.longitud)
+        lote.append(sucursal)
+        if len(lote) >= 2000:
+            sucursales.bulk_update(lote, ['geohash'])
+            lote = []
+    if lote:
+        sucursales.bulk_update(lote, ['geohash'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('login', '0010_sincronizacion_precios'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sucursal',
+            name='geohash',
+            field=models.CharField(blank=True, default='', editable=False, help_text='Geohash de latitud/longitud (búsquedas por cercanía)', max_length=12),
+        ),
+        migrations.RunPython(calcular_geohash, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='sucursal',
+            index=models.Index(fields=['geohash', 'farmacia'], name='login_sucursal_geohash_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='sucursal',
+            index=models.Index(fields=['latitud', 'longitud'], name='login_sucursal_lat_lng_idx'),
+        ),
+    ]
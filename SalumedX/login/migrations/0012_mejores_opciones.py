@@ -0,0 +1,17 @@
+# Generated by Django 5.2.7 on 2026-10-18 08:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('login', '0011_geohash_sucursal'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='productofarmacia',
+            index=models.Index(fields=['producto', 'precio', 'id_producto_farmacia'], name='login_pf_producto_precio_idx'),
+        ),
+    ]
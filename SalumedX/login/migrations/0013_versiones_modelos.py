@@ -0,0 +1,38 @@
+# Generated by Django 5.2.7 on 2026-10-18 08:22
+
+import django.utils.timezone
+from django.db import migrations, models
+
+# Modelos cuyas escrituras invalidan la caché de respuestas (ver login/signals.py)
+MODELOS_VERSIONADOS = ('login.producto', 'login.farmacia', 'login.sucursal', 'login.productofarmacia')
+
+
+def crear_versiones(apps, schema_editor):
+    """Una fila por modelo, así las lecturas nunca tienen que crearla"""
+    VersionModelo = apps.get_model('login', 'VersionModelo')
+    VersionModelo.objects.using(schema_editor.connection.alias).bulk_create(
+        [VersionModelo(modelo=modelo) for modelo in MODELOS_VERSIONADOS], ignore_conflicts=True
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('login', '0012_mejores_opciones'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VersionModelo',
+            fields=[
+                ('modelo', models.CharField(help_text='app_label.modelo', max_length=100, primary_key=True, serialize=False)),
+                ('version', models.PositiveBigIntegerField(default=0)),
+                ('fecha_actualizacion', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'verbose_name': 'Versión de Modelo',
+                'verbose_name_plural': 'Versiones de Modelos',
+            },
+        ),
+        migrations.RunPython(crear_versiones, migrations.RunPython.noop),
+    ]
@@ -1,5 +1,6 @@
 from django.db import models
 from django.conf import settings
+from django.utils import timezone
 from django.contrib.auth.models import User  #Esta es la entidad base de usuario de Django
 
 # Create your models here.
@@ -92,6 +93,17 @@ class Sucursal(models.Model):
     ubicacion = models.CharField(max_length=100, default='No especificada')
     longitud = models.DecimalField(max_digits=9, decimal_places=6)
     latitud = models.DecimalField(max_digits=9, decimal_places=6)
+    # Se calcula al guardar (ver login/signals.py); bulk_create/update deben asignarlo
+    # con login.services.geohash.codificar()
+    geohash = models.CharField(max_length=12, blank=True, default='', editable=False,
+                               help_text="Geohash de latitud/longitud (búsquedas por cercanía)")
+
+    class Meta:
+        indexes = [
+            # Prefiltro por cercanía: rangos de prefijo de geohash y caja de latitud/longitud
+            models.Index(fields=['geohash', 'farmacia'], name='login_sucursal_geohash_idx'),
+            models.Index(fields=['latitud', 'longitud'], name='login_sucursal_lat_lng_idx'),
+        ]
 
     def __str__(self):
         return f"Sucursal de {self.farmacia.nombre_comercial}"
@@ -110,6 +122,12 @@ class ProductoFarmacia(models.Model):
 
     class Meta:
         unique_together = ('producto', 'farmacia')  # Un producto solo puede tener un precio por farmacia
+        indexes = [
+            # Sincronización incremental /sync/precios/?since=... (keyset sobre fecha, id)
+            models.Index(fields=['fecha_actualizacion', 'id_producto_farmacia'], name='login_pf_fecha_id_idx'),
+            # Precios de un producto de menor a mayor (/productos/<id>/mejores-opciones/)
+            models.Index(fields=['producto', 'precio', 'id_producto_farmacia'], name='login_pf_producto_precio_idx'),
+        ]
         verbose_name = 'Precio de Producto por Farmacia'
         verbose_name_plural = 'Precios de Productos por Farmacia'
 
@@ -117,6 +135,78 @@ class ProductoFarmacia(models.Model):
         return f"{self.producto.nombre_comercial} en {self.farmacia.nombre_comercial} - ${self.precio}"
 
 
+class PrecioEliminado(models.Model):
+    """
+    Registro (tombstone) de un ProductoFarmacia eliminado, para que /sync/precios/
+    informe la eliminación a los clientes que sincronizan de forma incremental.
+    Se crea automáticamente al eliminar un ProductoFarmacia (ver login/signals.py)
+    y se purga con: python manage.py purgar_precios_eliminados
+    """
+    id_producto_farmacia = models.IntegerField(help_text="ID del ProductoFarmacia eliminado")
+    id_producto = models.IntegerField()
+    id_farmacia = models.IntegerField()
+    fecha_eliminacion = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['fecha_eliminacion', 'id'], name='login_precio_elim_fecha_idx'),
+        ]
+        verbose_name = 'Precio Eliminado'
+        verbose_name_plural = 'Precios Eliminados'
+
+    def __str__(self):
+        return f"Precio {self.id_producto_farmacia} eliminado el {self.fecha_eliminacion}"
+
+
+class VersionModelo(models.Model):
+    """
+    Versión de los datos de un modelo del catálogo, compartida por todos los workers.
+    Se incrementa dentro de la misma transacción al guardar o eliminar un Producto,
+    Farmacia, Sucursal o ProductoFarmacia (ver login/signals.py); la usan la caché
+    de respuestas (login/services/cache_respuestas.py) y el GET condicional
+    (login/services/condicional.py).
+    """
+    modelo = models.CharField(max_length=100, primary_key=True, help_text="app_label.modelo")
+    version = models.PositiveBigIntegerField(default=0)
+    fecha_actualizacion = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        verbose_name = 'Versión de Modelo'
+        verbose_name_plural = 'Versiones de Modelos'
+
+    def __str__(self):
+        return f"{self.modelo} v{self.version}"
+
+
+class ResumenPrecioProducto(models.Model):
+    """
+    Resumen desnormalizado de los precios de un producto (una fila por producto con precios).
+    Se actualiza automáticamente al guardar o eliminar un ProductoFarmacia (ver login/signals.py)
+    y se reconstruye con: python manage.py reconstruir_resumen_precios
+    """
+    producto = models.OneToOneField(Producto, on_delete=models.CASCADE, primary_key=True, related_name='resumen_precios')
+    precio_minimo = models.DecimalField(max_digits=10, decimal_places=2)
+    precio_maximo = models.DecimalField(max_digits=10, decimal_places=2)
+    precio_promedio = models.DecimalField(max_digits=10, decimal_places=2)
+    total_farmacias = models.PositiveIntegerField(default=0)
+    farmacia_mas_barata = models.ForeignKey(
+        Farmacia,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+',
+        help_text="Farmacia con el precio mínimo"
+    )
+    fecha_actualizacion = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'Resumen de Precios de Producto'
+        verbose_name_plural = 'Resúmenes de Precios de Productos'
+
+    def __str__(self):
+        return f"{self.producto.nombre_comercial}: ${self.precio_minimo} - ${self.precio_maximo}"
+
+
 class Receta(models.Model):
     id_receta = models.AutoField(primary_key=True)
     medico = models.ForeignKey(Medico, on_delete=models.CASCADE)
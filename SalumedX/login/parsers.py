@@ -0,0 +1,35 @@
+"""
+Parser JSON basado en orjson (ver REST_FRAMEWORK en settings.py).
+
+Decodifica los cuerpos de POST/PUT/PATCH con orjson (mismo resultado que
+json.load: números decimales como float, enteros como int). Si orjson no está
+instalado, el cuerpo no viene en UTF-8 o orjson lo rechaza, se delega en el
+JSONParser de DRF, que devuelve el resultado o el mismo ParseError de siempre.
+"""
+import io
+from django.conf import settings
+from rest_framework.parsers import JSONParser
+
+try:
+    import orjson
+except ImportError:  # Dependencia opcional: sin orjson se usa json de la librería estándar
+    orjson = None
+
+
+class JSONRapidoParser(JSONParser):
+    """
+    JSONParser de DRF con orjson como decodificador cuando está disponible
+    """
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        if orjson is None or encoding.lower().replace('_', '-') not in ('utf-8', 'utf8'):
+            return super().parse(stream, media_type, parser_context)
+
+        cuerpo = stream.read()
+        try:
+            return orjson.loads(cuerpo)
+        except orjson.JSONDecodeError:
+            # JSON inválido o fuera de lo que soporta orjson: DRF decide (y arma el error)
+            return super().parse(io.BytesIO(cuerpo), media_type, parser_context)
@@ -0,0 +1,56 @@
+"""
+Renderer JSON basado en orjson (ver REST_FRAMEWORK en settings.py).
+
+orjson serializa en C los dict/list/str/int/float de las respuestas y también
+datetime/date/time/UUID, con el mismo formato que el JSONEncoder de DRF
+(isoformat, '+00:00' como 'Z'). Decimal se convierte a float como en DRF y lo
+demás (textos traducibles, QuerySet, timedelta...) pasa por el propio
+JSONEncoder.default de DRF, así el resultado es idéntico byte a byte al de
+rest_framework.renderers.JSONRenderer.
+
+Se usa el JSONRenderer estándar de DRF cuando:
+- orjson no está instalado
+- se pide indentación (?format=json con 'Accept: application/json; indent=4',
+  o la API navegable) o ensure_ascii (UNICODE_JSON=False) o COMPACT_JSON=False
+- orjson rechaza los datos (p. ej. enteros de más de 64 bits)
+"""
+from decimal import Decimal
+from rest_framework.renderers import JSONRenderer
+
+try:
+    import orjson
+except ImportError:  # Dependencia opcional: sin orjson se usa json de la librería estándar
+    orjson = None
+
+
+class JSONRapidoRenderer(JSONRenderer):
+    """
+    JSONRenderer de DRF con orjson como codificador cuando está disponible
+    """
+    opciones_orjson = orjson.OPT_NON_STR_KEYS | orjson.OPT_UTC_Z if orjson else 0
+
+    def _default(self, encoder_default):
+        def default(obj):
+            if type(obj) is Decimal:
+                return float(obj)
+            return encoder_default(obj)
+        return default
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+
+        renderer_context = renderer_context or {}
+        if (orjson is None or self.ensure_ascii or not self.compact
+                or self.get_indent(accepted_media_type, renderer_context) is not None):
+            return super().render(data, accepted_media_type, renderer_context)
+
+        try:
+            ret = orjson.dumps(
+                data, default=self._default(self.encoder_class().default), option=self.opciones_orjson
+            )
+        except orjson.JSONEncodeError:
+            return super().render(data, accepted_media_type, renderer_context)
+
+        # Igual que DRF: \u2028 y \u2029 escapados para que el JSON sea JavaScript válido
+        return ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
@@ -1,11 +1,52 @@
 # Serializers para todos los modelos de login
+from decimal import Decimal
 from rest_framework import serializers
 from django.contrib.auth.models import User
 from .models import (
 	Medico, Paciente, Producto, Farmacia, Sucursal, Receta, DetalleReceta, DetallePrescripcion, ProductoFarmacia
 )
 
-class UserSerializer(serializers.ModelSerializer):
+class CamposDinamicosMixin:
+	"""
+	Permite pedir solo algunos campos y controlar qué relaciones se anidan.
+
+	Recibe dos árboles (ver login/services/campos.py -> parsear_arbol):
+	- campos: {'precio': {}, 'producto': {'nombre_comercial': {}}}; None = todos los campos
+	- expandir: {'producto': {}}; las relaciones no incluidas se devuelven como id.
+	  None = expandir todo (comportamiento por defecto)
+	"""
+	def __init__(self, *args, campos=None, expandir=None, **kwargs):
+		super().__init__(*args, **kwargs)
+		if campos is not None or expandir is not None:
+			self.aplicar_campos(campos, expandir)
+
+	def aplicar_campos(self, campos, expandir):
+		self.campos = campos
+		self.expandir = expandir
+		for nombre in list(self.fields):
+			if campos is not None and nombre not in campos:
+				self.fields.pop(nombre)
+				continue
+
+			campo = self.fields[nombre]
+			es_lista = isinstance(campo, serializers.ListSerializer)
+			anidado = campo.child if es_lista else campo
+			if not isinstance(anidado, serializers.BaseSerializer):
+				continue
+
+			if expandir is not None and nombre not in expandir:
+				# Relación sin expandir: solo el id (o lista de ids)
+				self.fields[nombre] = serializers.PrimaryKeyRelatedField(read_only=True, many=es_lista)
+				continue
+
+			if isinstance(anidado, CamposDinamicosMixin):
+				sub_campos = (campos.get(nombre) or None) if campos is not None else None
+				sub_expandir = expandir.get(nombre, {}) if expandir is not None else None
+				if sub_campos is not None or sub_expandir is not None:
+					anidado.aplicar_campos(sub_campos, sub_expandir)
+
+
+class UserSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
 	class Meta:
 		model = User
 		fields = [
@@ -13,48 +54,48 @@ class UserSerializer(serializers.ModelSerializer):
 			'is_active', 'is_staff', 'is_superuser', 'date_joined', 'last_login'
 		]
 
-class PacienteSerializer(serializers.ModelSerializer):
+class PacienteSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
 	user = UserSerializer(read_only=True)
 	class Meta:
 		model = Paciente
 		fields = '__all__'
 
-class MedicoSerializer(serializers.ModelSerializer):
+class MedicoSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
 	user = UserSerializer(read_only=True)
 	class Meta:
 		model = Medico
 		fields = '__all__'
 
-class ProductoSerializer(serializers.ModelSerializer):
+class ProductoSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
 	class Meta:
 		model = Producto
 		fields = '__all__'
 
-class FarmaciaSerializer(serializers.ModelSerializer):
+class FarmaciaSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
 	class Meta:
 		model = Farmacia
 		fields = '__all__'
 
-class ProductoFarmaciaSerializer(serializers.ModelSerializer):
+class ProductoFarmaciaSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
 	producto = ProductoSerializer(read_only=True)
 	farmacia = FarmaciaSerializer(read_only=True)
 	class Meta:
 		model = ProductoFarmacia
 		fields = '__all__'
 
-class SucursalSerializer(serializers.ModelSerializer):
+class SucursalSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
 	farmacia = FarmaciaSerializer(read_only=True)
 	class Meta:
 		model = Sucursal
-		fields = '__all__'
+		exclude = ('geohash',)  # Columna interna para búsquedas por cercanía
 
-class DetalleRecetaSerializer(serializers.ModelSerializer):
+class DetalleRecetaSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
 	producto = ProductoSerializer(read_only=True)
 	class Meta:
 		model = DetalleReceta
 		fields = '__all__'
 
-class RecetaSerializer(serializers.ModelSerializer):
+class RecetaSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
 	medico = MedicoSerializer(read_only=True)
 	paciente = PacienteSerializer(read_only=True)
 	detalles = DetalleRecetaSerializer(many=True, read_only=True)
@@ -62,12 +103,17 @@ class RecetaSerializer(serializers.ModelSerializer):
 		model = Receta
 		fields = '__all__'
 
-class DetallePrescripcionSerializer(serializers.ModelSerializer):
+class DetallePrescripcionSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
 	detalle_receta = DetalleRecetaSerializer(read_only=True)
 	farmacia = FarmaciaSerializer(read_only=True)
 	producto = ProductoSerializer(read_only=True)
 	producto_farmacia = ProductoFarmaciaSerializer(read_only=True)
 	
+	# Lo que to_representation lee para recalcular precio_encontrado aunque no se pida
+	# en ?fields= (ver login/services/campos.py -> optimizar_queryset)
+	columnas_requeridas = {'precio_encontrado': ('producto', 'farmacia', 'fuente')}
+	relaciones_requeridas = {'precio_encontrado': ('producto_farmacia',)}
+
 	class Meta:
 		model = DetallePrescripcion
 		fields = '__all__'
@@ -79,17 +125,21 @@ class DetallePrescripcionSerializer(serializers.ModelSerializer):
 		"""
 		representation = super().to_representation(instance)
 		
+		# Con ?fields= sin precio_encontrado no hay nada que recalcular (ni precio_origen)
+		if 'precio_encontrado' not in representation:
+			return representation
+		
 		# Si existe producto_farmacia, usar su precio actualizado
 		if instance.producto_farmacia:
 			representation['precio_encontrado'] = str(instance.producto_farmacia.precio)
 			representation['precio_origen'] = 'ProductoFarmacia (precio oficial)'
 		# Si no existe pero podemos buscarlo dinámicamente
-		elif instance.producto and instance.farmacia:
+		elif instance.producto_id and instance.farmacia_id:
 			try:
 				from login.models import ProductoFarmacia
 				producto_farmacia = ProductoFarmacia.objects.get(
-					producto=instance.producto,
-					farmacia=instance.farmacia
+					producto_id=instance.producto_id,
+					farmacia_id=instance.farmacia_id
 				)
 				representation['precio_encontrado'] = str(producto_farmacia.precio)
 				representation['precio_origen'] = 'ProductoFarmacia (precio oficial actualizado)'
@@ -101,3 +151,12 @@ class DetallePrescripcionSerializer(serializers.ModelSerializer):
 		
 		return representation
 
+
+class ValoresPrescripcionSerializer(serializers.Serializer):
+	"""
+	Valida precio, distancia y fuente de un detalle de prescripción enviado por POST
+	(individual o cada elemento de "resultados") antes de guardarlo
+	"""
+	precio_encontrado = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=Decimal('0'), default=0)
+	distancia = serializers.DecimalField(max_digits=6, decimal_places=2, min_value=Decimal('0'), default=0)
+	fuente = serializers.CharField(max_length=150, default='Manual')
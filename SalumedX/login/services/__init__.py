@@ -0,0 +1,4 @@
+"""
+Servicios de dominio reutilizados por las vistas de la API.
+Agrupan consultas y lógica compartida para no duplicarla entre endpoints.
+"""
@@ -0,0 +1,251 @@
+"""
+Índice en memoria para autocompletar nombres de medicamentos.
+
+Cada proceso mantiene un arreglo ordenado de claves normalizadas (sin tildes y en
+minúsculas) construido a partir de nombre_comercial, nombre_generico y
+principio_activo. Cada palabra de esos nombres genera una clave desde su posición,
+así "dolo" encuentra "Dolo-Neurobión" y "neuro" también.
+
+Las claves se agrupan por (posición, largo), que es el criterio del ranking: un
+arreglo ordenado por grupo. Las búsquedas recorren los grupos de mejor a peor y
+usan bisect en cada arreglo: O(log n) para ubicar el prefijo y luego solo las
+claves que lo comparten. En cuanto hay 'limite' productos no se miran grupos
+peores, así que el resultado es exactamente el top del ranking sin revisar todas
+las coincidencias.
+
+El índice se construye en la primera consulta, se actualiza incrementalmente con
+las señales de Producto (ver login/signals.py) y se reconstruye completo cada
+AUTOCOMPLETADO['TTL_SEGUNDOS'] para recoger cambios hechos por otros workers. Esa
+reconstrucción corre en un hilo aparte (una a la vez); mientras tanto las
+búsquedas siguen usando el índice anterior.
+
+Las búsquedas no toman el lock: leen una sola referencia (self._estado) y nunca
+ven estructuras a medio modificar, porque quien escribe no las cambia en el
+lugar sino que arma copias (solo de los diccionarios y de los arreglos de los
+grupos que cambian) y reemplaza esa referencia al terminar.
+"""
+import heapq
+import sys
+import threading
+import time
+from bisect import bisect_left, insort
+from django.conf import settings
+from django.db import connection
+from login.models import Producto
+from login.services.busqueda import tokenizar
+
+AUTOCOMPLETADO = getattr(settings, 'AUTOCOMPLETADO', {})
+TTL_SEGUNDOS = AUTOCOMPLETADO.get('TTL_SEGUNDOS', 300)
+LIMITE_POR_DEFECTO = AUTOCOMPLETADO.get('LIMITE', 10)
+LIMITE_MAXIMO = AUTOCOMPLETADO.get('LIMITE_MAXIMO', 50)
+
+CAMPOS = ('nombre_comercial', 'nombre_generico', 'principio_activo')
+
+
+def _claves_producto(producto):
+    """
+    Genera las claves (texto, posición) de un producto: el nombre completo
+    normalizado desde el inicio de cada palabra.
+    """
+    claves = set()
+    for campo in CAMPOS:
+        palabras = tokenizar(getattr(producto, campo))
+        for i in range(len(palabras)):
+            # posición 0 = coincide con el inicio del nombre (mejor ranking)
+            claves.add((' '.join(palabras[i:]), i))
+    return claves
+
+
+class IndiceAutocompletado:
+    """
+    Arreglos ordenados de (clave, id_producto) por (posición, largo), con datos de cada producto
+
+    self._estado = (entradas, claves, productos), que no se modifican una vez publicados:
+    - entradas: (posicion, largo) -> [(clave, id_producto)] ordenado
+    - claves: id_producto -> set de (clave, posicion)
+    - productos: id_producto -> dict con los datos a devolver
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()          # Serializa a quienes escriben
+        self._construccion = threading.Lock()  # Una sola reconstrucción a la vez
+        self._estado = ({}, {}, {})
+        self.construido_en = None  # time.monotonic() de la última reconstrucción
+        self.construccion_ms = None
+        self.memoria_kb = None     # Memoria aproximada medida en la última reconstrucción
+
+    @property
+    def construido(self):
+        return self.construido_en is not None
+
+    def construir(self, productos=None):
+        """Reconstruye el índice completo desde la base de datos"""
+        inicio = time.perf_counter()
+        if productos is None:
+            productos = Producto.objects.only(
+                'id_producto', *CAMPOS
+            ).iterator()
+
+        entradas, claves, datos = {}, {}, {}
+        for producto in productos:
+            claves_producto = _claves_producto(producto)
+            claves[producto.pk] = claves_producto
+            datos[producto.pk] = self._datos(producto)
+            for clave, pos in claves_producto:
+                entradas.setdefault((pos, len(clave)), []).append((clave, producto.pk))
+        for arreglo in entradas.values():
+            arreglo.sort()
+
+        with self._lock:
+            self._estado = (entradas, claves, datos)
+            self.construido_en = time.monotonic()
+            self.construccion_ms = round((time.perf_counter() - inicio) * 1000, 2)
+        self.memoria_kb = self._medir_memoria()
+
+    def actualizar(self, producto):
+        """Inserta o reemplaza un producto sin reconstruir el índice"""
+        if not self.construido:
+            return
+        claves_producto = _claves_producto(producto)
+        with self._lock:
+            entradas, claves, productos = self._copiar(producto.pk)
+            copiados = set()
+            for clave, pos in claves_producto:
+                insort(self._arreglo(entradas, (pos, len(clave)), copiados), (clave, producto.pk))
+            claves[producto.pk] = claves_producto
+            productos[producto.pk] = self._datos(producto)
+            self._estado = (entradas, claves, productos)
+
+    def eliminar(self, producto_id):
+        """Quita un producto del índice"""
+        if not self.construido:
+            return
+        with self._lock:
+            self._estado = self._copiar(producto_id)
+
+    def _copiar(self, producto_id):
+        """
+        Copia del estado sin el producto: los diccionarios se copian (superficialmente)
+        y solo se copian los arreglos de los grupos donde estaba el producto
+        """
+        entradas, claves, productos = self._estado
+        entradas, claves, productos = dict(entradas), dict(claves), dict(productos)
+        copiados = set()
+        for clave, pos in claves.pop(producto_id, ()):
+            arreglo = self._arreglo(entradas, (pos, len(clave)), copiados)
+            i = bisect_left(arreglo, (clave, producto_id))
+            if i < len(arreglo) and arreglo[i] == (clave, producto_id):
+                del arreglo[i]
+        productos.pop(producto_id, None)
+        return entradas, claves, productos
+
+    @staticmethod
+    def _arreglo(entradas, grupo, copiados):
+        """Arreglo del grupo listo para modificar (copiado la primera vez)"""
+        if grupo not in copiados:
+            entradas[grupo] = list(entradas.get(grupo, ()))
+            copiados.add(grupo)
+        return entradas[grupo]
+
+    @staticmethod
+    def _datos(producto):
+        return {
+            'id_producto': producto.pk,
+            'nombre_comercial': producto.nombre_comercial,
+            'nombre_generico': producto.nombre_generico,
+            'principio_activo': producto.principio_activo,
+        }
+
+    def _vigente(self):
+        """
+        Construye el índice en la primera consulta (una sola petición lo hace; las demás
+        esperan) y, si venció el TTL, lo reconstruye en segundo plano
+        """
+        if not self.construido:
+            with self._construccion:
+                if not self.construido:
+                    self.construir()
+        elif (time.monotonic() - self.construido_en) > TTL_SEGUNDOS and self._construccion.acquire(blocking=False):
+            threading.Thread(target=self._reconstruir, name='autocompletado', daemon=True).start()
+
+    def _reconstruir(self):
+        try:
+            self.construir()
+        finally:
+            self._construccion.release()
+            connection.close()  # Conexión propia del hilo
+
+    def buscar(self, texto, limite=LIMITE_POR_DEFECTO):
+        """
+        Devuelve hasta 'limite' productos cuyo nombre tiene una palabra que empieza por el texto
+
+        Ordena primero las coincidencias al inicio del nombre y luego las más cortas.
+        """
+        self._vigente()
+
+        prefijo = ' '.join(tokenizar(texto))
+        if not prefijo:
+            return []
+
+        entradas, _, productos = self._estado
+        resultado = []
+        vistos = set()
+        for grupo in sorted(entradas):
+            if len(resultado) >= limite:
+                break
+            if grupo[1] < len(prefijo):
+                continue
+            # Mismo ranking dentro del grupo: desempata el id (los ya vistos rankean mejor)
+            arreglo = entradas[grupo]
+            nuevos = set()
+            i = bisect_left(arreglo, (prefijo,))
+            while i < len(arreglo):
+                clave, producto_id = arreglo[i]
+                if not clave.startswith(prefijo):
+                    break
+                if producto_id not in vistos:
+                    nuevos.add(producto_id)
+                i += 1
+            resultado.extend(heapq.nsmallest(limite - len(resultado), nuevos))
+            vistos.update(nuevos)
+
+        return [productos[producto_id] for producto_id in resultado]
+
+    def _medir_memoria(self):
+        entradas, _, productos = self._estado
+        memoria = sys.getsizeof(entradas) + sum(
+            sys.getsizeof(arreglo) + sum(sys.getsizeof(entrada) + sys.getsizeof(entrada[0]) for entrada in arreglo)
+            for arreglo in entradas.values()
+        )
+        memoria += sys.getsizeof(productos) + sum(
+            sys.getsizeof(datos) + sum(sys.getsizeof(v) for v in datos.values())
+            for datos in productos.values()
+        )
+        return round(memoria / 1024, 1)
+
+    def estadisticas(self):
+        """Tamaño del índice y memoria/tiempo de la última construcción (para monitoreo)"""
+        entradas, _, productos = self._estado
+        return {
+            'construido': self.construido,
+            'productos': len(productos),
+            'entradas': sum(len(arreglo) for arreglo in entradas.values()),
+            'memoria_kb': self.memoria_kb,
+            'construccion_ms': self.construccion_ms,
+        }
+
+
+# Índice compartido por todas las peticiones del proceso
+indice_autocompletado = IndiceAutocompletado()
+
+
+def autocompletar(texto, limite=LIMITE_POR_DEFECTO):
+    """
+    Busca sugerencias en el índice del proceso y mide la latencia
+
+    Returns:
+        tuple: (lista de productos, tiempo de búsqueda en ms)
+    """
+    inicio = time.perf_counter()
+    resultados = indice_autocompletado.buscar(texto, min(limite, LIMITE_MAXIMO))
+    return resultados, round((time.perf_counter() - inicio) * 1000, 3)
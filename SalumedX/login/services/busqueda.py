@@ -0,0 +1,223 @@
+"""
+Índice de búsqueda de texto completo para Producto.
+
+Mantiene una tabla de búsqueda paralela a login_producto:
+- SQLite (desarrollo): tabla virtual FTS5 'login_producto_fts' con ranking bm25
+- PostgreSQL (producción): tabla 'login_producto_busqueda' con tsvector + índice GIN y ts_rank
+
+El texto se normaliza en Python (minúsculas y sin tildes) antes de indexarlo y
+antes de buscar, así "Analgésicos", "ANALGESICOS" y "analgesicos" coinciden en
+ambos motores sin depender de la extensión unaccent.
+
+El índice se actualiza con señales post_save/post_delete de Producto (ver login/signals.py)
+y se puede reconstruir con: python manage.py reindexar_busqueda
+"""
+import re
+import unicodedata
+from django.db import connections, router, DEFAULT_DB_ALIAS
+from django.db.models import Q, FloatField, Value
+from django.db.models.expressions import RawSQL
+from login.models import Producto
+
+TABLA_FTS_SQLITE = 'login_producto_fts'
+TABLA_BUSQUEDA_POSTGRES = 'login_producto_busqueda'
+
+# Pesos por columna: el nombre comercial y genérico pesan más que el principio activo
+PESOS_BM25 = (10.0, 10.0, 5.0)
+
+# Alias de base de datos donde ya se comprobó que existe el índice
+_indices_verificados = set()
+
+
+def normalizar_texto(texto):
+    """
+    Convierte el texto a minúsculas y elimina tildes/diacríticos
+
+    Args:
+        texto (str): Texto original (ej: "Analgésicos")
+
+    Returns:
+        str: Texto normalizado (ej: "analgesicos")
+    """
+    if not texto:
+        return ''
+    descompuesto = unicodedata.normalize('NFKD', texto)
+    sin_tildes = ''.join(c for c in descompuesto if not unicodedata.combining(c))
+    return sin_tildes.lower()
+
+
+def tokenizar(texto):
+    """Divide el texto normalizado en términos alfanuméricos"""
+    return re.findall(r'[a-z0-9]+', normalizar_texto(texto))
+
+
+def _alias_para_escritura():
+    return router.db_for_write(Producto) or DEFAULT_DB_ALIAS
+
+
+def _alias_para_lectura():
+    return router.db_for_read(Producto) or DEFAULT_DB_ALIAS
+
+
+def indice_disponible(using=None):
+    """
+    Indica si la tabla de búsqueda existe en la base de datos
+
+    En SQLite compilado sin FTS5 la migración no crea la tabla; en ese caso
+    la búsqueda cae a icontains.
+    """
+    connection = connections[using or _alias_para_lectura()]
+    if connection.alias in _indices_verificados:
+        return True
+
+    if connection.vendor == 'sqlite':
+        tabla = TABLA_FTS_SQLITE
+    elif connection.vendor == 'postgresql':
+        tabla = TABLA_BUSQUEDA_POSTGRES
+    else:
+        return False
+
+    if tabla in connection.introspection.table_names():
+        _indices_verificados.add(connection.alias)
+        return True
+    return False
+
+
+def indexar_producto(producto, using=None):
+    """
+    Inserta o actualiza un producto en el índice de búsqueda
+
+    Args:
+        producto: Instancia de Producto (o del modelo histórico en migraciones)
+        using (str): Alias de base de datos
+    """
+    connection = connections[using or _alias_para_escritura()]
+    columnas = [
+        normalizar_texto(producto.nombre_comercial),
+        normalizar_texto(producto.nombre_generico),
+        normalizar_texto(producto.principio_activo),
+    ]
+
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute(f'DELETE FROM {TABLA_FTS_SQLITE} WHERE rowid = %s', [producto.pk])
+            cursor.execute(
+                f'INSERT INTO {TABLA_FTS_SQLITE} '
+                '(rowid, nombre_comercial, nombre_generico, principio_activo) '
+                'VALUES (%s, %s, %s, %s)',
+                [producto.pk, *columnas]
+            )
+        elif connection.vendor == 'postgresql':
+            cursor.execute(
+                f'INSERT INTO {TABLA_BUSQUEDA_POSTGRES} (producto_id, documento) VALUES ('
+                "%s, setweight(to_tsvector('simple', %s), 'A') || "
+                "setweight(to_tsvector('simple', %s), 'A') || "
+                "setweight(to_tsvector('simple', %s), 'B')) "
+                'ON CONFLICT (producto_id) DO UPDATE SET documento = EXCLUDED.documento',
+                [producto.pk, *columnas]
+            )
+
+
+def desindexar_producto(producto_id, using=None):
+    """Elimina un producto del índice de búsqueda"""
+    connection = connections[using or _alias_para_escritura()]
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute(f'DELETE FROM {TABLA_FTS_SQLITE} WHERE rowid = %s', [producto_id])
+        elif connection.vendor == 'postgresql':
+            cursor.execute(
+                f'DELETE FROM {TABLA_BUSQUEDA_POSTGRES} WHERE producto_id = %s', [producto_id]
+            )
+
+
+def reconstruir_indice(productos, using=None):
+    """
+    Vacía el índice y lo vuelve a llenar con los productos indicados
+
+    Args:
+        productos (iterable): Productos a indexar
+        using (str): Alias de base de datos
+
+    Returns:
+        int: Número de productos indexados
+    """
+    connection = connections[using or _alias_para_escritura()]
+    tabla = TABLA_FTS_SQLITE if connection.vendor == 'sqlite' else TABLA_BUSQUEDA_POSTGRES
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {tabla}')
+
+    total = 0
+    for producto in productos:
+        indexar_producto(producto, using=connection.alias)
+        total += 1
+    return total
+
+
+def _consulta_sqlite(terminos):
+    # Cada término entre comillas (evita operadores FTS5) y como prefijo: "parac"*
+    return ' AND '.join(f'"{t}"*' for t in terminos)
+
+
+def _consulta_postgres(terminos):
+    return ' & '.join(f'{t}:*' for t in terminos)
+
+
+def buscar_productos(queryset, texto):
+    """
+    Filtra el queryset por texto usando el índice y lo ordena por relevancia
+
+    Agrega la anotación 'relevancia' (mayor = más relevante). Si el índice no
+    existe en la base de datos, usa icontains y relevancia 0.
+
+    Args:
+        queryset (QuerySet): Productos a filtrar
+        texto (str): Texto de búsqueda del usuario
+
+    Returns:
+        QuerySet: Productos coincidentes ordenados por relevancia descendente
+    """
+    terminos = tokenizar(texto)
+    connection = connections[queryset.db]
+    tabla_producto = Producto._meta.db_table
+    pk_column = Producto._meta.pk.column
+
+    if not terminos or not indice_disponible(queryset.db):
+        return queryset.filter(
+            Q(nombre_generico__icontains=texto) |
+            Q(nombre_comercial__icontains=texto) |
+            Q(principio_activo__icontains=texto)
+        ).annotate(
+            relevancia=Value(0.0, output_field=FloatField())
+        ).order_by('-relevancia', 'pk')
+
+    if connection.vendor == 'sqlite':
+        consulta = _consulta_sqlite(terminos)
+        pesos = ', '.join(str(p) for p in PESOS_BM25)
+        # bm25 devuelve valores negativos (más negativo = más relevante)
+        relevancia = RawSQL(
+            f'SELECT -bm25({TABLA_FTS_SQLITE}, {pesos}) FROM {TABLA_FTS_SQLITE} '
+            f'WHERE {TABLA_FTS_SQLITE} MATCH %s '
+            f'AND {TABLA_FTS_SQLITE}.rowid = "{tabla_producto}"."{pk_column}"',
+            [consulta], output_field=FloatField()
+        )
+        coincidencias = RawSQL(
+            f'SELECT rowid FROM {TABLA_FTS_SQLITE} WHERE {TABLA_FTS_SQLITE} MATCH %s',
+            [consulta]
+        )
+    else:
+        consulta = _consulta_postgres(terminos)
+        relevancia = RawSQL(
+            f"SELECT ts_rank(b.documento, to_tsquery('simple', %s)) "
+            f'FROM {TABLA_BUSQUEDA_POSTGRES} b '
+            f'WHERE b.producto_id = "{tabla_producto}"."{pk_column}"',
+            [consulta], output_field=FloatField()
+        )
+        coincidencias = RawSQL(
+            f'SELECT producto_id FROM {TABLA_BUSQUEDA_POSTGRES} '
+            f"WHERE documento @@ to_tsquery('simple', %s)",
+            [consulta]
+        )
+
+    return queryset.filter(pk__in=coincidencias).annotate(
+        relevancia=relevancia
+    ).order_by('-relevancia', 'pk')
@@ -0,0 +1,231 @@
+"""
+Búsqueda difusa (tolerante a errores de escritura) de medicamentos.
+
+Índice en memoria por proceso de trigramas de caracteres sobre las palabras
+normalizadas de nombre_comercial, nombre_generico y principio_activo:
+- Vocabulario: palabra -> productos que la contienen
+- Índice invertido: trigrama -> palabras que lo contienen
+
+Para cada término buscado solo se examinan las palabras que comparten trigramas
+con él (no se recorre el catálogo) y se descartan las que no alcanzan el mínimo
+de trigramas compatibles con la distancia máxima permitida. Las candidatas
+restantes se verifican con distancia de Levenshtein acotada.
+
+Ejemplo: "ibuprophen" encuentra "ibuprofeno" (distancia 3) y "paracetamo"
+encuentra "paracetamol" (distancia 1).
+
+Se mantiene igual que el índice de autocompletado: construcción perezosa,
+actualización incremental por señales y reconstrucción periódica (TTL).
+"""
+import threading
+import time
+from collections import defaultdict
+from django.conf import settings
+from django.db.models import Case, When, Value, FloatField
+from login.models import Producto
+from login.services.busqueda import tokenizar
+
+BUSQUEDA_DIFUSA = getattr(settings, 'BUSQUEDA_DIFUSA', {})
+TTL_SEGUNDOS = BUSQUEDA_DIFUSA.get('TTL_SEGUNDOS', 300)
+MAX_RESULTADOS = BUSQUEDA_DIFUSA.get('MAX_RESULTADOS', 200)
+
+CAMPOS = ('nombre_comercial', 'nombre_generico', 'principio_activo')
+
+
+def distancia_maxima(termino):
+    """Errores tolerados según la longitud del término"""
+    if len(termino) <= 4:
+        return 1
+    if len(termino) <= 7:
+        return 2
+    return 3
+
+
+def trigramas(palabra):
+    """Trigramas con relleno al inicio y al final: 'ibu' -> {'  i', ' ib', 'ibu', 'bu '}"""
+    relleno = f'  {palabra} '
+    return {relleno[i:i + 3] for i in range(len(relleno) - 2)}
+
+
+def levenshtein_acotada(a, b, maximo):
+    """
+    Distancia de edición entre a y b, o None si supera 'maximo'
+
+    Corta en cuanto toda una fila de la matriz supera el máximo.
+    """
+    if abs(len(a) - len(b)) > maximo:
+        return None
+    anterior = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        actual = [i]
+        for j, cb in enumerate(b, 1):
+            actual.append(min(
+                anterior[j] + 1,
+                actual[j - 1] + 1,
+                anterior[j - 1] + (ca != cb),
+            ))
+        if min(actual) > maximo:
+            return None
+        anterior = actual
+    return anterior[-1] if anterior[-1] <= maximo else None
+
+
+class IndiceDifuso:
+    """
+    Índice de trigramas sobre el vocabulario de nombres de productos
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._palabras = defaultdict(set)    # palabra -> ids de producto
+        self._trigramas = defaultdict(set)   # trigrama -> palabras
+        self._por_producto = {}              # id_producto -> set de palabras
+        self.construido_en = None
+
+    @property
+    def construido(self):
+        return self.construido_en is not None
+
+    @staticmethod
+    def _palabras_producto(producto):
+        palabras = set()
+        for campo in CAMPOS:
+            palabras.update(tokenizar(getattr(producto, campo)))
+        return palabras
+
+    def _agregar(self, producto_id, palabras):
+        self._por_producto[producto_id] = palabras
+        for palabra in palabras:
+            if palabra not in self._palabras:
+                for trigrama in trigramas(palabra):
+                    self._trigramas[trigrama].add(palabra)
+            self._palabras[palabra].add(producto_id)
+
+    def _quitar(self, producto_id):
+        # Las palabras sin productos quedan en el índice de trigramas: no producen resultados
+        for palabra in self._por_producto.pop(producto_id, ()):
+            self._palabras[palabra].discard(producto_id)
+
+    def construir(self, productos=None):
+        """Reconstruye el índice completo desde la base de datos"""
+        if productos is None:
+            productos = Producto.objects.only('id_producto', *CAMPOS).iterator()
+
+        nuevo = IndiceDifuso()
+        for producto in productos:
+            nuevo._agregar(producto.pk, self._palabras_producto(producto))
+
+        with self._lock:
+            self._palabras = nuevo._palabras
+            self._trigramas = nuevo._trigramas
+            self._por_producto = nuevo._por_producto
+            self.construido_en = time.monotonic()
+
+    def actualizar(self, producto):
+        """Inserta o reemplaza un producto sin reconstruir el índice"""
+        if not self.construido:
+            return
+        with self._lock:
+            self._quitar(producto.pk)
+            self._agregar(producto.pk, self._palabras_producto(producto))
+
+    def eliminar(self, producto_id):
+        """Quita un producto del índice"""
+        if not self.construido:
+            return
+        with self._lock:
+            self._quitar(producto_id)
+
+    def _palabras_cercanas(self, termino):
+        """
+        Palabras del vocabulario a distancia <= distancia_maxima(termino)
+
+        Returns:
+            dict: palabra -> distancia
+        """
+        maximo = distancia_maxima(termino)
+        trigramas_termino = trigramas(termino)
+        # Cada edición altera como máximo 3 trigramas
+        minimo_compartidos = len(trigramas_termino) - 3 * maximo
+
+        compartidos = defaultdict(int)
+        for trigrama in trigramas_termino:
+            for palabra in self._trigramas.get(trigrama, ()):
+                compartidos[palabra] += 1
+
+        cercanas = {}
+        for palabra, n in compartidos.items():
+            if n < minimo_compartidos:
+                continue
+            distancia = levenshtein_acotada(termino, palabra, maximo)
+            if distancia is not None:
+                cercanas[palabra] = distancia
+        return cercanas
+
+    def buscar(self, texto, limite=MAX_RESULTADOS):
+        """
+        Productos que contienen una palabra cercana a cada término del texto
+
+        Returns:
+            list: [(id_producto, distancia_total)] ordenado de menor a mayor distancia
+        """
+        if not self.construido or (time.monotonic() - self.construido_en) > TTL_SEGUNDOS:
+            self.construir()
+
+        terminos = tokenizar(texto)
+        if not terminos:
+            return []
+
+        puntajes = None
+        for termino in terminos:
+            # Mejor distancia por producto para este término
+            mejor = {}
+            for palabra, distancia in self._palabras_cercanas(termino).items():
+                for producto_id in self._palabras.get(palabra, ()):
+                    if distancia < mejor.get(producto_id, distancia + 1):
+                        mejor[producto_id] = distancia
+
+            if puntajes is None:
+                puntajes = mejor
+            else:
+                # Todos los términos deben coincidir
+                puntajes = {
+                    producto_id: puntajes[producto_id] + distancia
+                    for producto_id, distancia in mejor.items() if producto_id in puntajes
+                }
+            if not puntajes:
+                return []
+
+        return sorted(puntajes.items(), key=lambda item: (item[1], item[0]))[:limite]
+
+
+# Índice compartido por todas las peticiones del proceso
+indice_difuso = IndiceDifuso()
+
+
+def buscar_productos_difuso(queryset, texto):
+    """
+    Filtra el queryset con el índice difuso y lo ordena por cercanía
+
+    Agrega la anotación 'relevancia' (= -distancia total, mayor = más parecido),
+    compatible con la paginación del catálogo.
+
+    Args:
+        queryset (QuerySet): Productos a filtrar
+        texto (str): Texto de búsqueda (puede tener errores de escritura)
+
+    Returns:
+        QuerySet: Productos cercanos ordenados por relevancia descendente
+    """
+    coincidencias = indice_difuso.buscar(texto)
+    if not coincidencias:
+        return queryset.none().annotate(relevancia=Value(0.0, output_field=FloatField()))
+
+    relevancia = Case(
+        *[When(pk=producto_id, then=Value(-float(distancia)))
+          for producto_id, distancia in coincidencias],
+        output_field=FloatField()
+    )
+    return queryset.filter(
+        pk__in=[producto_id for producto_id, _ in coincidencias]
+    ).annotate(relevancia=relevancia).order_by('-relevancia', 'pk')
@@ -0,0 +1,153 @@
+"""
+Cachés por proceso de la autenticación JWT (ver login/middleware.py).
+
+Usuarios: cada request con 'Authorization: Bearer ...' necesita el User del
+token. En lugar de consultarlo siempre, se guarda una copia de sus columnas
+(no el objeto con sus relaciones ya cargadas) por user_id, con un máximo de
+entradas (se descarta la usada hace más tiempo) y un tiempo de vida. Se invalida
+con post_save/post_delete de User (login/signals.py), así que editar, desactivar
+o eliminar un usuario se refleja de inmediato en este proceso; en los demás
+workers, a más tardar en CACHE_AUTENTICACION['TTL_USUARIO_SEGUNDOS'].
+Los cambios masivos con QuerySet.update() no disparan señales: llamar a
+invalidar_usuario() o esperar el tiempo de vida.
+
+Tokens: un cliente activo envía el mismo access token miles de veces durante
+sus 5 horas de vida. El payload ya verificado (firma HS256 y claims) se guarda
+con la clave SHA-256 del token hasta su 'exp', así la verificación corre una
+vez por token y proceso. Solo se guardan tokens válidos: uno inválido o
+expirado se vuelve a rechazar en cada petición, sin ocupar la caché.
+
+Los contadores (hits, misses, evictions...) se exponen en /api/admin/stats/.
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+import jwt
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+from login.models import User
+
+CACHE_AUTENTICACION = getattr(settings, 'CACHE_AUTENTICACION', {})
+MAX_USUARIOS = CACHE_AUTENTICACION.get('MAX_USUARIOS', 10000)
+TTL_USUARIO_SEGUNDOS = CACHE_AUTENTICACION.get('TTL_USUARIO_SEGUNDOS', 60)
+MAX_TOKENS = CACHE_AUTENTICACION.get('MAX_TOKENS', 10000)
+TTL_TOKEN_SEGUNDOS = CACHE_AUTENTICACION.get('TTL_TOKEN_SEGUNDOS', 5 * 3600)
+
+
+class CacheLRU:
+    """
+    Diccionario acotado: al superar max_entradas se descarta la entrada usada hace
+    más tiempo, y cada entrada vence a los ttl_segundos (o en el instante indicado)
+    """
+
+    def __init__(self, max_entradas, ttl_segundos):
+        self.max_entradas = max_entradas
+        self.ttl_segundos = ttl_segundos
+        self._lock = threading.Lock()
+        self._datos = OrderedDict()  # clave -> (vence_en, valor), de la menos a la más usada
+        self._contadores = {'hits': 0, 'misses': 0, 'evictions': 0, 'expirations': 0, 'invalidations': 0}
+
+    def obtener(self, clave):
+        """Valor guardado para la clave, o None si no está o ya venció"""
+        with self._lock:
+            entrada = self._datos.get(clave)
+            if entrada is None:
+                self._contadores['misses'] += 1
+                return None
+            if entrada[0] <= time.time():
+                del self._datos[clave]
+                self._contadores['expirations'] += 1
+                self._contadores['misses'] += 1
+                return None
+            self._datos.move_to_end(clave)
+            self._contadores['hits'] += 1
+            return entrada[1]
+
+    def guardar(self, clave, valor, vence_en=None):
+        """
+        Guarda el valor hasta vence_en (timestamp Unix), como máximo ttl_segundos desde ahora
+        """
+        limite = time.time() + self.ttl_segundos
+        vence_en = limite if vence_en is None else min(vence_en, limite)
+        with self._lock:
+            self._datos[clave] = (vence_en, valor)
+            self._datos.move_to_end(clave)
+            while len(self._datos) > self.max_entradas:
+                self._datos.popitem(last=False)
+                self._contadores['evictions'] += 1
+
+    def invalidar(self, clave):
+        with self._lock:
+            if self._datos.pop(clave, None) is not None:
+                self._contadores['invalidations'] += 1
+
+    def limpiar(self):
+        with self._lock:
+            self._datos.clear()
+
+    def estadisticas(self):
+        """Contadores, tasa de aciertos y ocupación (para monitoreo)"""
+        with self._lock:
+            total = self._contadores['hits'] + self._contadores['misses']
+            return {
+                **self._contadores,
+                'hit_ratio': round(self._contadores['hits'] / total, 3) if total else 0.0,
+                'entradas': len(self._datos),
+                'max_entradas': self.max_entradas,
+            }
+
+
+# Columnas de User por user_id, compartidas por todas las peticiones del proceso
+cache_usuarios = CacheLRU(MAX_USUARIOS, TTL_USUARIO_SEGUNDOS)
+
+_COLUMNAS_USUARIO = [campo.attname for campo in User._meta.concrete_fields]
+
+
+def obtener_usuario(user_id):
+    """
+    Usuario activo con ese id, desde la caché o (si no está) desde la base de datos
+
+    Cada llamada devuelve una instancia nueva: lo que una petición cargue o
+    modifique en ella (ej: user.medico) no pasa a las siguientes.
+
+    Returns:
+        User: Usuario activo, o None si no existe o está desactivado
+    """
+    valores = cache_usuarios.obtener(user_id)
+    if valores is None:
+        valores = User.objects.filter(id=user_id).values_list(*_COLUMNAS_USUARIO).first()
+        if valores is None:
+            return None
+        cache_usuarios.guardar(user_id, valores)
+    user = User.from_db(DEFAULT_DB_ALIAS, _COLUMNAS_USUARIO, valores)
+    return user if user.is_active else None
+
+
+def invalidar_usuario(user_id):
+    """Descarta el usuario de la caché (se vuelve a leer en la próxima petición)"""
+    cache_usuarios.invalidar(user_id)
+
+
+# Payloads verificados por SHA-256 del token
+cache_tokens = CacheLRU(MAX_TOKENS, TTL_TOKEN_SEGUNDOS)
+
+
+def verificar_token(token):
+    """
+    Payload de un JWT con firma y expiración verificadas (desde la caché si ya se verificó)
+
+    Returns:
+        dict: Copia del payload (la petición puede modificarla)
+
+    Raises:
+        jwt.ExpiredSignatureError: Si el token expiró
+        jwt.InvalidTokenError: Si la firma o el formato no son válidos
+    """
+    clave = hashlib.sha256(token.encode()).digest()
+    payload = cache_tokens.obtener(clave)
+    if payload is None:
+        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=['HS256'])
+        exp = payload.get('exp')
+        cache_tokens.guardar(clave, payload, vence_en=exp if isinstance(exp, (int, float)) else None)
+    return dict(payload)
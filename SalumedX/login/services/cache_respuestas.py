@@ -0,0 +1,175 @@
+"""
+Caché de respuestas para los endpoints públicos de lectura del catálogo.
+
+Cada endpoint declara de qué modelos depende. La clave de caché incluye:
+- el nombre del endpoint
+- la "versión" actual de cada modelo del que depende
+- un hash de los query params normalizados (orden y valores vacíos no importan)
+
+Al guardar o eliminar un Producto, Farmacia, Sucursal o ProductoFarmacia
+(ver login/signals.py) se incrementa la versión de ese modelo; así solo dejan de
+usarse las entradas de los endpoints que dependen de él, sin recorrer claves.
+
+Las versiones se guardan en la base de datos (login.models.VersionModelo), no en
+la caché: con LocMemCache cada worker tiene su propia caché, y una versión guardada
+ahí solo cambiaría en el worker que atendió la escritura (los demás seguirían
+respondiendo datos viejos hasta TIMEOUT). El incremento ocurre en la misma
+transacción que el cambio, así que todos los workers ven la versión nueva en
+cuanto el cambio confirma. Cuesta una consulta por clave primaria en cada GET;
+las respuestas en sí pueden estar en LocMemCache (una copia por worker) o en un
+backend compartido como Redis (ver CACHES en settings.py).
+
+Los contadores de aciertos/fallos son por proceso y se exponen en /api/admin/stats/.
+"""
+import hashlib
+import threading
+from datetime import datetime, timezone as dt_timezone
+from functools import wraps
+from urllib.parse import urlencode
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models import F
+from django.utils import timezone
+from rest_framework.response import Response
+from login.models import VersionModelo
+
+CACHE_RESPUESTAS = getattr(settings, 'CACHE_RESPUESTAS', {})
+ALIAS = CACHE_RESPUESTAS.get('ALIAS', 'default')
+TIMEOUT = CACHE_RESPUESTAS.get('TIMEOUT', 600)
+PREFIJO = 'resp'
+
+# Parámetros en los que el valor vacío cambia la respuesta (?expand= = no expandir nada)
+PARAMS_VACIO_SIGNIFICATIVO = ('fields', 'expand')
+
+# Estado de un modelo sin fila en VersionModelo
+SIN_VERSION = (0, datetime(1970, 1, 1, tzinfo=dt_timezone.utc))
+
+_contadores = {}
+_lock = threading.Lock()
+
+
+def _cache():
+    return caches[ALIAS]
+
+
+def estado_modelos(modelos, using=DEFAULT_DB_ALIAS):
+    """
+    Versión y fecha del último cambio de cada modelo (una sola consulta, sin escrituras)
+
+    Las filas se crean en la migración 0013 (y en invalidar_modelo si faltara alguna);
+    un modelo sin fila se lee como versión 0, así los GET funcionan en réplicas de solo lectura.
+
+    Returns:
+        list: [(version, fecha_actualizacion), ...] en el orden de 'modelos'
+    """
+    etiquetas = [modelo._meta.label_lower for modelo in modelos]
+    filas = {
+        modelo: (version, fecha)
+        for modelo, version, fecha in VersionModelo.objects.using(using).filter(
+            modelo__in=etiquetas
+        ).values_list('modelo', 'version', 'fecha_actualizacion')
+    }
+    return [filas.get(etiqueta, SIN_VERSION) for etiqueta in etiquetas]
+
+
+def versiones_modelos(modelos):
+    """Versión actual de cada modelo (ver estado_modelos)"""
+    return [version for version, _ in estado_modelos(modelos)]
+
+
+def invalidar_modelo(modelo, using=DEFAULT_DB_ALIAS):
+    """
+    Invalida todas las respuestas que dependen del modelo
+
+    Incrementa su versión dentro de la transacción en curso: las demás peticiones
+    siguen viendo la versión anterior (y los datos anteriores) hasta que confirma.
+    """
+    versiones = VersionModelo.objects.using(using).filter(modelo=modelo._meta.label_lower)
+    cambios = {'version': F('version') + 1, 'fecha_actualizacion': timezone.now()}
+    if not versiones.update(**cambios):
+        VersionModelo.objects.using(using).bulk_create(
+            [VersionModelo(modelo=modelo._meta.label_lower)], ignore_conflicts=True
+        )
+        versiones.update(**cambios)
+
+
+def normalizar_params(params):
+    """
+    Convierte los query params en una cadena estable
+
+    /productos/?search=a&limit=10 y /productos/?limit=10&search=a&id= generan lo mismo.
+    """
+    pares = sorted(
+        (clave, valor)
+        for clave in params.keys()
+        for valor in params.getlist(clave)
+        if valor != '' or clave in PARAMS_VACIO_SIGNIFICATIVO
+    )
+    return urlencode(pares)
+
+
+def _registrar(endpoint, resultado):
+    with _lock:
+        contador = _contadores.setdefault(endpoint, {'hits': 0, 'misses': 0})
+        contador[resultado] += 1
+
+
+def estadisticas():
+    """
+    Aciertos y fallos por endpoint en este proceso
+
+    Returns:
+        dict: {endpoint: {'hits', 'misses', 'hit_ratio'}}
+    """
+    with _lock:
+        resultado = {}
+        for endpoint, contador in _contadores.items():
+            total = contador['hits'] + contador['misses']
+            resultado[endpoint] = {
+                **contador,
+                'hit_ratio': round(contador['hits'] / total, 3) if total else 0.0,
+            }
+        return resultado
+
+
+def cache_respuesta(endpoint, modelos, timeout=None):
+    """
+    Decorador para vistas GET públicas: guarda en caché las respuestas 200
+
+    Uso (debajo de @api_view y @permission_classes):
+        @cache_respuesta('farmacias', (Farmacia,))
+
+    Args:
+        endpoint (str): Nombre del endpoint (para la clave y los contadores)
+        modelos (tuple): Modelos de los que depende la respuesta
+        timeout (int): Segundos de vida de cada entrada (por defecto CACHE_RESPUESTAS['TIMEOUT'])
+    """
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapped_view(request, *args, **kwargs):
+            if request.method != 'GET':
+                return view_func(request, *args, **kwargs)
+
+            # Versión y fecha: una base restaurada (contador menor) no reutiliza entradas de Redis
+            versiones = ':'.join(f'{version}.{fecha.timestamp()}' for version, fecha in estado_modelos(modelos))
+            params = hashlib.md5(normalizar_params(request.query_params).encode()).hexdigest()
+            clave = f'{PREFIJO}:{endpoint}:{versiones}:{params}'
+
+            cache = _cache()
+            guardado = cache.get(clave)
+            if guardado is not None:
+                _registrar(endpoint, 'hits')
+                response = Response(guardado)
+                response['X-Cache'] = 'HIT'
+                return response
+
+            _registrar(endpoint, 'misses')
+            response = view_func(request, *args, **kwargs)
+            if response.status_code == 200:
+                cache.set(clave, response.data, TIMEOUT if timeout is None else timeout)
+            response['X-Cache'] = 'MISS'
+            return response
+
+        return wrapped_view
+    return decorator
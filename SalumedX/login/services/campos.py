@@ -0,0 +1,120 @@
+"""
+Sparse fieldsets (?fields=) y control de expansión (?expand=) para los
+serializers anidados (ver CamposDinamicosMixin en login/serializers.py).
+
+    /productos-farmacias/?fields=id_producto_farmacia,precio,producto.nombre_comercial
+    /recetas/?expand=detalles.producto
+    /detalle-prescripcion/?fields=precio_encontrado,farmacia&expand=
+
+- fields: lista separada por comas; la notación con punto limita los campos
+  de una relación anidada. Sin ?fields= se devuelven todos los campos.
+- expand: relaciones que se anidan completas; las demás se devuelven como id
+  (o lista de ids). Sin ?expand= se anida todo, como siempre.
+
+optimizar_queryset() recorre el serializer ya configurado y traduce lo que
+realmente se va a serializar a only() + select_related() + prefetch_related(),
+así las columnas y joins que no se piden tampoco se consultan.
+"""
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework import serializers
+
+
+def parsear_arbol(valor):
+    """
+    Convierte 'a,b.c,b.d' en {'a': {}, 'b': {'c': {}, 'd': {}}}
+
+    Returns:
+        dict o None si el parámetro no se envió
+    """
+    if valor is None:
+        return None
+    arbol = {}
+    for ruta in valor.split(','):
+        nodo = arbol
+        for parte in ruta.strip().split('.'):
+            if parte:
+                nodo = nodo.setdefault(parte, {})
+    return arbol
+
+
+def opciones_serializacion(params):
+    """
+    Lee ?fields= y ?expand= de los query params
+
+    Returns:
+        dict: kwargs 'campos' y 'expandir' para los serializers con CamposDinamicosMixin
+    """
+    return {
+        'campos': parsear_arbol(params.get('fields')),
+        'expandir': parsear_arbol(params.get('expand')),
+    }
+
+
+def _recorrer(serializer, modelo, prefijo, columnas, joins, prefetch):
+    """Acumula columnas/joins/prefetch necesarios para un nivel del serializer"""
+    for campo in serializer.fields.values():
+        if campo.source == '*' or '.' in campo.source:
+            continue
+        try:
+            campo_modelo = modelo._meta.get_field(campo.source)
+        except FieldDoesNotExist:
+            # Campo calculado: no corresponde a una columna
+            continue
+        ruta = prefijo + campo.source
+
+        if campo_modelo.one_to_many or campo_modelo.many_to_many:
+            # Relaciones inversas: no se pueden limitar con only(), se precargan
+            prefetch.append(ruta)
+            if isinstance(campo, serializers.ListSerializer):
+                _recorrer_prefetch(campo.child, ruta + '__', prefetch)
+            continue
+
+        columnas.append(ruta)
+        if isinstance(campo, serializers.BaseSerializer):
+            joins.append(ruta)
+            _recorrer(campo, campo_modelo.related_model, ruta + '__', columnas, joins, prefetch)
+
+    # Columnas/relaciones que to_representation lee para calcular un campo pedido
+    for nombre, requeridas in getattr(serializer, 'columnas_requeridas', {}).items():
+        if nombre in serializer.fields:
+            columnas.extend(prefijo + columna for columna in requeridas)
+    for nombre, requeridas in getattr(serializer, 'relaciones_requeridas', {}).items():
+        if nombre in serializer.fields:
+            columnas.extend(prefijo + relacion for relacion in requeridas)
+            joins.extend(prefijo + relacion for relacion in requeridas)
+
+
+def _recorrer_prefetch(serializer, prefijo, prefetch):
+    """Relaciones anidadas dentro de una relación precargada"""
+    for campo in serializer.fields.values():
+        anidado = campo.child if isinstance(campo, serializers.ListSerializer) else campo
+        if isinstance(anidado, serializers.BaseSerializer):
+            ruta = prefijo + campo.source
+            prefetch.append(ruta)
+            _recorrer_prefetch(anidado, ruta + '__', prefetch)
+
+
+def optimizar_queryset(queryset, serializer, columnas_extra=()):
+    """
+    Limita el SELECT a lo que el serializer va a devolver
+
+    Args:
+        queryset (QuerySet): Queryset del modelo del serializer
+        serializer: Instancia configurada (con campos/expandir) del serializer
+        columnas_extra (tuple): Columnas que la vista necesita además (p. ej. claves de paginación)
+
+    Returns:
+        QuerySet: Con only(), select_related() y prefetch_related() aplicados
+    """
+    columnas, joins, prefetch = [], [], []
+    _recorrer(serializer, queryset.model, '', columnas, joins, prefetch)
+    columnas.extend(columnas_extra)
+
+    # Los joins los decide el serializer: un select_related previo sobre una relación
+    # no pedida chocaría con only()
+    queryset = queryset.select_related(None).only(*dict.fromkeys(columnas))
+    if joins:
+        queryset = queryset.select_related(*dict.fromkeys(joins))
+    if prefetch:
+        queryset = queryset.prefetch_related(*dict.fromkeys(prefetch))
+    return queryset
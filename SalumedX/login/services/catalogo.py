@@ -0,0 +1,322 @@
+"""
+Servicio de consultas del catálogo de productos con precios por farmacia.
+
+Construye la respuesta completa de /productos/ y /api/admin/productos/ con un
+número fijo de consultas SQL, sin importar cuántos productos existan:
+1. Productos filtrados + estadísticas leídas de ResumenPrecioProducto (JOIN)
+2. Precios por farmacia precargados con prefetch_related
+
+La comparación de precios (/comparar-precios/ y su versión por lote) usa también
+dos consultas fijas: productos + resumen y todos sus precios ordenados.
+
+La serialización usa los pasos precompilados de login/services/serializacion_rapida.py.
+"""
+from itertools import groupby
+from django.conf import settings
+from django.core.exceptions import ObjectDoesNotExist
+from django.db.models import Prefetch
+from login.models import Producto, ProductoFarmacia
+from login.serializers import ProductoSerializer, ProductoFarmaciaSerializer
+from login.services.busqueda import buscar_productos
+from login.services.busqueda_difusa import buscar_productos_difuso
+from login.services.campos import optimizar_queryset
+from login.services.serializacion_rapida import serializar_rapido
+
+MAX_ITEMS_LOTE = getattr(settings, 'COMPARACION_PRECIOS', {}).get('MAX_ITEMS_LOTE', 100)
+
+
+class LoteInvalido(ValueError):
+    """El cuerpo de /comparar-precios/lote/ no es válido"""
+
+
+def productos_con_precios(queryset=None):
+    """
+    Une el resumen de precios y precarga los precios por farmacia
+
+    Args:
+        queryset (QuerySet): Productos a consultar (por defecto todos)
+
+    Returns:
+        QuerySet: Productos con resumen_precios y precios precargados
+    """
+    if queryset is None:
+        queryset = Producto.objects.all()
+
+    return queryset.select_related('resumen_precios').prefetch_related(
+        Prefetch(
+            'precios_por_farmacia',
+            queryset=ProductoFarmacia.objects.select_related('farmacia')
+        )
+    )
+
+
+def filtrar_productos(queryset, params):
+    """
+    Aplica los filtros comunes del catálogo a partir de los query params
+
+    Filtros soportados:
+    - categoria: coincidencia parcial en la categoría
+    - requiere_receta: true/1/yes
+    - search: búsqueda de texto completo en nombre_generico, nombre_comercial y
+      principio_activo, ordenada por relevancia (ver login/services/busqueda.py)
+    - fuzzy: true para que search tolere errores de escritura (ver login/services/busqueda_difusa.py)
+    - con_precios: true para devolver solo productos con precios en farmacias
+
+    Args:
+        queryset (QuerySet): Productos anotados con productos_con_precios()
+        params (QueryDict): request.query_params
+
+    Returns:
+        QuerySet: Productos filtrados
+    """
+    categoria = params.get('categoria')
+    if categoria:
+        queryset = queryset.filter(categoria__icontains=categoria)
+
+    requiere_receta = params.get('requiere_receta')
+    if requiere_receta:
+        requiere = requiere_receta.lower() in ['true', '1', 'yes']
+        queryset = queryset.filter(requiere_receta=requiere)
+
+    search = params.get('search')
+    if search:
+        fuzzy = params.get('fuzzy')
+        if fuzzy and fuzzy.lower() == 'true':
+            queryset = buscar_productos_difuso(queryset, search)
+        else:
+            queryset = buscar_productos(queryset, search)
+
+    con_precios = params.get('con_precios')
+    if con_precios and con_precios.lower() == 'true':
+        # Solo los productos con precios tienen fila en ResumenPrecioProducto
+        queryset = queryset.filter(resumen_precios__isnull=False)
+
+    return queryset
+
+
+def orden_catalogo(params):
+    """
+    Claves de paginación del catálogo: por relevancia si hay búsqueda, si no por id
+
+    Returns:
+        dict: Argumentos claves/descendente para paginar()
+    """
+    if params.get('search'):
+        return {'claves': ('relevancia', 'pk'), 'descendente': True}
+    return {'claves': ('pk',), 'descendente': False}
+
+
+def obtener_resumen(producto):
+    """
+    Devuelve el ResumenPrecioProducto del producto, o None si no tiene precios
+    """
+    try:
+        return producto.resumen_precios
+    except ObjectDoesNotExist:
+        return None
+
+
+def serializar_producto(producto):
+    """
+    Serializa un producto anotado con sus precios y estadísticas
+
+    Args:
+        producto (Producto): Instancia obtenida con productos_con_precios()
+
+    Returns:
+        dict: Producto con precios_por_farmacia, precio_minimo, precio_maximo y precio_promedio
+    """
+    producto_dict = serializar_rapido(producto, ProductoSerializer, many=False)
+    producto_dict['precios_por_farmacia'] = serializar_rapido(
+        producto.precios_por_farmacia.all(), ProductoFarmaciaSerializer
+    )
+
+    resumen = obtener_resumen(producto)
+    if resumen is not None:
+        producto_dict['precio_minimo'] = float(resumen.precio_minimo)
+        producto_dict['precio_maximo'] = float(resumen.precio_maximo)
+        producto_dict['precio_promedio'] = float(resumen.precio_promedio)
+    else:
+        producto_dict['precio_minimo'] = None
+        producto_dict['precio_maximo'] = None
+        producto_dict['precio_promedio'] = None
+
+    return producto_dict
+
+
+def serializar_catalogo(queryset):
+    """
+    Serializa una lista de productos anotados
+
+    Args:
+        queryset (QuerySet): Productos obtenidos con productos_con_precios()
+
+    Returns:
+        list: Lista de diccionarios (ver serializar_producto)
+    """
+    return [serializar_producto(producto) for producto in queryset]
+
+
+def comparacion_precios(producto, precios_data):
+    """
+    Arma la respuesta de /comparar-precios/ para un producto
+
+    Args:
+        producto (Producto): Producto con resumen_precios y farmacia_mas_barata cargados
+        precios_data (list): Sus precios ya serializados, de menor a mayor
+
+    Returns:
+        dict: producto, estadisticas, precios_por_farmacia y total_farmacias
+            (o un mensaje si el producto no tiene precios)
+    """
+    resumen = obtener_resumen(producto)
+    if not precios_data or resumen is None:
+        return {
+            'producto': {
+                'id': producto.id_producto,
+                'nombre_comercial': producto.nombre_comercial,
+                'nombre_generico': producto.nombre_generico,
+            },
+            'precios_por_farmacia': [],
+            'mensaje': 'Este producto aún no tiene precios registrados en farmacias'
+        }
+
+    # Estadísticas desde la tabla de resumen
+    precio_min = float(resumen.precio_minimo)
+    precio_max = float(resumen.precio_maximo)
+    precio_promedio = float(resumen.precio_promedio)
+    farmacia_mas_barata = resumen.farmacia_mas_barata
+
+    return {
+        'producto': {
+            'id': producto.id_producto,
+            'nombre_comercial': producto.nombre_comercial,
+            'nombre_generico': producto.nombre_generico,
+            'presentacion': producto.presentacion,
+            'concentracion': producto.concentracion
+        },
+        'estadisticas': {
+            'precio_minimo': precio_min,
+            'precio_maximo': precio_max,
+            'precio_promedio': round(precio_promedio, 2),
+            'diferencia': round(precio_max - precio_min, 2),
+            'ahorro_porcentual': round(((precio_max - precio_min) / precio_max * 100), 2) if precio_max > 0 else 0,
+            'farmacia_mas_barata': {
+                'id_farmacia': farmacia_mas_barata.id_farmacia,
+                'nombre_comercial': farmacia_mas_barata.nombre_comercial
+            } if farmacia_mas_barata else None
+        },
+        'precios_por_farmacia': precios_data,
+        'total_farmacias': len(precios_data)
+    }
+
+
+def _entero_positivo(valor):
+    if isinstance(valor, bool):
+        raise LoteInvalido('Los ids deben ser enteros')
+    try:
+        valor = int(valor)
+    except (TypeError, ValueError):
+        raise LoteInvalido('Los ids deben ser enteros')
+    if valor < 1:
+        raise LoteInvalido('Los ids deben ser enteros positivos')
+    return valor
+
+
+def leer_items_lote(data):
+    """
+    Valida el cuerpo de /comparar-precios/lote/
+
+    Cada elemento de 'items' puede ser un id de producto (5), un par
+    [producto, farmacia] ([5, 2]) o un objeto {"producto": 5, "farmacia": 2}.
+
+    Returns:
+        list: Tuplas (producto_id, farmacia_id o None) en el orden recibido
+
+    Raises:
+        LoteInvalido: Si el cuerpo no tiene el formato esperado
+    """
+    items = data.get('items') if isinstance(data, dict) else None
+    if items is None and isinstance(data, dict):
+        items = data.get('productos')
+    if not isinstance(items, list) or not items:
+        raise LoteInvalido('Se requiere "items": lista de ids de producto o pares (producto, farmacia)')
+    if len(items) > MAX_ITEMS_LOTE:
+        raise LoteInvalido(f'Máximo {MAX_ITEMS_LOTE} items por solicitud')
+
+    pares = []
+    for item in items:
+        if isinstance(item, dict):
+            if 'producto' not in item:
+                raise LoteInvalido('Cada objeto debe incluir "producto"')
+            farmacia = item.get('farmacia')
+            pares.append((
+                _entero_positivo(item['producto']),
+                _entero_positivo(farmacia) if farmacia is not None else None,
+            ))
+        elif isinstance(item, (list, tuple)):
+            if len(item) != 2:
+                raise LoteInvalido('Los pares deben tener la forma [producto, farmacia]')
+            pares.append((_entero_positivo(item[0]), _entero_positivo(item[1])))
+        else:
+            pares.append((_entero_positivo(item), None))
+    return pares
+
+
+def comparar_precios_lote(pares, opciones=None):
+    """
+    Compara precios de varios productos con dos consultas, sin importar cuántos sean
+
+    Args:
+        pares (list): Tuplas (producto_id, farmacia_id o None) de leer_items_lote()
+        opciones (dict): campos/expandir de opciones_serializacion() para cada precio
+
+    Returns:
+        tuple: (resultados en el orden de los pares, ids de producto no encontrados)
+            Cada resultado es el de comparacion_precios(); si el par indica farmacia
+            se agregan 'farmacia_solicitada' y 'precio_solicitado' (None si esa
+            farmacia no vende el producto).
+    """
+    opciones = opciones or {}
+    producto_ids = {producto_id for producto_id, _ in pares}
+
+    # Consulta 1: productos con su resumen y farmacia más barata
+    productos = Producto.objects.select_related(
+        'resumen_precios', 'resumen_precios__farmacia_mas_barata'
+    ).in_bulk(producto_ids)
+
+    # Consulta 2: todos los precios de esos productos, agrupados y de menor a mayor
+    precios = list(optimizar_queryset(
+        ProductoFarmacia.objects.filter(producto_id__in=productos.keys()),
+        ProductoFarmaciaSerializer(**opciones), columnas_extra=('producto', 'farmacia', 'precio')
+    ).order_by('producto_id', 'precio', 'id_producto_farmacia'))
+    precios_data = serializar_rapido(precios, ProductoFarmaciaSerializer, **opciones)
+
+    por_producto = {}
+    filas = zip(precios, precios_data)
+    for producto_id, grupo in groupby(filas, key=lambda fila: fila[0].producto_id):
+        grupo = list(grupo)
+        por_producto[producto_id] = (
+            {precio.farmacia_id: data for precio, data in grupo},
+            [data for _, data in grupo],
+        )
+
+    comparaciones = {}
+    resultados, no_encontrados = [], []
+    for producto_id, farmacia_id in pares:
+        producto = productos.get(producto_id)
+        if producto is None:
+            if producto_id not in no_encontrados:
+                no_encontrados.append(producto_id)
+            continue
+
+        por_farmacia, lista = por_producto.get(producto_id, ({}, []))
+        if producto_id not in comparaciones:
+            comparaciones[producto_id] = comparacion_precios(producto, lista)
+        resultado = dict(comparaciones[producto_id])
+        if farmacia_id is not None:
+            resultado['farmacia_solicitada'] = farmacia_id
+            resultado['precio_solicitado'] = por_farmacia.get(farmacia_id)
+        resultados.append(resultado)
+
+    return resultados, no_encontrados
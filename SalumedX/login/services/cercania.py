@@ -0,0 +1,160 @@
+"""
+Sucursales cercanas resueltas por la base de datos (sin el índice en memoria).
+
+Para workers de vida corta, donde armar el índice de login/services/indice_geografico.py
+en cada proceso no compensa. La consulta no recorre toda la tabla:
+1. Caja de latitud/longitud alrededor del punto (índice login_sucursal_lat_lng_idx)
+2. Celda geohash del punto y sus 8 vecinas, como rangos de prefijo
+   (índice login_sucursal_geohash_idx, ver login/services/geohash.py)
+3. Distancia exacta con haversine sobre los candidatos, en Python
+
+Funciona igual en SQLite y PostgreSQL: solo usa comparaciones de columnas.
+"""
+import math
+from django.db.models import Q
+from login.models import Sucursal
+from login.services import geohash
+from login.services.indice_geografico import haversine_km
+
+# Radios probados cuando se piden las k más cercanas sin radio_km
+ESCALONES_KM = (1, 5, 25, 100)
+
+
+def caja(lat, lng, radio_km):
+    """
+    Caja de latitud/longitud que contiene el círculo de radio_km alrededor del punto
+
+    Returns:
+        Q: Filtro sobre latitud/longitud (la longitud se parte en dos rangos si
+            cruza el antimeridiano y se omite si la caja toca un polo)
+    """
+    d_lat = radio_km / geohash.KM_POR_GRADO
+    lat_min, lat_max = lat - d_lat, lat + d_lat
+    filtro = Q(latitud__gte=max(lat_min, -90.0), latitud__lte=min(lat_max, 90.0))
+    if lat_min <= -90 or lat_max >= 90:
+        return filtro
+
+    d_lng = d_lat / math.cos(math.radians(max(abs(lat_min), abs(lat_max))))
+    if d_lng >= 180:
+        return filtro
+    lng_min, lng_max = lng - d_lng, lng + d_lng
+    if lng_min < -180:
+        return filtro & (Q(longitud__gte=lng_min + 360) | Q(longitud__lte=lng_max))
+    if lng_max > 180:
+        return filtro & (Q(longitud__gte=lng_min) | Q(longitud__lte=lng_max - 360))
+    return filtro & Q(longitud__gte=lng_min, longitud__lte=lng_max)
+
+
+def prefijos_geohash(lat, lng, radio_km):
+    """
+    Filtro por las celdas geohash que cubren el círculo (Q vacío si el radio es muy
+    grande o el círculo llega a un polo; queda solo la caja)
+    """
+    precision = geohash.precision_para_radio(lat, radio_km)
+    if not precision:
+        return Q()
+    filtro = Q()
+    for celda in geohash.vecinas(lat, lng, precision):
+        rango = Q(geohash__gte=celda)
+        siguiente = geohash.siguiente_prefijo(celda)
+        if siguiente:
+            rango &= Q(geohash__lt=siguiente)
+        filtro |= rango
+    return filtro
+
+
+def filtro_cercania(lat, lng, radio_km):
+    """Prefiltro indexado de las sucursales que pueden estar a menos de radio_km"""
+    return caja(lat, lng, radio_km) & prefijos_geohash(lat, lng, radio_km)
+
+
+def _con_distancia(filas, lat, lng, radio_km):
+    """(distancia_km, fila) de las filas a menos de radio_km, de la más cercana a la más lejana"""
+    resultado = []
+    for fila in filas:
+        distancia = haversine_km(lat, lng, float(fila[4]), float(fila[5]))
+        if radio_km is None or distancia <= radio_km:
+            resultado.append((distancia, fila))
+    resultado.sort(key=lambda par: (par[0], par[1][0]))
+    return resultado
+
+
+def sucursales_en_radio(lat, lng, radio_km, queryset=None, limite=None):
+    """
+    Sucursales a menos de radio_km, de la más cercana a la más lejana
+
+    Args:
+        queryset (QuerySet): Sucursales a considerar (ej: filtradas por farmacia)
+        limite (int): Máximo de candidatos del prefiltro; si hay más se devuelve None
+
+    Returns:
+        list: (distancia_km, (id_sucursal, farmacia_id, nombre farmacia, ubicacion, latitud, longitud))
+    """
+    if queryset is None:
+        queryset = Sucursal.objects.all()
+    filas = queryset.filter(filtro_cercania(lat, lng, radio_km)).values_list(
+        'id_sucursal', 'farmacia_id', 'farmacia__nombre_comercial', 'ubicacion', 'latitud', 'longitud'
+    )
+    if limite is not None:
+        filas = list(filas[:limite + 1])
+        if len(filas) > limite:
+            return None
+    return _con_distancia(filas, lat, lng, radio_km)
+
+
+def _resultado(distancia, fila):
+    id_sucursal, farmacia_id, nombre_farmacia, ubicacion, latitud, longitud = fila
+    return {
+        'id_sucursal': id_sucursal,
+        'ubicacion': ubicacion,
+        'latitud': float(latitud),
+        'longitud': float(longitud),
+        'farmacia': {'id_farmacia': farmacia_id, 'nombre_comercial': nombre_farmacia},
+        'distancia_km': round(distancia, 3),
+    }
+
+
+def sucursales_cercanas_bd(lat, lng, k, radio_km=None):
+    """
+    Las k sucursales más cercanas (opcionalmente dentro de radio_km), consultando la base de datos
+
+    Sin radio_km se prueban radios crecientes (ESCALONES_KM) hasta reunir k
+    sucursales; solo si no alcanzan se recorre la tabla completa.
+
+    Returns:
+        list: Mismo formato que IndiceSucursales.cercanas()
+    """
+    radios = [r for r in ESCALONES_KM if radio_km is None or r < radio_km]
+    if radio_km is not None:
+        radios.append(radio_km)
+
+    for radio in radios:
+        encontradas = sucursales_en_radio(lat, lng, radio)
+        if len(encontradas) >= k or radio == radio_km:
+            return [_resultado(*par) for par in encontradas[:k]]
+
+    filas = Sucursal.objects.values_list(
+        'id_sucursal', 'farmacia_id', 'farmacia__nombre_comercial', 'ubicacion', 'latitud', 'longitud'
+    )
+    return [_resultado(*par) for par in _con_distancia(filas, lat, lng, None)[:k]]
+
+
+def mas_cercana_por_farmacia(lat, lng, radio_km, farmacia_ids):
+    """
+    Sucursal más cercana de cada farmacia, si está a menos de radio_km
+
+    Returns:
+        dict: {id_farmacia: (distancia_km, fila)} con fila como en sucursales_en_radio()
+    """
+    encontradas = sucursales_en_radio(
+        lat, lng, radio_km, Sucursal.objects.filter(farmacia_id__in=set(farmacia_ids))
+    )
+    return por_farmacia(encontradas)
+
+
+def por_farmacia(encontradas):
+    """Primera (la más cercana) de cada farmacia en una lista de sucursales_en_radio()"""
+    mas_cercanas = {}
+    for distancia, fila in encontradas:
+        mas_cercanas.setdefault(fila[1], (distancia, fila))
+    return mas_cercanas
@@ -0,0 +1,104 @@
+"""
+GET condicional (ETag / Last-Modified) para los endpoints de catálogo y precios.
+
+Los validadores salen solo de la base de datos, así que todos los workers
+calculan los mismos para los mismos datos:
+- ProductoFarmacia: MAX(fecha_actualizacion) y COUNT(*), filtrada igual que el endpoint
+- PrecioEliminado: MAX(fecha_eliminacion) con el mismo filtro (al eliminar el precio
+  más reciente, el MAX de arriba retrocede y Last-Modified no debe retroceder)
+- Producto y Farmacia (no guardan fecha de modificación): versión y fecha del
+  último cambio en login.models.VersionModelo (ver login/services/cache_respuestas.py)
+
+Si el cliente envía If-None-Match / If-Modified-Since y nada cambió, Django
+responde 304 sin ejecutar la vista ni los serializers.
+"""
+import hashlib
+from django.db.models import Max, Count
+from django.views.decorators.http import condition
+from login.models import Producto, Farmacia, ProductoFarmacia, PrecioEliminado
+from login.services.cache_respuestas import estado_modelos, normalizar_params
+
+
+def filtros_precios(params):
+    """Filtros de ProductoFarmacia según ?producto= / ?farmacia= (y sus alias id_*)"""
+    filtros = {}
+    producto_id = params.get('producto') or params.get('id_producto')
+    if producto_id:
+        filtros['producto_id'] = producto_id
+    farmacia_id = params.get('farmacia') or params.get('id_farmacia')
+    if farmacia_id:
+        filtros['farmacia_id'] = farmacia_id
+    return filtros
+
+
+def filtros_producto(params):
+    """Filtros de ProductoFarmacia para /productos/ (solo ?id= reduce el alcance)"""
+    producto_id = params.get('id')
+    return {'producto_id': producto_id} if producto_id else {}
+
+
+# Mismos filtros sobre PrecioEliminado, que guarda los ids sin FK
+_CAMPOS_ELIMINADOS = {'producto_id': 'id_producto', 'farmacia_id': 'id_farmacia'}
+
+
+def _validadores(request, endpoint, obtener_filtros):
+    """
+    Calcula (etag, last_modified) una sola vez por request
+
+    Returns:
+        tuple: (str, datetime) o (None, None) si los parámetros no son válidos
+    """
+    if hasattr(request, '_validadores_condicionales'):
+        return request._validadores_condicionales
+
+    try:
+        filtros = obtener_filtros(request.GET)
+        stats = ProductoFarmacia.objects.filter(**filtros).aggregate(
+            ultima=Max('fecha_actualizacion'), total=Count('pk')
+        )
+        eliminado = PrecioEliminado.objects.filter(
+            **{_CAMPOS_ELIMINADOS[campo]: valor for campo, valor in filtros.items()}
+        ).aggregate(ultima=Max('fecha_eliminacion'))['ultima']
+    except (ValueError, TypeError):
+        # IDs no numéricos: la vista responderá con el error correspondiente
+        request._validadores_condicionales = (None, None)
+        return request._validadores_condicionales
+
+    estados = estado_modelos((Producto, Farmacia))
+    fechas = [fecha for fecha in (stats['ultima'], eliminado) if fecha]
+    last_modified = max(fechas + [fecha for _, fecha in estados])
+
+    firma = '|'.join([
+        endpoint,
+        normalizar_params(request.GET),
+        stats['ultima'].isoformat() if stats['ultima'] else '',
+        str(stats['total']),
+        eliminado.isoformat() if eliminado else '',
+        *[str(version) for version, _ in estados],
+    ])
+    etag = 'W/"' + hashlib.md5(firma.encode()).hexdigest() + '"'
+
+    request._validadores_condicionales = (etag, last_modified)
+    return request._validadores_condicionales
+
+
+def get_condicional(endpoint, obtener_filtros):
+    """
+    Decorador que agrega ETag/Last-Modified y responde 304 cuando corresponde
+
+    Se coloca encima de @api_view para que el 304 se resuelva antes de DRF:
+        @get_condicional('productos', filtros_producto)
+        @api_view(['GET'])
+        ...
+
+    Args:
+        endpoint (str): Nombre del endpoint (forma parte del ETag)
+        obtener_filtros (callable): Recibe request.GET y devuelve filtros de ProductoFarmacia
+    """
+    def etag_func(request, *args, **kwargs):
+        return _validadores(request, endpoint, obtener_filtros)[0]
+
+    def last_modified_func(request, *args, **kwargs):
+        return _validadores(request, endpoint, obtener_filtros)[1]
+
+    return condition(etag_func=etag_func, last_modified_func=last_modified_func)
@@ -0,0 +1,109 @@
+"""
+Distancia del paciente a cada farmacia (DetallePrescripcion.distancia).
+
+La distancia a una farmacia es la de su sucursal más cercana. Se calcula en el
+servidor para todas las farmacias de una vez: una sola consulta trae las
+coordenadas de todas sus sucursales y la fórmula de haversine se aplica sobre
+arreglos de NumPy (todas las sucursales en una operación), tomando luego el
+mínimo por farmacia.
+
+Sin NumPy instalado se usa el mismo cálculo en Python puro, sucursal por sucursal.
+"""
+import math
+from decimal import Decimal, ROUND_HALF_UP
+from login.models import Sucursal
+from login.services.indice_geografico import RADIO_TIERRA_KM, haversine_km
+
+try:
+    import numpy as np
+except ImportError:  # Dependencia opcional: sin numpy se calcula en Python
+    np = None
+
+# DetallePrescripcion.distancia es DecimalField(max_digits=6, decimal_places=2)
+DISTANCIA_MAXIMA_KM = Decimal('9999.99')
+CENTESIMOS = Decimal('0.01')
+
+
+def parsear_ubicacion(data):
+    """
+    Lee la ubicación del paciente (lat, lng) del cuerpo de la petición
+
+    Returns:
+        tuple: (lat, lng) en grados, o None si no se envió
+
+    Raises:
+        ValueError: Si falta una de las dos coordenadas o está fuera de rango
+    """
+    lat, lng = data.get('lat'), data.get('lng')
+    if lat in (None, '') and lng in (None, ''):
+        return None
+    try:
+        lat, lng = float(lat), float(lng)
+    except (TypeError, ValueError):
+        raise ValueError('La ubicación del paciente requiere "lat" y "lng" (grados decimales)')
+    if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+        raise ValueError('Coordenadas fuera de rango: lat entre -90 y 90, lng entre -180 y 180')
+    return lat, lng
+
+
+def _minimos_numpy(farmacias, latitudes, longitudes, lat, lng):
+    """Distancia mínima por farmacia; las filas vienen ordenadas por farmacia"""
+    farmacias = np.asarray(farmacias)
+    lat2 = np.radians(np.asarray(latitudes, dtype=np.float64))
+    lng2 = np.radians(np.asarray(longitudes, dtype=np.float64))
+    lat1, lng1 = math.radians(lat), math.radians(lng)
+
+    a = (np.sin((lat2 - lat1) / 2) ** 2
+         + math.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2)
+    distancias = 2 * RADIO_TIERRA_KM * np.arcsin(np.minimum(1.0, np.sqrt(a)))
+
+    # Inicio de cada farmacia en el arreglo ordenado y mínimo de cada tramo
+    inicios = np.flatnonzero(np.r_[True, farmacias[1:] != farmacias[:-1]])
+    minimos = np.minimum.reduceat(distancias, inicios)
+    return dict(zip(farmacias[inicios].tolist(), minimos.tolist()))
+
+
+def _minimos_python(farmacias, latitudes, longitudes, lat, lng):
+    minimos = {}
+    for farmacia, lat2, lng2 in zip(farmacias, latitudes, longitudes):
+        distancia = haversine_km(lat, lng, lat2, lng2)
+        if distancia < minimos.get(farmacia, math.inf):
+            minimos[farmacia] = distancia
+    return minimos
+
+
+def distancias_a_farmacias(lat, lng, farmacia_ids):
+    """
+    Distancia en km desde (lat, lng) hasta la sucursal más cercana de cada farmacia
+
+    Returns:
+        dict: {id_farmacia: km}; las farmacias sin sucursales no aparecen
+    """
+    filas = Sucursal.objects.filter(farmacia_id__in=set(farmacia_ids)).order_by('farmacia_id').values_list(
+        'farmacia_id', 'latitud', 'longitud'
+    )
+    if not filas:
+        return {}
+    farmacias, latitudes, longitudes = zip(*((f, float(a), float(b)) for f, a, b in filas))
+    calcular = _minimos_numpy if np is not None else _minimos_python
+    return calcular(farmacias, latitudes, longitudes, lat, lng)
+
+
+def asignar_distancias(detalles, lat, lng):
+    """
+    Completa distancia en los DetallePrescripcion (sin guardar) según la ubicación del paciente
+
+    Los detalles cuya farmacia no tiene sucursales conservan la distancia que traían.
+
+    Returns:
+        int: Detalles con distancia calculada
+    """
+    distancias = distancias_a_farmacias(lat, lng, [detalle.farmacia_id for detalle in detalles])
+    calculados = 0
+    for detalle in detalles:
+        km = distancias.get(detalle.farmacia_id)
+        if km is None:
+            continue
+        detalle.distancia = min(Decimal(km).quantize(CENTESIMOS, ROUND_HALF_UP), DISTANCIA_MAXIMA_KM)
+        calculados += 1
+    return calculados
@@ -0,0 +1,147 @@
+"""
+Exportación completa del catálogo en streaming (NDJSON y CSV).
+
+Cada exportación es una sola consulta recorrida con .iterator(chunk_size=...):
+en PostgreSQL usa un cursor del lado del servidor y en SQLite lee por bloques,
+así la memoria del proceso no depende del tamaño de las tablas. Las filas se
+convierten y se envían en bloques a medida que llegan; el primer byte sale en
+cuanto la base de datos devuelve el primer bloque (el encabezado CSV, antes).
+
+- lineas_productos_ndjson(): un producto por línea, con sus precios por farmacia
+  (LEFT JOIN Producto -> ProductoFarmacia -> Farmacia, agrupado por producto)
+- lineas_precios_csv(): una fila por ProductoFarmacia con producto y farmacia
+"""
+import csv
+from itertools import groupby
+from django.conf import settings
+from rest_framework import serializers
+from login.models import Producto, Farmacia, ProductoFarmacia
+from login.renderers import JSONRapidoRenderer
+from login.services.serializacion_rapida import convertidor_decimal, fecha_hora_iso, zona_actual
+
+EXPORTACION = getattr(settings, 'EXPORTACION', {})
+CHUNK_SIZE = EXPORTACION.get('CHUNK_SIZE', 2000)
+LINEAS_POR_BLOQUE = EXPORTACION.get('LINEAS_POR_BLOQUE', 200)
+
+CAMPOS_PRODUCTO = tuple(campo.name for campo in Producto._meta.concrete_fields)
+CAMPOS_FARMACIA = tuple(campo.name for campo in Farmacia._meta.concrete_fields)
+CAMPOS_RESUMEN = ('precio_minimo', 'precio_maximo', 'precio_promedio')
+
+# Mismo formato que ProductoFarmaciaSerializer
+_precio = convertidor_decimal(serializers.DecimalField(max_digits=10, decimal_places=2))
+_campo_fecha = serializers.DateTimeField()
+
+
+def _convertidor_fecha():
+    """Formato de DateTimeField con la zona horaria resuelta una vez por exportación"""
+    zona = zona_actual()
+    if zona is None:
+        return _campo_fecha.to_representation
+    return lambda valor: fecha_hora_iso(valor, zona) if valor is not None else None
+
+
+def _en_bloques(lineas):
+    """
+    Agrupa las líneas para no escribir en el socket una por una
+
+    La primera línea se envía sola para que el cliente reciba datos de inmediato.
+    """
+    lineas = iter(lineas)
+    for linea in lineas:
+        yield linea
+        break
+
+    bloque = []
+    for linea in lineas:
+        bloque.append(linea)
+        if len(bloque) >= LINEAS_POR_BLOQUE:
+            yield b''.join(bloque)
+            bloque = []
+    if bloque:
+        yield b''.join(bloque)
+
+
+def _filas_catalogo():
+    columnas = (
+        *CAMPOS_PRODUCTO,
+        *(f'resumen_precios__{campo}' for campo in CAMPOS_RESUMEN),
+        'precios_por_farmacia__id_producto_farmacia',
+        'precios_por_farmacia__precio',
+        'precios_por_farmacia__fecha_actualizacion',
+        *(f'precios_por_farmacia__farmacia__{campo}' for campo in CAMPOS_FARMACIA),
+    )
+    return Producto.objects.order_by(
+        'id_producto', 'precios_por_farmacia__precio', 'precios_por_farmacia__id_producto_farmacia'
+    ).values_list(*columnas).iterator(chunk_size=CHUNK_SIZE)
+
+
+def _producto_ndjson(filas, fecha):
+    """Arma el dict de un producto a partir de sus filas del JOIN (una por precio)"""
+    n_producto = len(CAMPOS_PRODUCTO)
+    n_resumen = n_producto + len(CAMPOS_RESUMEN)
+
+    primera = filas[0]
+    producto = dict(zip(CAMPOS_PRODUCTO, primera[:n_producto]))
+    producto['precios_por_farmacia'] = [
+        {
+            'id_producto_farmacia': fila[n_resumen],
+            'farmacia': dict(zip(CAMPOS_FARMACIA, fila[n_resumen + 3:])),
+            'precio': _precio(fila[n_resumen + 1]),
+            'fecha_actualizacion': fecha(fila[n_resumen + 2]),
+        }
+        for fila in filas if fila[n_resumen] is not None  # LEFT JOIN: producto sin precios
+    ]
+    for campo, valor in zip(CAMPOS_RESUMEN, primera[n_producto:n_resumen]):
+        producto[campo] = float(valor) if valor is not None else None
+    return producto
+
+
+def lineas_productos_ndjson():
+    """
+    Genera el catálogo en NDJSON: un producto por línea, en bloques de bytes
+
+    Cada línea tiene los campos de Producto, precios_por_farmacia (farmacia, precio,
+    fecha_actualizacion; ordenados de menor a mayor precio) y precio_minimo,
+    precio_maximo y precio_promedio (null si no tiene precios).
+    """
+    renderer = JSONRapidoRenderer()
+
+    def lineas():
+        fecha = _convertidor_fecha()
+        for _, filas in groupby(_filas_catalogo(), key=lambda fila: fila[0]):
+            yield renderer.render(_producto_ndjson(list(filas), fecha)) + b'\n'
+
+    return _en_bloques(lineas())
+
+
+class _Eco:
+    """Buffer mínimo para csv.writer: devuelve la línea en lugar de guardarla"""
+
+    def write(self, valor):
+        return valor
+
+
+ENCABEZADO_PRECIOS = (
+    'id_producto_farmacia', 'id_producto', 'nombre_comercial', 'nombre_generico',
+    'id_farmacia', 'farmacia', 'precio', 'fecha_actualizacion',
+)
+
+
+def lineas_precios_csv():
+    """
+    Genera todos los precios en CSV (UTF-8, con encabezado), en bloques de bytes
+    """
+    escritor = csv.writer(_Eco())
+
+    def lineas():
+        yield escritor.writerow(ENCABEZADO_PRECIOS).encode()
+        fecha = _convertidor_fecha()
+        filas = ProductoFarmacia.objects.order_by('id_producto_farmacia').values_list(
+            'id_producto_farmacia', 'producto_id', 'producto__nombre_comercial',
+            'producto__nombre_generico', 'farmacia_id', 'farmacia__nombre_comercial',
+            'precio', 'fecha_actualizacion',
+        ).iterator(chunk_size=CHUNK_SIZE)
+        for *datos, precio, valor_fecha in filas:
+            yield escritor.writerow((*datos, _precio(precio), fecha(valor_fecha))).encode()
+
+    return _en_bloques(lineas())
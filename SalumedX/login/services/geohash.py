@@ -0,0 +1,100 @@
+"""
+Geohash: codifica una latitud/longitud en un texto base32 donde cada carácter
+subdivide la celda anterior, así los puntos cercanos comparten prefijo.
+
+Se guarda en Sucursal.geohash (ver login/signals.py y la migración 0011) para
+que la base de datos filtre "cerca de X" con un índice B-tree: un prefijo es un
+rango de texto (geohash >= 'd2v' AND geohash < 'd2w'), que tanto SQLite como
+PostgreSQL resuelven con el índice, a diferencia de LIKE 'd2v%'.
+
+Tamaño aproximado de la celda por precisión (en el ecuador):
+1: 5000 km, 2: 1250 x 625 km, 3: 156 km, 4: 39 x 19.5 km, 5: 4.9 km,
+6: 1.2 x 0.61 km, 7: 153 m, 8: 38 x 19 m, 9: 4.8 m
+"""
+import math
+
+BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+PRECISION = 9
+KM_POR_GRADO = 111.195
+
+
+def codificar(lat, lng, precision=PRECISION):
+    """Geohash de una coordenada en grados"""
+    lat_min, lat_max, lng_min, lng_max = -90.0, 90.0, -180.0, 180.0
+    lat, lng = float(lat), float(lng)
+    resultado, bits, valor, par = [], 0, 0, True
+    while len(resultado) < precision:
+        if par:
+            medio = (lng_min + lng_max) / 2
+            if lng >= medio:
+                valor = valor * 2 + 1
+                lng_min = medio
+            else:
+                valor *= 2
+                lng_max = medio
+        else:
+            medio = (lat_min + lat_max) / 2
+            if lat >= medio:
+                valor = valor * 2 + 1
+                lat_min = medio
+            else:
+                valor *= 2
+                lat_max = medio
+        par = not par
+        bits += 1
+        if bits == 5:
+            resultado.append(BASE32[valor])
+            bits, valor = 0, 0
+    return ''.join(resultado)
+
+
+def tamano_celda(precision):
+    """(alto, ancho) de una celda en grados"""
+    bits = 5 * precision
+    return 180.0 / 2 ** (bits // 2), 360.0 / 2 ** ((bits + 1) // 2)
+
+
+def precision_para_radio(lat, radio_km):
+    """
+    Mayor precisión cuya celda mide al menos radio_km de alto y de ancho en el borde
+    del círculo más cercano al polo (donde las celdas son más angostas), así la celda
+    del punto y sus 8 vecinas cubren todo el círculo. 0 si ninguna alcanza o si el
+    círculo llega a un polo (ahí lo cubren todas las longitudes).
+    """
+    d_lat = radio_km / KM_POR_GRADO
+    borde = max(abs(float(lat) - d_lat), abs(float(lat) + d_lat))
+    if borde >= 90:
+        return 0
+    cos_lat = math.cos(math.radians(borde))
+    for precision in range(PRECISION, 0, -1):
+        alto, ancho = tamano_celda(precision)
+        if alto * KM_POR_GRADO >= radio_km and ancho * KM_POR_GRADO * cos_lat >= radio_km:
+            return precision
+    return 0
+
+
+def vecinas(lat, lng, precision):
+    """Geohash de la celda del punto y de sus 8 vecinas (sin repetir)"""
+    alto, ancho = tamano_celda(precision)
+    celdas = []
+    for d_lat in (-1, 0, 1):
+        lat_vecina = float(lat) + d_lat * alto
+        if not -90 <= lat_vecina <= 90:
+            continue
+        for d_lng in (-1, 0, 1):
+            # La longitud da la vuelta en el antimeridiano
+            lng_vecina = (float(lng) + d_lng * ancho + 180) % 360 - 180
+            celda = codificar(lat_vecina, lng_vecina, precision)
+            if celda not in celdas:
+                celdas.append(celda)
+    return celdas
+
+
+def siguiente_prefijo(prefijo):
+    """Menor texto mayor que todos los que empiezan por el prefijo ('d2v' -> 'd2w')"""
+    i = len(prefijo) - 1
+    while i >= 0 and prefijo[i] == BASE32[-1]:
+        i -= 1
+    if i < 0:
+        return None  # 'zzz': no hay cota superior
+    return prefijo[:i] + BASE32[BASE32.index(prefijo[i]) + 1]
@@ -0,0 +1,332 @@
+"""
+Índice espacial en memoria de las sucursales (k vecinos más cercanos y radio).
+
+Cada sucursal se guarda como un punto (x, y, z) sobre la esfera unitaria. La
+distancia en línea recta entre dos de esos puntos (cuerda) crece igual que la
+distancia sobre la superficie, así que un k-d tree de 3 dimensiones responde
+"las k más cercanas" y "las que están a menos de R km" sin aproximaciones y sin
+problemas en el antimeridiano o cerca de los polos. Las distancias devueltas se
+calculan con la fórmula de haversine.
+
+El árbol es estático (se arma ordenando por la mediana en cada nivel, con hojas
+de hasta TAMANO_HOJA puntos). Las altas, cambios y bajas que llegan por las
+señales de Sucursal (ver login/signals.py) se guardan aparte y se consultan por
+fuerza bruta; cuando se acumulan demasiadas el árbol se rearma desde memoria.
+Además se reconstruye desde la base de datos cada INDICE_GEOGRAFICO['TTL_SEGUNDOS']
+para recoger cambios hechos por otros workers. Como en el autocompletado (ver
+login/services/autocompletado.py), esa reconstrucción corre en un hilo aparte
+(una a la vez) y mientras tanto las consultas siguen usando el árbol anterior.
+"""
+import heapq
+import math
+import threading
+import time
+from django.conf import settings
+from django.db import connection
+from login.models import Farmacia, Sucursal
+
+INDICE_GEOGRAFICO = getattr(settings, 'INDICE_GEOGRAFICO', {})
+TTL_SEGUNDOS = INDICE_GEOGRAFICO.get('TTL_SEGUNDOS', 300)
+K_POR_DEFECTO = INDICE_GEOGRAFICO.get('K', 10)
+K_MAXIMO = INDICE_GEOGRAFICO.get('K_MAXIMO', 100)
+RADIO_MAXIMO_KM = INDICE_GEOGRAFICO.get('RADIO_MAXIMO_KM', 100)
+EN_MEMORIA = INDICE_GEOGRAFICO.get('EN_MEMORIA', True)
+TAMANO_HOJA = 16
+MAX_PENDIENTES = 256  # Cambios fuera del árbol antes de rearmarlo
+
+RADIO_TIERRA_KM = 6371.0088
+
+
+def vector(lat, lng):
+    """Punto (x, y, z) de la esfera unitaria para una latitud/longitud en grados"""
+    lat, lng = math.radians(lat), math.radians(lng)
+    cos_lat = math.cos(lat)
+    return (cos_lat * math.cos(lng), cos_lat * math.sin(lng), math.sin(lat))
+
+
+def cuerda_a_km(cuerda2):
+    """Distancia sobre la superficie (km) a partir del cuadrado de la cuerda"""
+    return 2 * RADIO_TIERRA_KM * math.asin(min(1.0, math.sqrt(cuerda2) / 2))
+
+
+def km_a_cuerda(km):
+    """Cuadrado de la cuerda equivalente a una distancia sobre la superficie (km)"""
+    return (2 * math.sin(min(km / RADIO_TIERRA_KM, math.pi) / 2)) ** 2
+
+
+def haversine_km(lat1, lng1, lat2, lng2):
+    """Distancia en km entre dos coordenadas en grados"""
+    lat1, lng1, lat2, lng2 = map(math.radians, (lat1, lng1, lat2, lng2))
+    a = (math.sin((lat2 - lat1) / 2) ** 2
+         + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2)
+    return 2 * RADIO_TIERRA_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def _distancia2(a, b):
+    dx, dy, dz = a[0] - b[0], a[1] - b[1], a[2] - b[2]
+    return dx * dx + dy * dy + dz * dz
+
+
+def _armar(puntos):
+    """
+    Arma el k-d tree como listas anidadas
+
+    Nodo interno: [eje, corte, izquierdo, derecho]; hoja: [None, puntos]
+    Cada punto es (x, y, z, id_sucursal).
+    """
+    if len(puntos) <= TAMANO_HOJA:
+        return [None, puntos]
+    # Eje con mayor dispersión: nodos más compactos que alternar x, y, z
+    eje = max(range(3), key=lambda e: max(p[e] for p in puntos) - min(p[e] for p in puntos))
+    puntos.sort(key=lambda p: p[eje])
+    medio = len(puntos) // 2
+    return [eje, puntos[medio][eje], _armar(puntos[:medio]), _armar(puntos[medio:])]
+
+
+class IndiceSucursales:
+    """
+    k-d tree de sucursales más los cambios recientes que aún no entraron al árbol
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._construccion = threading.Lock()  # Una sola reconstrucción a la vez
+        self._arbol = [None, []]
+        self._sucursales = {}     # id_sucursal -> (vector, datos)
+        self._farmacias = {}      # id_farmacia -> {'id_farmacia', 'nombre_comercial'}
+        self._pendientes = {}     # id_sucursal -> vector: altas/cambios fuera del árbol
+        self._invalidos = set()   # ids cuyo punto del árbol ya no vale (cambiados o eliminados)
+        self.construido_en = None
+        self.construccion_ms = None
+
+    @property
+    def construido(self):
+        return self.construido_en is not None
+
+    def construir(self):
+        """Reconstruye el índice completo desde la base de datos"""
+        inicio = time.perf_counter()
+        farmacias = {
+            id_farmacia: {'id_farmacia': id_farmacia, 'nombre_comercial': nombre}
+            for id_farmacia, nombre in Farmacia.objects.values_list('id_farmacia', 'nombre_comercial')
+        }
+        sucursales = {}
+        filas = Sucursal.objects.values_list(
+            'id_sucursal', 'farmacia_id', 'ubicacion', 'latitud', 'longitud'
+        ).iterator()
+        for id_sucursal, farmacia_id, ubicacion, latitud, longitud in filas:
+            sucursales[id_sucursal] = self._entrada(id_sucursal, farmacia_id, ubicacion, latitud, longitud)
+
+        arbol = self._armar_desde(sucursales)
+        with self._lock:
+            self._sucursales, self._farmacias = sucursales, farmacias
+            self._arbol, self._pendientes, self._invalidos = arbol, {}, set()
+            self.construido_en = time.monotonic()
+            self.construccion_ms = round((time.perf_counter() - inicio) * 1000, 2)
+
+    @staticmethod
+    def _entrada(id_sucursal, farmacia_id, ubicacion, latitud, longitud):
+        datos = {
+            'id_sucursal': id_sucursal,
+            'farmacia_id': farmacia_id,
+            'ubicacion': ubicacion,
+            'latitud': float(latitud),
+            'longitud': float(longitud),
+        }
+        return vector(datos['latitud'], datos['longitud']), datos
+
+    @staticmethod
+    def _armar_desde(sucursales):
+        return _armar([(*punto, id_sucursal) for id_sucursal, (punto, _) in sucursales.items()])
+
+    def _rearmar(self):
+        """Integra los cambios pendientes al árbol (con el lock tomado)"""
+        self._arbol = self._armar_desde(self._sucursales)
+        self._pendientes, self._invalidos = {}, set()
+
+    def actualizar(self, sucursal):
+        """Inserta o reemplaza una sucursal sin reconstruir el índice"""
+        if not self.construido:
+            return
+        if sucursal.farmacia_id not in self._farmacias:
+            self.actualizar_farmacia(sucursal.farmacia)
+        punto, datos = self._entrada(
+            sucursal.pk, sucursal.farmacia_id, sucursal.ubicacion, sucursal.latitud, sucursal.longitud
+        )
+        with self._lock:
+            self._sucursales[sucursal.pk] = (punto, datos)
+            self._invalidos.add(sucursal.pk)
+            self._pendientes[sucursal.pk] = punto
+            if len(self._pendientes) + len(self._invalidos) > MAX_PENDIENTES:
+                self._rearmar()
+
+    def eliminar(self, sucursal_id):
+        """Quita una sucursal del índice"""
+        if not self.construido:
+            return
+        with self._lock:
+            self._sucursales.pop(sucursal_id, None)
+            self._pendientes.pop(sucursal_id, None)
+            self._invalidos.add(sucursal_id)
+            if len(self._pendientes) + len(self._invalidos) > MAX_PENDIENTES:
+                self._rearmar()
+
+    def actualizar_farmacia(self, farmacia):
+        """Actualiza el nombre de la farmacia que se devuelve con sus sucursales"""
+        if not self.construido:
+            return
+        with self._lock:
+            self._farmacias[farmacia.pk] = {
+                'id_farmacia': farmacia.pk, 'nombre_comercial': farmacia.nombre_comercial
+            }
+
+    def _vigente(self):
+        """
+        Construye el índice en la primera consulta (una sola petición lo hace; las demás
+        esperan) y, si venció el TTL, lo reconstruye en segundo plano
+        """
+        if not self.construido:
+            with self._construccion:
+                if not self.construido:
+                    self.construir()
+        elif (time.monotonic() - self.construido_en) > TTL_SEGUNDOS and self._construccion.acquire(blocking=False):
+            threading.Thread(target=self._reconstruir, name='indice-sucursales', daemon=True).start()
+        with self._lock:
+            return self._arbol, dict(self._pendientes), frozenset(self._invalidos), self._sucursales
+
+    def _reconstruir(self):
+        try:
+            self.construir()
+        finally:
+            self._construccion.release()
+            connection.close()  # Conexión propia del hilo
+
+    def _resultado(self, entrada, cuerda2):
+        datos = dict(entrada[1])
+        farmacia_id = datos.pop('farmacia_id')
+        datos['farmacia'] = self._farmacias.get(farmacia_id, {'id_farmacia': farmacia_id})
+        datos['distancia_km'] = round(cuerda_a_km(cuerda2), 3)
+        return datos
+
+    def cercanas(self, lat, lng, k=K_POR_DEFECTO, radio_km=None, farmacias=None):
+        """
+        Devuelve las k sucursales más cercanas, opcionalmente dentro de radio_km
+
+        Args:
+            lat, lng (float): Punto de referencia en grados
+            k (int): Número máximo de resultados
+            radio_km (float): Distancia máxima (None = sin límite)
+            farmacias (set): Solo sucursales de estas farmacias (None = todas)
+
+        Returns:
+            list: Sucursales ordenadas por distancia, con farmacia y distancia_km
+        """
+        arbol, pendientes, invalidos, sucursales = self._vigente()
+        q = vector(lat, lng)
+        limite = km_a_cuerda(radio_km) if radio_km is not None else float('inf')
+
+        # Montículo de máximos (distancias negadas) con los k mejores hasta ahora
+        mejores = []
+
+        def considerar(d2, id_sucursal):
+            if d2 > limite:
+                return
+            if farmacias is not None:
+                entrada = sucursales.get(id_sucursal)
+                if entrada is None or entrada[1]['farmacia_id'] not in farmacias:
+                    return
+            if len(mejores) < k:
+                heapq.heappush(mejores, (-d2, -id_sucursal))
+            elif -d2 > mejores[0][0] or (-d2 == mejores[0][0] and -id_sucursal > mejores[0][1]):
+                heapq.heapreplace(mejores, (-d2, -id_sucursal))
+
+        def peor():
+            return -mejores[0][0] if len(mejores) >= k else limite
+
+        def visitar(nodo):
+            eje = nodo[0]
+            if eje is None:
+                for punto in nodo[1]:
+                    if punto[3] not in invalidos:
+                        considerar(_distancia2(q, punto), punto[3])
+                return
+            diferencia = q[eje] - nodo[1]
+            cerca, lejos = (nodo[3], nodo[2]) if diferencia >= 0 else (nodo[2], nodo[3])
+            visitar(cerca)
+            if diferencia * diferencia <= peor():
+                visitar(lejos)
+
+        if k > 0:
+            visitar(arbol)
+            for id_sucursal, punto in pendientes.items():
+                considerar(_distancia2(q, punto), id_sucursal)
+
+        ordenados = sorted((-d2, -id_neg) for d2, id_neg in mejores)
+        # Una sucursal eliminada durante la consulta simplemente no se devuelve
+        return [
+            self._resultado(sucursales[id_sucursal], d2) for d2, id_sucursal in ordenados
+            if id_sucursal in sucursales
+        ]
+
+    def estadisticas(self):
+        """Tamaño del índice y tiempo de la última construcción (para monitoreo)"""
+        return {
+            'construido': self.construido,
+            'sucursales': len(self._sucursales),
+            'pendientes': len(self._pendientes) + len(self._invalidos),
+            'construccion_ms': self.construccion_ms,
+        }
+
+
+# Índice compartido por todas las peticiones del proceso
+indice_sucursales = IndiceSucursales()
+
+
+def parsear_coordenadas(params):
+    """
+    Lee lat, lng, k y radio_km de los query params
+
+    Returns:
+        tuple: (lat, lng, k, radio_km o None)
+
+    Raises:
+        ValueError: Si falta algún parámetro o está fuera de rango
+    """
+    try:
+        lat = float(params.get('lat', ''))
+        lng = float(params.get('lng', ''))
+    except ValueError:
+        raise ValueError('Se requieren los parámetros "lat" y "lng" (grados decimales)')
+    if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+        raise ValueError('Coordenadas fuera de rango: lat entre -90 y 90, lng entre -180 y 180')
+
+    try:
+        k = int(params.get('k') or K_POR_DEFECTO)
+    except ValueError:
+        raise ValueError('El parámetro "k" debe ser un entero')
+    if not 1 <= k <= K_MAXIMO:
+        raise ValueError(f'El parámetro "k" debe estar entre 1 y {K_MAXIMO}')
+
+    radio_km = params.get('radio_km')
+    if radio_km:
+        try:
+            radio_km = float(radio_km)
+        except ValueError:
+            raise ValueError('El parámetro "radio_km" debe ser un número')
+        if not 0 < radio_km <= RADIO_MAXIMO_KM:
+            raise ValueError(f'El parámetro "radio_km" debe estar entre 0 y {RADIO_MAXIMO_KM}')
+    else:
+        radio_km = None
+    return lat, lng, k, radio_km
+
+
+def sucursales_cercanas(lat, lng, k=K_POR_DEFECTO, radio_km=None):
+    """
+    Busca las sucursales más cercanas en el índice del proceso y mide la latencia
+
+    Returns:
+        tuple: (lista de sucursales, tiempo de búsqueda en ms)
+    """
+    inicio = time.perf_counter()
+    resultados = indice_sucursales.cercanas(lat, lng, k, radio_km)
+    return resultados, round((time.perf_counter() - inicio) * 1000, 3)
@@ -0,0 +1,347 @@
+"""
+Agrupación de sucursales para el mapa (/sucursales/mapa/?bbox=&zoom=).
+
+En lugar de devolver todas las sucursales visibles, el mapa recibe grupos
+(clusters) con la cantidad de sucursales y su centroide. Los grupos están
+precalculados en memoria: una grilla por cada precisión de geohash (1 a
+PRECISION_MAXIMA, ver login/services/geohash.py) donde cada celda guarda sus
+sucursales y la suma de sus coordenadas. Cada zoom usa la precisión cuya celda
+mide alrededor de 1/CELDAS_POR_TESELA de una tesela del mapa, así que la consulta
+solo recorre las celdas de la vista, sin importar cuántas sucursales haya en ella.
+
+La respuesta está acotada: a lo sumo MAX_CELDAS grupos (si la vista pide más se
+usa una precisión menor) y, desde ZOOM_PUNTOS, las sucursales individuales solo
+si son a lo sumo MAX_PUNTOS. Un grupo de una sola sucursal se devuelve como punto.
+
+Como el índice de /sucursales/cercanas/, se actualiza con las señales de
+Sucursal y Farmacia (login/signals.py) y se reconstruye cada
+MAPA_SUCURSALES['TTL_SEGUNDOS'] para recoger cambios de otros workers, en un hilo
+aparte (una reconstrucción a la vez) mientras las vistas usan las grillas anteriores.
+"""
+import math
+import threading
+import time
+from django.conf import settings
+from django.db import connection
+from login.models import Farmacia, Sucursal
+from login.services import geohash
+
+MAPA_SUCURSALES = getattr(settings, 'MAPA_SUCURSALES', {})
+TTL_SEGUNDOS = MAPA_SUCURSALES.get('TTL_SEGUNDOS', 300)
+MAX_CELDAS = MAPA_SUCURSALES.get('MAX_CELDAS', 400)
+MAX_PUNTOS = MAPA_SUCURSALES.get('MAX_PUNTOS', 500)
+ZOOM_PUNTOS = MAPA_SUCURSALES.get('ZOOM_PUNTOS', 15)
+ZOOM_MAXIMO = 22
+PRECISION_MAXIMA = 7  # Celdas de ~150 m
+CELDAS_POR_TESELA = 4  # Celdas por lado de una tesela de 256 px (grupos de ~64 px)
+
+
+def precision_para_zoom(zoom):
+    """Mayor precisión de geohash cuya celda mide al menos 1/CELDAS_POR_TESELA de tesela"""
+    ancho_tesela = 360.0 / 2 ** zoom
+    for precision in range(PRECISION_MAXIMA, 0, -1):
+        if geohash.tamano_celda(precision)[1] >= ancho_tesela / CELDAS_POR_TESELA:
+            return precision
+    return 1
+
+
+def _rangos_longitud(oeste, este):
+    """Rangos de longitud de la vista (dos si cruza el antimeridiano)"""
+    if oeste <= este:
+        return [(oeste, este)]
+    return [(oeste, 180.0), (-180.0, este)]
+
+
+def _pasos(minimo, maximo, tamano, origen):
+    """Centros de las celdas de tamaño 'tamano' que tocan [minimo, maximo]"""
+    inicio = math.floor((minimo - origen) / tamano)
+    fin = math.floor((maximo - origen) / tamano)
+    return [origen + (i + 0.5) * tamano for i in range(inicio, fin + 1)]
+
+
+def _cantidad_celdas(sur, oeste, norte, este, precision):
+    """Celdas de la grilla que cubren la vista (sin enumerarlas)"""
+    alto, ancho = geohash.tamano_celda(precision)
+    filas = math.floor((norte + 90) / alto) - math.floor((sur + 90) / alto) + 1
+    columnas = sum(
+        math.floor((hasta + 180) / ancho) - math.floor((desde + 180) / ancho) + 1
+        for desde, hasta in _rangos_longitud(oeste, este)
+    )
+    return filas * columnas
+
+
+def _celdas_en_vista(sur, oeste, norte, este, precision):
+    alto, ancho = geohash.tamano_celda(precision)
+    latitudes = [lat for lat in _pasos(sur, norte, alto, -90.0) if -90 < lat < 90]
+    # Con la vista partida en el antimeridiano una celda ancha puede tocar ambos rangos
+    longitudes = set()
+    for desde, hasta in _rangos_longitud(oeste, este):
+        longitudes.update(lng for lng in _pasos(desde, hasta, ancho, -180.0) if -180 < lng < 180)
+    return latitudes, sorted(longitudes)
+
+
+def _en_vista(datos, sur, oeste, norte, este):
+    if not sur <= datos['latitud'] <= norte:
+        return False
+    return any(desde <= datos['longitud'] <= hasta for desde, hasta in _rangos_longitud(oeste, este))
+
+
+class MapaSucursales:
+    """
+    Grillas de geohash (una por precisión) con las sucursales de cada celda
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._construccion = threading.Lock()  # Una sola reconstrucción a la vez
+        # precision -> {geohash: [ids, suma_latitud, suma_longitud]}
+        self._grillas = {precision: {} for precision in range(1, PRECISION_MAXIMA + 1)}
+        self._sucursales = {}  # id_sucursal -> datos (con 'celda': geohash de PRECISION_MAXIMA)
+        self._farmacias = {}   # id_farmacia -> {'id_farmacia', 'nombre_comercial'}
+        self.construido_en = None
+        self.construccion_ms = None
+
+    @property
+    def construido(self):
+        return self.construido_en is not None
+
+    @staticmethod
+    def _entrada(id_sucursal, farmacia_id, ubicacion, latitud, longitud, celda):
+        latitud, longitud = float(latitud), float(longitud)
+        return {
+            'id_sucursal': id_sucursal,
+            'farmacia_id': farmacia_id,
+            'ubicacion': ubicacion,
+            'latitud': latitud,
+            'longitud': longitud,
+            'celda': celda[:PRECISION_MAXIMA] if celda else geohash.codificar(latitud, longitud, PRECISION_MAXIMA),
+        }
+
+    @staticmethod
+    def _sumar(grillas, datos, signo):
+        """Agrega (signo=1) o quita (signo=-1) una sucursal de todas las grillas"""
+        for precision, grilla in grillas.items():
+            clave = datos['celda'][:precision]
+            celda = grilla.get(clave)
+            if celda is None:
+                celda = grilla[clave] = [set(), 0.0, 0.0]
+            if signo > 0:
+                celda[0].add(datos['id_sucursal'])
+            else:
+                celda[0].discard(datos['id_sucursal'])
+            celda[1] += signo * datos['latitud']
+            celda[2] += signo * datos['longitud']
+            if not celda[0]:
+                del grilla[clave]
+
+    def construir(self):
+        """Reconstruye todas las grillas desde la base de datos"""
+        inicio = time.perf_counter()
+        farmacias = {
+            id_farmacia: {'id_farmacia': id_farmacia, 'nombre_comercial': nombre}
+            for id_farmacia, nombre in Farmacia.objects.values_list('id_farmacia', 'nombre_comercial')
+        }
+        sucursales = {}
+        fina = {}
+        filas = Sucursal.objects.values_list(
+            'id_sucursal', 'farmacia_id', 'ubicacion', 'latitud', 'longitud', 'geohash'
+        ).iterator()
+        for fila in filas:
+            datos = self._entrada(*fila)
+            sucursales[datos['id_sucursal']] = datos
+            celda = fina.get(datos['celda'])
+            if celda is None:
+                celda = fina[datos['celda']] = [set(), 0.0, 0.0]
+            celda[0].add(datos['id_sucursal'])
+            celda[1] += datos['latitud']
+            celda[2] += datos['longitud']
+
+        # Cada grilla se arma sumando las celdas de la siguiente más fina (su prefijo)
+        grillas = {PRECISION_MAXIMA: fina}
+        for precision in range(PRECISION_MAXIMA - 1, 0, -1):
+            grilla = {}
+            for clave, (ids, suma_lat, suma_lng) in grillas[precision + 1].items():
+                celda = grilla.get(clave[:precision])
+                if celda is None:
+                    grilla[clave[:precision]] = [set(ids), suma_lat, suma_lng]
+                else:
+                    celda[0].update(ids)
+                    celda[1] += suma_lat
+                    celda[2] += suma_lng
+            grillas[precision] = grilla
+
+        with self._lock:
+            self._grillas, self._sucursales, self._farmacias = grillas, sucursales, farmacias
+            self.construido_en = time.monotonic()
+            self.construccion_ms = round((time.perf_counter() - inicio) * 1000, 2)
+
+    def actualizar(self, sucursal):
+        """Inserta o mueve una sucursal sin reconstruir las grillas"""
+        if not self.construido:
+            return
+        if sucursal.farmacia_id not in self._farmacias:
+            self.actualizar_farmacia(sucursal.farmacia)
+        datos = self._entrada(
+            sucursal.pk, sucursal.farmacia_id, sucursal.ubicacion,
+            sucursal.latitud, sucursal.longitud, sucursal.geohash
+        )
+        with self._lock:
+            anterior = self._sucursales.get(sucursal.pk)
+            if anterior is not None:
+                self._sumar(self._grillas, anterior, -1)
+            self._sucursales[sucursal.pk] = datos
+            self._sumar(self._grillas, datos, 1)
+
+    def eliminar(self, sucursal_id):
+        """Quita una sucursal de las grillas"""
+        if not self.construido:
+            return
+        with self._lock:
+            anterior = self._sucursales.pop(sucursal_id, None)
+            if anterior is not None:
+                self._sumar(self._grillas, anterior, -1)
+
+    def actualizar_farmacia(self, farmacia):
+        """Actualiza el nombre de la farmacia que se devuelve con sus sucursales"""
+        if not self.construido:
+            return
+        with self._lock:
+            self._farmacias[farmacia.pk] = {
+                'id_farmacia': farmacia.pk, 'nombre_comercial': farmacia.nombre_comercial
+            }
+
+    def _vigente(self):
+        """
+        Construye las grillas en la primera consulta (una sola petición lo hace; las demás
+        esperan) y, si venció el TTL, las reconstruye en segundo plano
+        """
+        if not self.construido:
+            with self._construccion:
+                if not self.construido:
+                    self.construir()
+        elif (time.monotonic() - self.construido_en) > TTL_SEGUNDOS and self._construccion.acquire(blocking=False):
+            threading.Thread(target=self._reconstruir, name='mapa-sucursales', daemon=True).start()
+
+    def _reconstruir(self):
+        try:
+            self.construir()
+        finally:
+            self._construccion.release()
+            connection.close()  # Conexión propia del hilo
+
+    def _punto(self, datos):
+        punto = {key: datos[key] for key in ('id_sucursal', 'ubicacion', 'latitud', 'longitud')}
+        punto['farmacia'] = self._farmacias.get(datos['farmacia_id'], {'id_farmacia': datos['farmacia_id']})
+        return punto
+
+    def vista(self, sur, oeste, norte, este, zoom):
+        """
+        Grupos y sucursales individuales de una vista del mapa
+
+        Args:
+            sur, oeste, norte, este (float): Límites de la vista en grados (oeste > este si
+                cruza el antimeridiano)
+            zoom (int): Nivel de zoom del mapa (0 a ZOOM_MAXIMO)
+
+        Returns:
+            dict: precision, clusters, sucursales y total_sucursales de la vista
+        """
+        self._vigente()
+
+        # Si la vista tiene demasiadas celdas para el zoom pedido se usan celdas más grandes
+        precision = precision_para_zoom(zoom)
+        while precision > 1 and _cantidad_celdas(sur, oeste, norte, este, precision) > MAX_CELDAS:
+            precision -= 1
+        latitudes, longitudes = _celdas_en_vista(sur, oeste, norte, este, precision)
+
+        with self._lock:
+            grilla = self._grillas[precision]
+            celdas = []
+            for lat in latitudes:
+                for lng in longitudes:
+                    clave = geohash.codificar(lat, lng, precision)
+                    celda = grilla.get(clave)
+                    if celda is not None:
+                        celdas.append((clave, len(celda[0]), celda[1], celda[2], celda[0]))
+            total = sum(celda[1] for celda in celdas)
+
+            clusters, puntos = [], []
+            if zoom >= ZOOM_PUNTOS and total <= MAX_PUNTOS:
+                for *_, ids in celdas:
+                    for id_sucursal in ids:
+                        datos = self._sucursales[id_sucursal]
+                        if _en_vista(datos, sur, oeste, norte, este):
+                            puntos.append(self._punto(datos))
+            else:
+                for clave, cantidad, suma_lat, suma_lng, ids in celdas:
+                    if cantidad == 1:
+                        puntos.append(self._punto(self._sucursales[next(iter(ids))]))
+                    else:
+                        clusters.append({
+                            'geohash': clave,
+                            'total': cantidad,
+                            'latitud': round(suma_lat / cantidad, 6),
+                            'longitud': round(suma_lng / cantidad, 6),
+                        })
+
+        puntos.sort(key=lambda punto: punto['id_sucursal'])
+        return {
+            'precision': precision,
+            'clusters': clusters,
+            'sucursales': puntos,
+            'total_sucursales': total,
+        }
+
+    def estadisticas(self):
+        """Tamaño de las grillas y tiempo de la última construcción (para monitoreo)"""
+        return {
+            'construido': self.construido,
+            'sucursales': len(self._sucursales),
+            'celdas': len(self._grillas[PRECISION_MAXIMA]),
+            'construccion_ms': self.construccion_ms,
+        }
+
+
+# Grillas compartidas por todas las peticiones del proceso
+mapa_sucursales = MapaSucursales()
+
+
+def parsear_vista(params):
+    """
+    Lee bbox (oeste,sur,este,norte) y zoom de los query params
+
+    Returns:
+        tuple: (sur, oeste, norte, este, zoom)
+
+    Raises:
+        ValueError: Si falta algún parámetro o está fuera de rango
+    """
+    try:
+        zoom = int(params.get('zoom', ''))
+    except ValueError:
+        raise ValueError('Se requiere el parámetro "zoom" (entero)')
+    if not 0 <= zoom <= ZOOM_MAXIMO:
+        raise ValueError(f'El parámetro "zoom" debe estar entre 0 y {ZOOM_MAXIMO}')
+
+    bbox = params.get('bbox')
+    if not bbox:
+        return -90.0, -180.0, 90.0, 180.0, zoom
+    try:
+        oeste, sur, este, norte = (float(valor) for valor in bbox.split(','))
+    except ValueError:
+        raise ValueError('El parámetro "bbox" debe ser oeste,sur,este,norte (grados decimales)')
+    if not (-90 <= sur <= norte <= 90 and -180 <= oeste <= 180 and -180 <= este <= 180):
+        raise ValueError('bbox fuera de rango: latitudes entre -90 y 90 (sur <= norte), longitudes entre -180 y 180')
+    return sur, oeste, norte, este, zoom
+
+
+def vista_mapa(sur, oeste, norte, este, zoom):
+    """
+    Grupos de sucursales de la vista y latencia de la consulta
+
+    Returns:
+        tuple: (dict de la vista, tiempo en ms)
+    """
+    inicio = time.perf_counter()
+    resultado = mapa_sucursales.vista(sur, oeste, norte, este, zoom)
+    return resultado, round((time.perf_counter() - inicio) * 1000, 3)
@@ -0,0 +1,176 @@
+"""
+Mejores opciones para comprar un producto: precio + distancia (/productos/<id>/mejores-opciones/).
+
+Cada farmacia que vende el producto se evalúa con su sucursal más cercana al
+usuario y un puntaje en unidades de dinero:
+
+    puntaje = precio + peso_km * distancia_km
+
+(peso_km es lo que el usuario está dispuesto a pagar por cada km que se ahorra).
+
+No se cruzan todos los precios con todas las sucursales. Se elige el lado más chico:
+- Pocas sucursales dentro del radio (prefiltro indexado de login/services/cercania.py,
+  caja + geohash, hasta MAX_SUCURSALES_PREFILTRO): se toma la más cercana de cada
+  farmacia y sus precios se leen con el índice único (producto, farmacia).
+- Si hay más: los precios del producto se recorren de menor a mayor en lotes
+  (keyset sobre el índice (producto, precio)) y solo se buscan las sucursales de
+  las farmacias de cada lote. Cuando ya hay n opciones, el radio se reduce a lo
+  que aún podría mejorar la peor de ellas, y la búsqueda termina en cuanto el
+  siguiente precio por sí solo supera ese puntaje.
+
+Así el costo depende de n y de la densidad de sucursales cerca del usuario, no
+del total de precios ni de sucursales.
+"""
+import heapq
+import time
+from django.conf import settings
+from django.db.models import Q
+from rest_framework import serializers
+from login.models import ProductoFarmacia
+from login.services.cercania import mas_cercana_por_farmacia, por_farmacia, sucursales_en_radio
+from login.services.distancias import parsear_ubicacion
+from login.services.serializacion_rapida import convertidor_decimal
+
+MEJORES_OPCIONES = getattr(settings, 'MEJORES_OPCIONES', {})
+N_POR_DEFECTO = MEJORES_OPCIONES.get('N', 5)
+N_MAXIMO = MEJORES_OPCIONES.get('N_MAXIMO', 50)
+PESO_KM_POR_DEFECTO = MEJORES_OPCIONES.get('PESO_KM', 0.5)
+RADIO_POR_DEFECTO_KM = MEJORES_OPCIONES.get('RADIO_KM', 25)
+RADIO_MAXIMO_KM = MEJORES_OPCIONES.get('RADIO_MAXIMO_KM', 100)
+TAMANO_LOTE = 50  # Precios leídos por consulta
+MAX_SUCURSALES_PREFILTRO = 500  # Hasta aquí conviene partir de las sucursales cercanas
+
+# Mismo formato que ProductoFarmaciaSerializer
+_precio = convertidor_decimal(serializers.DecimalField(max_digits=10, decimal_places=2))
+
+
+def _numero(params, nombre, por_defecto, minimo, maximo, tipo=float):
+    valor = params.get(nombre)
+    if valor in (None, ''):
+        return por_defecto
+    try:
+        valor = tipo(valor)
+    except ValueError:
+        raise ValueError(f'El parámetro "{nombre}" debe ser un número')
+    if not minimo <= valor <= maximo:
+        raise ValueError(f'El parámetro "{nombre}" debe estar entre {minimo} y {maximo}')
+    return valor
+
+
+def parsear_parametros(params):
+    """
+    Lee lat, lng, n, peso_km y radio_km de los query params
+
+    Returns:
+        tuple: (lat, lng, n, peso_km, radio_km)
+
+    Raises:
+        ValueError: Si falta la ubicación o algún parámetro está fuera de rango
+    """
+    ubicacion = parsear_ubicacion(params)
+    if ubicacion is None:
+        raise ValueError('Se requieren los parámetros "lat" y "lng" (grados decimales)')
+    n = _numero(params, 'n', N_POR_DEFECTO, 1, N_MAXIMO, int)
+    peso_km = _numero(params, 'peso_km', PESO_KM_POR_DEFECTO, 0, 1000)
+    radio_km = _numero(params, 'radio_km', RADIO_POR_DEFECTO_KM, 0.01, RADIO_MAXIMO_KM)
+    return (*ubicacion, n, peso_km, radio_km)
+
+
+def _precios(producto_id, despues_de):
+    """Siguiente lote de precios del producto, de menor a mayor (keyset sobre precio, id)"""
+    filtro = Q(producto_id=producto_id)
+    if despues_de is not None:
+        precio, id_ = despues_de
+        filtro &= Q(precio__gt=precio) | Q(precio=precio, id_producto_farmacia__gt=id_)
+    return list(
+        ProductoFarmacia.objects.filter(filtro).order_by('precio', 'id_producto_farmacia').values_list(
+            'precio', 'id_producto_farmacia', 'farmacia_id'
+        )[:TAMANO_LOTE]
+    )
+
+
+def mejores_opciones(producto_id, lat, lng, n=N_POR_DEFECTO, peso_km=PESO_KM_POR_DEFECTO,
+                     radio_km=RADIO_POR_DEFECTO_KM):
+    """
+    Las n mejores combinaciones (farmacia, sucursal más cercana) para comprar el producto
+
+    Returns:
+        tuple: (lista de opciones ordenadas por puntaje, dict con estadísticas de la búsqueda)
+    """
+    inicio = time.perf_counter()
+    # Montículo de máximos (claves negadas) con las n mejores opciones
+    mejores = []
+    evaluados = 0
+
+    def peor():
+        return -mejores[0][0] if len(mejores) >= n else None
+
+    def considerar(precio, id_producto_farmacia, farmacia_id, cercana):
+        distancia, sucursal = cercana
+        puntaje = float(precio) + peso_km * distancia
+        # Desempate: menor precio, menor distancia, menor id de farmacia
+        entrada = (-puntaje, -float(precio), -distancia, -farmacia_id,
+                   (precio, id_producto_farmacia, distancia, sucursal))
+        if len(mejores) < n:
+            heapq.heappush(mejores, entrada)
+        elif entrada[:4] > mejores[0][:4]:
+            heapq.heapreplace(mejores, entrada)
+
+    encontradas = sucursales_en_radio(lat, lng, radio_km, limite=MAX_SUCURSALES_PREFILTRO)
+    if encontradas is not None:
+        estrategia = 'sucursales'
+        sucursales = por_farmacia(encontradas)
+        precios = ProductoFarmacia.objects.filter(producto_id=producto_id, farmacia_id__in=sucursales).values_list(
+            'precio', 'id_producto_farmacia', 'farmacia_id'
+        )
+        for precio, id_producto_farmacia, farmacia_id in precios:
+            evaluados += 1
+            considerar(precio, id_producto_farmacia, farmacia_id, sucursales[farmacia_id])
+    else:
+        estrategia = 'precios'
+        despues_de = None
+        while True:
+            lote = _precios(producto_id, despues_de)
+            if not lote:
+                break
+            despues_de = lote[-1][:2]
+
+            # Ningún precio de aquí en adelante es menor que el primero del lote
+            umbral = peor()
+            precio_minimo = float(lote[0][0])
+            if umbral is not None and precio_minimo > umbral:
+                break
+            radio = radio_km
+            if umbral is not None and peso_km > 0:
+                radio = min(radio_km, (umbral - precio_minimo) / peso_km)
+
+            sucursales = mas_cercana_por_farmacia(lat, lng, radio, [fila[2] for fila in lote])
+            for precio, id_producto_farmacia, farmacia_id in lote:
+                evaluados += 1
+                if farmacia_id in sucursales:
+                    considerar(precio, id_producto_farmacia, farmacia_id, sucursales[farmacia_id])
+
+            if len(lote) < TAMANO_LOTE:
+                break
+
+    opciones = []
+    for *clave, (precio, id_producto_farmacia, distancia, sucursal) in sorted(mejores, reverse=True):
+        id_sucursal, farmacia_id, nombre_farmacia, ubicacion, latitud, longitud = sucursal
+        opciones.append({
+            'farmacia': {'id_farmacia': farmacia_id, 'nombre_comercial': nombre_farmacia},
+            'sucursal': {
+                'id_sucursal': id_sucursal,
+                'ubicacion': ubicacion,
+                'latitud': float(latitud),
+                'longitud': float(longitud),
+            },
+            'id_producto_farmacia': id_producto_farmacia,
+            'precio': _precio(precio),
+            'distancia_km': round(distancia, 3),
+            'puntaje': round(-clave[0], 2),
+        })
+    return opciones, {
+        'estrategia': estrategia,
+        'precios_evaluados': evaluados,
+        'tiempo_ms': round((time.perf_counter() - inicio) * 1000, 3),
+    }
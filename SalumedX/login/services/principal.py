@@ -0,0 +1,95 @@
+"""
+Rol del usuario autenticado (médico o paciente), resuelto una vez por petición.
+
+Las vistas leen request.principal (lo asigna login/middleware.py, de forma
+perezosa) en lugar de hasattr(user, 'medico') / hasattr(user, 'paciente'):
+cada hasattr era una consulta por la relación OneToOne inversa y, si el perfil
+no existía, una excepción DoesNotExist capturada.
+
+- Si el JWT trae los claims 'tipo_usuario' y 'perfil_id' (tokens emitidos con
+  tokens_para(), en signin/signup) el rol sale del payload ya verificado, sin
+  consultas.
+- Si no (tokens anteriores, sesión de Django): una sola consulta de User con
+  select_related de ambos perfiles.
+"""
+from rest_framework_simplejwt.tokens import RefreshToken
+from login.models import Medico, Paciente, User
+
+MEDICO = 'medico'
+PACIENTE = 'paciente'
+_MODELOS = {MEDICO: Medico, PACIENTE: Paciente}
+
+
+class Principal:
+    """
+    Usuario autenticado con su tipo ('medico', 'paciente' o None) y el id de su perfil
+    """
+
+    def __init__(self, user_id=None, tipo=None, perfil_id=None, perfil=None):
+        self.user_id = user_id
+        self.tipo = tipo
+        self.perfil_id = perfil_id
+        self._perfil = perfil
+
+    @property
+    def es_medico(self):
+        return self.tipo == MEDICO
+
+    @property
+    def es_paciente(self):
+        return self.tipo == PACIENTE
+
+    def perfil(self):
+        """Medico o Paciente del usuario (se consulta una vez si vino de los claims), o None"""
+        if self._perfil is None and self.tipo in _MODELOS:
+            self._perfil = _MODELOS[self.tipo].objects.select_related('user').filter(pk=self.perfil_id).first()
+        return self._perfil
+
+    def claims(self):
+        return {'tipo_usuario': self.tipo, 'perfil_id': self.perfil_id}
+
+    def __repr__(self):
+        return f'Principal(user_id={self.user_id}, tipo={self.tipo}, perfil_id={self.perfil_id})'
+
+
+def resolver_principal(user, payload=None):
+    """
+    Principal de un usuario, desde los claims del JWT si corresponden a ese usuario
+
+    Args:
+        user: Usuario de la petición (puede ser AnonymousUser o None)
+        payload (dict): Payload verificado del JWT de la petición, si lo hay
+
+    Returns:
+        Principal: Sin tipo si el usuario no está autenticado o no tiene perfil
+    """
+    if user is None or not user.is_authenticated:
+        return Principal()
+
+    if payload and payload.get('user_id') == user.pk and 'tipo_usuario' in payload:
+        tipo = payload['tipo_usuario']
+        if tipo is None:
+            return Principal(user.pk)
+        if tipo in _MODELOS and payload.get('perfil_id'):
+            return Principal(user.pk, tipo, payload['perfil_id'])
+
+    usuario = User.objects.select_related(MEDICO, PACIENTE).filter(pk=user.pk).first()
+    if usuario is not None:
+        for tipo in (MEDICO, PACIENTE):
+            # Valor ya cargado por select_related (None si no tiene ese perfil), sin consultar ni lanzar excepción
+            perfil = User._meta.get_field(tipo).get_cached_value(usuario, None)
+            if perfil is not None:
+                return Principal(user.pk, tipo, perfil.pk, perfil)
+    return Principal(user.pk)
+
+
+def tokens_para(user, principal=None):
+    """
+    RefreshToken del usuario con los claims del principal (el access token los hereda)
+    """
+    if principal is None:
+        principal = resolver_principal(user)
+    refresh = RefreshToken.for_user(user)
+    for clave, valor in principal.claims().items():
+        refresh[clave] = valor
+    return refresh
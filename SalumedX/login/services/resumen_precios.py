@@ -0,0 +1,120 @@
+"""
+Mantenimiento de la tabla desnormalizada ResumenPrecioProducto.
+
+- actualizar_resumen(): recalcula solo el producto cuyo precio cambió
+  (lo invocan las señales de ProductoFarmacia, incluido update_or_create,
+  cuando la transacción del cambio confirma)
+- reconstruir_resumenes(): recalcula todo el catálogo en un par de consultas
+  (comando reconstruir_resumen_precios; la migración 0009 tiene su propia copia)
+"""
+from decimal import Decimal, ROUND_HALF_UP
+from django.db import transaction
+from django.db.models import Min, Max, Avg, Count
+from login.models import Producto, ProductoFarmacia, ResumenPrecioProducto
+
+CENTAVOS = Decimal('0.01')
+
+
+def _redondear(valor):
+    return Decimal(valor).quantize(CENTAVOS, rounding=ROUND_HALF_UP)
+
+
+def programar_actualizacion(producto_id, using='default'):
+    """
+    Recalcula el resumen del producto cuando confirme la transacción en curso
+
+    Dentro de la transacción del cambio otras escrituras concurrentes aún no son
+    visibles; tras el commit el recálculo lee el estado confirmado (y si no hay
+    transacción abierta se ejecuta de inmediato).
+    """
+    transaction.on_commit(lambda: actualizar_resumen(producto_id, using=using), using=using)
+
+
+def actualizar_resumen(producto_id, using='default'):
+    """
+    Recalcula el resumen de precios de un producto
+
+    Si el producto ya no tiene precios, se elimina su fila de resumen. Las filas del
+    resumen y del producto quedan bloqueadas (select_for_update) mientras se recalcula,
+    así dos recálculos del mismo producto no se intercalan y el último en escribir
+    siempre leyó los precios confirmados más recientes.
+
+    Args:
+        producto_id (int): ID del producto cuyo precio cambió
+        using (str): Alias de base de datos
+
+    Returns:
+        ResumenPrecioProducto: Resumen actualizado, o None si no tiene precios
+    """
+    resumenes = ResumenPrecioProducto.objects.using(using)
+    precios = ProductoFarmacia.objects.using(using).filter(producto_id=producto_id)
+
+    with transaction.atomic(using=using):
+        # El primer precio de un producto aún no tiene fila de resumen: se bloquea
+        # también la del producto para serializar ese caso
+        list(Producto.objects.using(using).select_for_update().filter(pk=producto_id).values_list('pk'))
+        list(resumenes.select_for_update().filter(producto_id=producto_id).values_list('pk'))
+
+        stats = precios.aggregate(
+            minimo=Min('precio'), maximo=Max('precio'), promedio=Avg('precio'), total=Count('pk')
+        )
+        if not stats['total']:
+            resumenes.filter(producto_id=producto_id).delete()
+            return None
+
+        farmacia_mas_barata_id = precios.order_by('precio', 'farmacia_id').values_list(
+            'farmacia_id', flat=True
+        ).first()
+
+        resumen, _ = resumenes.update_or_create(
+            producto_id=producto_id,
+            defaults={
+                'precio_minimo': stats['minimo'],
+                'precio_maximo': stats['maximo'],
+                'precio_promedio': _redondear(stats['promedio']),
+                'total_farmacias': stats['total'],
+                'farmacia_mas_barata_id': farmacia_mas_barata_id,
+            }
+        )
+    return resumen
+
+
+def reconstruir_resumenes(using='default'):
+    """
+    Vacía y recalcula todos los resúmenes de precios
+
+    Args:
+        using (str): Alias de base de datos
+
+    Returns:
+        int: Número de productos con resumen
+    """
+    precios = ProductoFarmacia.objects.using(using)
+
+    stats = precios.values('producto_id').annotate(
+        minimo=Min('precio'), maximo=Max('precio'), promedio=Avg('precio'), total=Count('pk')
+    ).order_by()
+
+    # Primera farmacia de cada producto al recorrer los precios ordenados = la más barata
+    mas_barata = {}
+    for producto_id, farmacia_id in precios.order_by(
+        'producto_id', 'precio', 'farmacia_id'
+    ).values_list('producto_id', 'farmacia_id').iterator():
+        mas_barata.setdefault(producto_id, farmacia_id)
+
+    resumenes = [
+        ResumenPrecioProducto(
+            producto_id=fila['producto_id'],
+            precio_minimo=fila['minimo'],
+            precio_maximo=fila['maximo'],
+            precio_promedio=_redondear(fila['promedio']),
+            total_farmacias=fila['total'],
+            farmacia_mas_barata_id=mas_barata.get(fila['producto_id']),
+        )
+        for fila in stats
+    ]
+
+    with transaction.atomic(using=using):
+        ResumenPrecioProducto.objects.using(using).all().delete()
+        ResumenPrecioProducto.objects.using(using).bulk_create(resumenes, batch_size=1000)
+    return len(resumenes)
@@ -0,0 +1,196 @@
+"""
+Serialización rápida de solo lectura para los listados grandes.
+
+ModelSerializer recorre en cada fila sus campos, resuelve source_attrs, revisa
+nulos y arma el resultado campo por campo. Para ProductoSerializer,
+ProductoFarmaciaSerializer y SucursalSerializer ese trabajo es siempre el mismo,
+así que se "compila" una vez por serializer en una lista de pasos:
+
+    (clave, atributo, tipo, conversión)
+
+- atributo: nombre del atributo del modelo (para relaciones no expandidas, el
+  attname del FK, p. ej. 'producto_id', igual que PrimaryKeyRelatedField)
+- conversión: nada si DRF devuelve el valor tal cual (CharField, IntegerField,
+  BooleanField), los pasos del serializer anidado, versiones precalculadas de
+  DecimalField y DateTimeField (exponente/contexto de quantize fijos, zona
+  horaria resuelta una vez por llamada y no por fila) o, para el resto, el
+  to_representation del propio campo de DRF.
+
+Como las conversiones reproducen las de DRF, la salida es idéntica a serializer.data
+(ver login/tests.py y el comando benchmark_serializacion, que además compara ambas rutas).
+
+Los serializers que no se pueden compilar (to_representation propio, campos
+con source '*' o con puntos, relaciones many=True, SerializerMethodField) se
+serializan con DRF de forma normal.
+"""
+import decimal
+import threading
+from datetime import datetime
+from django.conf import settings
+from django.utils import timezone
+from rest_framework import ISO_8601, serializers
+from rest_framework.settings import api_settings
+
+SERIALIZACION_RAPIDA = getattr(settings, 'SERIALIZACION_RAPIDA', {})
+ACTIVA = SERIALIZACION_RAPIDA.get('ACTIVA', True)
+
+# Campos cuyo to_representation no cambia valores ya cargados desde el modelo
+# (str(str), int(int), bool(bool)); se comparan por tipo exacto
+SIN_CONVERSION = (serializers.CharField, serializers.IntegerField, serializers.BooleanField)
+
+
+# Tipos de paso
+DIRECTO, ANIDADO, CAMPO, FECHA_HORA = range(4)
+
+
+class NoCompilable(Exception):
+    """El serializer no se puede reproducir con pasos simples"""
+
+
+def convertidor_decimal(campo):
+    """DecimalField.to_representation con el exponente y el contexto de quantize precalculados"""
+    coerce_to_string = getattr(campo, 'coerce_to_string', api_settings.COERCE_DECIMAL_TO_STRING)
+    if (not coerce_to_string or campo.localize or campo.normalize_output
+            or campo.decimal_places is None):
+        return campo.to_representation
+
+    exponente = decimal.Decimal('.1') ** campo.decimal_places
+    contexto = decimal.Context(prec=campo.max_digits) if campo.max_digits is not None else None
+    redondeo = campo.rounding
+
+    def convertir(valor):
+        if not isinstance(valor, decimal.Decimal):
+            return campo.to_representation(valor)
+        return '{:f}'.format(valor.quantize(exponente, rounding=redondeo, context=contexto))
+    return convertir
+
+
+def _es_fecha_hora_iso(campo):
+    """DateTimeField con formato ISO 8601 y la zona horaria por defecto"""
+    formato = getattr(campo, 'format', api_settings.DATETIME_FORMAT)
+    return (type(campo) is serializers.DateTimeField and not hasattr(campo, 'timezone')
+            and formato is not None and formato.lower() == ISO_8601)
+
+
+def _compilar(serializer):
+    if type(serializer).to_representation is not serializers.Serializer.to_representation:
+        raise NoCompilable(f'{type(serializer).__name__} redefine to_representation')
+
+    modelo = serializer.Meta.model
+    pasos = []
+    for nombre, campo in serializer.fields.items():
+        if campo.write_only:
+            continue
+        if campo.source == '*' or '.' in campo.source:
+            raise NoCompilable(f'{nombre}: source {campo.source!r}')
+
+        if isinstance(campo, (serializers.ListSerializer, serializers.ManyRelatedField,
+                              serializers.SerializerMethodField)):
+            raise NoCompilable(f'{nombre}: {type(campo).__name__}')
+
+        if isinstance(campo, serializers.BaseSerializer):
+            pasos.append((nombre, campo.source, ANIDADO, _compilar(campo)))
+        elif isinstance(campo, serializers.PrimaryKeyRelatedField) and campo.pk_field is None:
+            # Solo el id: se lee del FK sin cargar el objeto relacionado
+            pasos.append((nombre, modelo._meta.get_field(campo.source).attname, DIRECTO, None))
+        elif type(campo) in SIN_CONVERSION:
+            pasos.append((nombre, campo.source, DIRECTO, None))
+        elif type(campo) is serializers.DecimalField:
+            pasos.append((nombre, campo.source, CAMPO, convertidor_decimal(campo)))
+        elif _es_fecha_hora_iso(campo):
+            pasos.append((nombre, campo.source, FECHA_HORA, campo.to_representation))
+        else:
+            pasos.append((nombre, campo.source, CAMPO, campo.to_representation))
+    return tuple(pasos)
+
+
+def _serializar(pasos, instancia, zona):
+    datos = {}
+    for clave, atributo, tipo, conversion in pasos:
+        valor = getattr(instancia, atributo)
+        if valor is None or tipo == DIRECTO:
+            datos[clave] = valor
+        elif tipo == ANIDADO:
+            datos[clave] = _serializar(conversion, valor, zona)
+        elif tipo == FECHA_HORA and zona is not None and isinstance(valor, datetime) \
+                and timezone.is_aware(valor):
+            datos[clave] = fecha_hora_iso(valor, zona)
+        else:
+            datos[clave] = conversion(valor)
+    return datos
+
+
+def fecha_hora_iso(valor, zona):
+    """DateTimeField.to_representation para un datetime con zona horaria, con 'zona' ya resuelta"""
+    # Igual que DateTimeField.enforce_timezone() + formato ISO 8601
+    texto = valor.astimezone(zona).isoformat()
+    return texto[:-6] + 'Z' if texto.endswith('+00:00') else texto
+
+
+def zona_actual():
+    """Zona horaria que usaría DateTimeField (None si USE_TZ=False)"""
+    return timezone.get_current_timezone() if settings.USE_TZ else None
+
+
+class SerializadorCompilado:
+    """
+    Pasos precompilados de un serializer (ya configurado con campos/expandir si aplica)
+    """
+
+    def __init__(self, serializer):
+        self.pasos = _compilar(serializer)
+
+    def serializar(self, instancia):
+        return _serializar(self.pasos, instancia, zona_actual())
+
+    def serializar_lista(self, instancias):
+        pasos, zona = self.pasos, zona_actual()
+        return [_serializar(pasos, instancia, zona) for instancia in instancias]
+
+
+# Un compilado por clase de serializer para la configuración por defecto
+_compilados = {}
+_lock = threading.Lock()
+
+
+def _compilado_por_clase(serializer_class):
+    compilado = _compilados.get(serializer_class)
+    if compilado is None:
+        with _lock:
+            compilado = _compilados.get(serializer_class)
+            if compilado is None:
+                compilado = SerializadorCompilado(serializer_class())
+                _compilados[serializer_class] = compilado
+    return compilado
+
+
+def serializar_rapido(instancias, serializer_class, campos=None, expandir=None, many=True):
+    """
+    Equivalente de solo lectura a serializer_class(instancias, many=many, ...).data
+
+    Args:
+        instancias: Instancia o iterable de instancias (con sus relaciones ya cargadas)
+        serializer_class: Serializer a reproducir
+        campos, expandir: Árboles de ?fields= / ?expand= (ver login/services/campos.py)
+        many (bool): True si 'instancias' es una lista
+
+    Returns:
+        list o dict con la misma estructura que serializer.data
+    """
+    opciones = {}
+    if campos is not None or expandir is not None:
+        opciones = {'campos': campos, 'expandir': expandir}
+
+    try:
+        if not ACTIVA:
+            raise NoCompilable('serialización rápida desactivada')
+        if opciones:
+            compilado = SerializadorCompilado(serializer_class(**opciones))
+        else:
+            compilado = _compilado_por_clase(serializer_class)
+    except NoCompilable:
+        return serializer_class(instancias, many=many, **opciones).data
+
+    if many:
+        return compilado.serializar_lista(instancias)
+    return compilado.serializar(instancias)
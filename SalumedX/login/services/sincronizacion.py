@@ -0,0 +1,217 @@
+"""
+Sincronización incremental de precios para clientes offline (/sync/precios/).
+
+En lugar de descargar el catálogo completo, el cliente pide solo los cambios
+posteriores a su última sincronización. Los cambios salen de dos tablas:
+- ProductoFarmacia: precios creados o actualizados (fecha_actualizacion)
+- PrecioEliminado: precios eliminados (tombstones creados en login/signals.py)
+
+Ambas se recorren por keyset con sus índices (fecha, id) y se mezclan en una
+sola línea de tiempo ordenada por (fecha, tipo, id). El cursor devuelto es esa
+posición, así que el cliente puede cortar y reanudar sin duplicados ni huecos.
+
+Solo se devuelven cambios anteriores al 'horizonte' (ahora - MARGEN_SEGUNDOS):
+una transacción que aún no confirmó puede tener una fecha anterior a la de
+cambios ya visibles, y el margen evita saltarla al avanzar el cursor.
+
+Query params:
+- since: fecha ISO 8601 (ej: 2025-01-31T10:00:00Z), incluida; solo la primera vez
+- cursor: valor opaco devuelto en 'next_cursor' (tiene prioridad sobre since)
+- limit: cambios por página (máximo PAGINACION_CATALOGO['MAX_PAGE_SIZE'])
+Sin since ni cursor se devuelve todo desde el principio (sincronización inicial).
+"""
+import heapq
+from datetime import timedelta
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from rest_framework import serializers
+from login.models import ProductoFarmacia, PrecioEliminado
+from login.services.paginacion import CursorInvalido, codificar_cursor, decodificar_cursor, obtener_limit
+from login.services.serializacion_rapida import convertidor_decimal, fecha_hora_iso, zona_actual
+
+SINCRONIZACION = getattr(settings, 'SINCRONIZACION', {})
+MARGEN_SEGUNDOS = SINCRONIZACION.get('MARGEN_SEGUNDOS', 5)
+RETENCION_DIAS = SINCRONIZACION.get('RETENCION_DIAS', 90)
+
+ACTUALIZADO = 0
+ELIMINADO = 1
+TIPOS = {ACTUALIZADO: 'actualizado', ELIMINADO: 'eliminado'}
+
+# Mismo formato que ProductoFarmaciaSerializer
+_precio = convertidor_decimal(serializers.DecimalField(max_digits=10, decimal_places=2))
+_campo_fecha = serializers.DateTimeField()
+
+
+class SincronizacionExpirada(Exception):
+    """La posición pedida es anterior a la retención de eliminaciones: hay que sincronizar de cero"""
+
+
+def parsear_fecha(valor):
+    """
+    Convierte el parámetro since en un datetime con zona horaria
+
+    Raises:
+        CursorInvalido: Si la fecha no tiene formato ISO 8601
+    """
+    try:
+        fecha = parse_datetime(valor.strip())
+        if fecha is None and ' ' in valor.strip():
+            # '+' sin codificar en la URL llega como espacio: 10:00:00 05:00 -> 10:00:00+05:00
+            fecha = parse_datetime(valor.strip().replace(' ', '+'))
+    except ValueError:
+        fecha = None
+    if fecha is None:
+        raise CursorInvalido('Parámetro since inválido: use formato ISO 8601 (ej: 2025-01-31T10:00:00Z)')
+    if timezone.is_naive(fecha):
+        fecha = timezone.make_aware(fecha)
+    return fecha
+
+
+def _posicion_inicial(params):
+    """
+    Posición (fecha, tipo, id) desde la que se devuelven cambios, o None para empezar de cero
+
+    Raises:
+        CursorInvalido: Si el cursor o since no son válidos
+    """
+    cursor = params.get('cursor')
+    if cursor:
+        valores = decodificar_cursor(cursor, 3)
+        # codificar_cursor siempre guarda textos: otra cosa es un cursor fabricado
+        if not all(isinstance(valor, str) for valor in valores):
+            raise CursorInvalido('Cursor inválido')
+        fecha, tipo, id_ = valores
+        try:
+            fecha = parse_datetime(fecha)
+        except ValueError:
+            fecha = None
+        if (fecha is None or timezone.is_naive(fecha) or tipo not in ('-1', '0', '1')
+                or not (id_.isascii() and id_.isdigit())):
+            raise CursorInvalido('Cursor inválido')
+        return fecha, int(tipo), int(id_)
+
+    since = params.get('since')
+    if since:
+        # tipo -1: incluye todos los cambios con fecha == since
+        return parsear_fecha(since), -1, 0
+    return None
+
+
+def _despues_de(campo_fecha, campo_id, tipo, posicion):
+    """Filtro (fecha, tipo, id) > posicion para una tabla cuyas filas tienen todas el mismo tipo"""
+    if posicion is None:
+        return Q()
+    fecha, tipo_pos, id_pos = posicion
+    if tipo > tipo_pos:
+        return Q(**{f'{campo_fecha}__gte': fecha})
+    if tipo < tipo_pos:
+        return Q(**{f'{campo_fecha}__gt': fecha})
+    return Q(**{f'{campo_fecha}__gt': fecha}) | Q(**{campo_fecha: fecha, f'{campo_id}__gt': id_pos})
+
+
+def _actualizados(posicion, horizonte, limit):
+    filas = ProductoFarmacia.objects.filter(
+        _despues_de('fecha_actualizacion', 'id_producto_farmacia', ACTUALIZADO, posicion),
+        fecha_actualizacion__lt=horizonte,
+    ).order_by('fecha_actualizacion', 'id_producto_farmacia').values_list(
+        'fecha_actualizacion', 'id_producto_farmacia', 'producto_id', 'farmacia_id', 'precio'
+    )[:limit]
+    for fecha, id_, producto, farmacia, precio in filas:
+        yield fecha, ACTUALIZADO, id_, id_, producto, farmacia, precio
+
+
+def _eliminados(posicion, horizonte, limit):
+    filas = PrecioEliminado.objects.filter(
+        _despues_de('fecha_eliminacion', 'id', ELIMINADO, posicion),
+        fecha_eliminacion__lt=horizonte,
+    ).order_by('fecha_eliminacion', 'id').values_list(
+        'fecha_eliminacion', 'id', 'id_producto_farmacia', 'id_producto', 'id_farmacia'
+    )[:limit]
+    for fecha, id_, id_producto_farmacia, producto, farmacia in filas:
+        yield fecha, ELIMINADO, id_, id_producto_farmacia, producto, farmacia, None
+
+
+def cambios_precios(params):
+    """
+    Devuelve una página de cambios de precios posteriores a la posición pedida
+
+    Args:
+        params (QueryDict): request.query_params (since, cursor, limit)
+
+    Returns:
+        tuple: (lista de cambios, dict con metadatos de sincronización)
+
+    Raises:
+        CursorInvalido: Si since, cursor o limit no son válidos
+        SincronizacionExpirada: Si la posición es anterior a la retención de eliminaciones
+    """
+    limit = obtener_limit(params)
+    posicion = _posicion_inicial(params)
+
+    ahora = timezone.now()
+    if posicion is not None and posicion[0] < ahora - timedelta(days=RETENCION_DIAS):
+        raise SincronizacionExpirada(
+            f'Solo se conservan las eliminaciones de los últimos {RETENCION_DIAS} días: '
+            'sincronice de nuevo sin since ni cursor'
+        )
+    horizonte = ahora - timedelta(seconds=MARGEN_SEGUNDOS)
+
+    # Cada tabla aporta como máximo limit + 1 filas; la fila extra indica si hay más
+    linea_de_tiempo = heapq.merge(
+        _actualizados(posicion, horizonte, limit + 1),
+        _eliminados(posicion, horizonte, limit + 1),
+        key=lambda cambio: cambio[:3],
+    )
+    filas = [cambio for _, cambio in zip(range(limit + 1), linea_de_tiempo)]
+    has_more = len(filas) > limit
+    filas = filas[:limit]
+
+    zona = zona_actual()
+    if zona is None:
+        fecha_iso = _campo_fecha.to_representation
+    else:
+        fecha_iso = lambda valor: fecha_hora_iso(valor, zona)
+
+    cambios = []
+    for fecha, tipo, _, id_producto_farmacia, producto, farmacia, precio in filas:
+        cambio = {
+            'tipo': TIPOS[tipo],
+            'id_producto_farmacia': id_producto_farmacia,
+            'producto': producto,
+            'farmacia': farmacia,
+            'fecha': fecha_iso(fecha),
+        }
+        if tipo == ACTUALIZADO:
+            cambio['precio'] = _precio(precio)
+        cambios.append(cambio)
+
+    # Al terminar, el cursor avanza hasta el horizonte: lo anterior ya fue entregado
+    if has_more:
+        siguiente = filas[-1][:3]
+    else:
+        siguiente = (horizonte, -1, 0)
+    if posicion is not None and not has_more and siguiente < posicion:
+        # Reloj del servidor atrasado respecto al since del cliente: no retroceder
+        siguiente = posicion
+
+    return cambios, {
+        'limit': limit,
+        'has_more': has_more,
+        'next_cursor': codificar_cursor([siguiente[0].isoformat(), siguiente[1], siguiente[2]]),
+        'horizonte': fecha_iso(horizonte),
+    }
+
+
+def purgar_eliminados(dias=None, using='default'):
+    """
+    Borra los registros de eliminación más antiguos que la retención configurada
+
+    Returns:
+        int: Registros borrados
+    """
+    dias = RETENCION_DIAS if dias is None else dias
+    limite = timezone.now() - timedelta(days=dias)
+    borrados, _ = PrecioEliminado.objects.using(using).filter(fecha_eliminacion__lt=limite).delete()
+    return borrados
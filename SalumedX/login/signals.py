@@ -0,0 +1,102 @@
+"""
+Señales del app login.
+Se conectan en LoginConfig.ready() (ver apps.py).
+"""
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+from login.models import User, Producto, ProductoFarmacia, Farmacia, Sucursal, PrecioEliminado
+from login.services import busqueda, geohash
+from login.services.autocompletado import indice_autocompletado
+from login.services.indice_geografico import indice_sucursales
+from login.services.mapa_sucursales import mapa_sucursales
+from login.services.busqueda_difusa import indice_difuso
+from login.services.resumen_precios import programar_actualizacion
+from login.services.cache_respuestas import invalidar_modelo
+from login.services.cache_autenticacion import invalidar_usuario
+
+
+@receiver(post_save, sender=Producto)
+def indexar_producto_guardado(sender, instance, using, **kwargs):
+    """Mantiene los índices de búsqueda, autocompletado y búsqueda difusa al crear o editar un producto"""
+    if busqueda.indice_disponible(using):
+        busqueda.indexar_producto(instance, using=using)
+    indice_autocompletado.actualizar(instance)
+    indice_difuso.actualizar(instance)
+
+
+@receiver(post_delete, sender=Producto)
+def desindexar_producto_eliminado(sender, instance, using, **kwargs):
+    """Quita el producto eliminado de los índices de búsqueda"""
+    if busqueda.indice_disponible(using):
+        busqueda.desindexar_producto(instance.pk, using=using)
+    indice_autocompletado.eliminar(instance.pk)
+    indice_difuso.eliminar(instance.pk)
+
+
+@receiver(post_save, sender=ProductoFarmacia)
+@receiver(post_delete, sender=ProductoFarmacia)
+def actualizar_resumen_precios(sender, instance, using, **kwargs):
+    """Recalcula ResumenPrecioProducto del producto cuyo precio cambió o se eliminó (al confirmar)"""
+    programar_actualizacion(instance.producto_id, using=using)
+
+
+@receiver(post_delete, sender=ProductoFarmacia)
+def registrar_precio_eliminado(sender, instance, using, **kwargs):
+    """Deja el registro de la eliminación para /sync/precios/ (también en borrados en cascada)"""
+    PrecioEliminado.objects.using(using).create(
+        id_producto_farmacia=instance.pk,
+        id_producto=instance.producto_id,
+        id_farmacia=instance.farmacia_id,
+    )
+
+
+@receiver(pre_save, sender=Sucursal)
+def calcular_geohash_sucursal(sender, instance, **kwargs):
+    """Mantiene Sucursal.geohash al día con latitud/longitud"""
+    if instance.latitud is not None and instance.longitud is not None:
+        instance.geohash = geohash.codificar(instance.latitud, instance.longitud)
+
+
+@receiver(post_save, sender=Sucursal)
+def indexar_sucursal_guardada(sender, instance, **kwargs):
+    """Mantiene el índice espacial de /sucursales/cercanas/ y las grillas del mapa al crear o editar una sucursal"""
+    indice_sucursales.actualizar(instance)
+    mapa_sucursales.actualizar(instance)
+
+
+@receiver(post_delete, sender=Sucursal)
+def desindexar_sucursal_eliminada(sender, instance, **kwargs):
+    """Quita la sucursal eliminada del índice espacial y de las grillas del mapa"""
+    indice_sucursales.eliminar(instance.pk)
+    mapa_sucursales.eliminar(instance.pk)
+
+
+@receiver(post_save, sender=Farmacia)
+def actualizar_farmacia_indice(sender, instance, **kwargs):
+    """Actualiza el nombre de la farmacia que el índice espacial y el mapa devuelven con sus sucursales"""
+    indice_sucursales.actualizar_farmacia(instance)
+    mapa_sucursales.actualizar_farmacia(instance)
+
+
+@receiver(post_save, sender=Producto)
+@receiver(post_delete, sender=Producto)
+@receiver(post_save, sender=Farmacia)
+@receiver(post_delete, sender=Farmacia)
+@receiver(post_save, sender=Sucursal)
+@receiver(post_delete, sender=Sucursal)
+@receiver(post_save, sender=ProductoFarmacia)
+@receiver(post_delete, sender=ProductoFarmacia)
+def invalidar_cache_respuestas(sender, using, **kwargs):
+    """Invalida las respuestas en caché de los endpoints que dependen del modelo modificado"""
+    invalidar_modelo(sender, using=using)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidar_cache_usuario(sender, instance, using, **kwargs):
+    """Quita el usuario de la caché de autenticación JWT al editarlo, desactivarlo o eliminarlo"""
+    invalidar_usuario(instance.pk)
+    # Otra petición podría volver a leer la fila vieja antes de que la transacción confirme
+    user_id = instance.pk
+    transaction.on_commit(lambda: invalidar_usuario(user_id), using=using)
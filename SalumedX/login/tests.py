@@ -1,3 +1,1391 @@
+import base64
+import copy
+import csv
+import importlib
+import json
+import itertools
+import random
+import threading
+import unittest
+import zoneinfo
+from io import StringIO
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from unittest import mock
+import jwt
+from django.apps import apps as django_apps
+from django.core.cache import caches
+from django.db import connection
+from django.db.models import F
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework import serializers
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+from login.models import (
+    DetallePrescripcion, DetalleReceta, Farmacia, Medico, Paciente, PrecioEliminado, Producto,
+    ProductoFarmacia, Receta, ResumenPrecioProducto, Sucursal, User, VersionModelo,
+)
+from login.serializers import (
+    CamposDinamicosMixin, DetallePrescripcionSerializer, FarmaciaSerializer, ProductoFarmaciaSerializer,
+    ProductoSerializer, SucursalSerializer,
+)
+from login.services import busqueda, distancias, geohash, optimizador_recetas
+from login.services.autocompletado import IndiceAutocompletado
+from login.services.busqueda_difusa import indice_difuso
+from login.services.exportacion import ENCABEZADO_PRECIOS
+from login.services.mejores_opciones import mejores_opciones
+from login.services.cache_autenticacion import cache_tokens, cache_usuarios
+from login.services.campos import parsear_arbol
+from login.services.cercania import sucursales_en_radio
+from login.services.indice_geografico import IndiceSucursales, haversine_km
+from login.services.paginacion import estimar_total
+from login.services.mapa_sucursales import MAX_CELDAS, ZOOM_PUNTOS, MapaSucursales, precision_para_zoom
+from login.services.principal import tokens_para
+from login.services.resumen_precios import reconstruir_resumenes
+from login.services.sincronizacion import MARGEN_SEGUNDOS, RETENCION_DIAS
+from login.services.serializacion_rapida import NoCompilable, SerializadorCompilado, serializar_rapido
 
-# Create your tests here.
+
+class DetallePrescripcionPlanoSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
+    """DetallePrescripcion sin to_representation propio (compilable, con un FK anulable anidado)"""
+    farmacia = FarmaciaSerializer(read_only=True)
+    producto_farmacia = ProductoFarmaciaSerializer(read_only=True)
+
+    class Meta:
+        model = DetallePrescripcion
+        fields = '__all__'
+
+
+class ProductoConMetodoSerializer(serializers.ModelSerializer):
+    """SerializerMethodField: no se puede compilar"""
+    etiqueta = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Producto
+        fields = ['id_producto', 'nombre_comercial', 'etiqueta']
+
+    def get_etiqueta(self, producto):
+        return f'{producto.nombre_comercial} ({producto.concentracion})'
+
+
+class SerializacionRapidaTests(TestCase):
+    """serializar_rapido() debe devolver exactamente lo mismo que serializer.data"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.farmacias = [
+            Farmacia.objects.create(nombre_comercial=f'Farmacia {i}', horario_atencion='08:00 - 22:00')
+            for i in range(3)
+        ]
+        cls.productos = [
+            Producto.objects.create(
+                nombre_generico=f'Paracetamol {i}', nombre_comercial=f'Analgésico {i}',
+                principio_activo='Paracetamol', categoria='Analgésicos', presentacion='Tabletas',
+                concentracion='500mg', requiere_receta=bool(i % 2)
+            )
+            for i in range(4)
+        ]
+        precios = ['0.10', '12.5', '999.99', '1234567.89']
+        for i, producto in enumerate(cls.productos):
+            for j, farmacia in enumerate(cls.farmacias):
+                if (i + j) % 3:
+                    ProductoFarmacia.objects.create(
+                        producto=producto, farmacia=farmacia, precio=Decimal(precios[(i + j) % 4])
+                    )
+        for j, farmacia in enumerate(cls.farmacias):
+            Sucursal.objects.create(
+                farmacia=farmacia, ubicacion=f'Guayaquil {j}',
+                latitud=Decimal('-2.170998') + Decimal(j) / 10 ** 6,
+                longitud=Decimal('-79.922359') - Decimal(j) / 10 ** 6
+            )
+
+        medico = Medico.objects.create(
+            user=User.objects.create_user('medico', password='x'), numero_licencia='L1',
+            institucion='Hospital', ubicacion_consultorio='Centro'
+        )
+        paciente = Paciente.objects.create(
+            user=User.objects.create_user('paciente', password='x'), fecha_nacimiento='1990-01-01',
+            cedula='0900000000', direccion='Centro', telefono='0999999999'
+        )
+        receta = Receta.objects.create(
+            medico=medico, paciente=paciente, fecha_emision='2025-01-01', diagnostico='Gripe',
+            ubicacion_emision='Guayaquil'
+        )
+        detalle = DetalleReceta.objects.create(
+            receta=receta, producto=cls.productos[0], cantidad=1, dosis='1 tableta',
+            presentacion='Tabletas', duracion_tratamiento='3 días', instrucciones='Cada 8 horas'
+        )
+        # Con precio oficial, sin precio oficial (FK nulo) y sin ProductoFarmacia para el par
+        cls.precio_oficial = ProductoFarmacia.objects.filter(producto=cls.productos[0]).first()
+        for producto_farmacia, farmacia, producto in (
+            (cls.precio_oficial, cls.precio_oficial.farmacia, cls.productos[0]),
+            (None, cls.farmacias[1], cls.productos[0]),
+            (None, cls.farmacias[0], cls.productos[0]),
+        ):
+            DetallePrescripcion.objects.create(
+                detalle_receta=detalle, producto_farmacia=producto_farmacia, farmacia=farmacia,
+                producto=producto, precio_encontrado=Decimal('7.5'), distancia=Decimal('2.35'),
+                fuente='Web scraping'
+            )
+
+    def comparar(self, instancias, serializer_class, fields=None, expand=None, many=True):
+        campos, expandir = parsear_arbol(fields), parsear_arbol(expand)
+        opciones = {}
+        if campos is not None or expandir is not None:
+            opciones = {'campos': campos, 'expandir': expandir}
+        esperado = serializer_class(instancias, many=many, **opciones).data
+        obtenido = serializar_rapido(instancias, serializer_class, campos=campos, expandir=expandir, many=many)
+        self.assertEqual(obtenido, esperado)
+        return obtenido
+
+    def precios(self):
+        return list(ProductoFarmacia.objects.select_related('producto', 'farmacia').order_by('pk'))
+
+    def test_producto(self):
+        productos = list(Producto.objects.order_by('pk'))
+        self.comparar(productos, ProductoSerializer)
+        self.comparar(productos[0], ProductoSerializer, many=False)
+        self.comparar(productos, ProductoSerializer, fields='id_producto,nombre_comercial,requiere_receta')
+
+    def test_producto_farmacia(self):
+        datos = self.comparar(self.precios(), ProductoFarmaciaSerializer)
+        self.assertIsInstance(datos[0]['producto'], dict)
+
+    def test_producto_farmacia_fields_expand(self):
+        precios = self.precios()
+        # Relaciones sin expandir: solo el id
+        datos = self.comparar(precios, ProductoFarmaciaSerializer, expand='')
+        self.assertEqual(datos[0]['producto'], precios[0].producto_id)
+        self.comparar(precios, ProductoFarmaciaSerializer, expand='farmacia')
+        self.comparar(precios, ProductoFarmaciaSerializer, fields='precio,producto.nombre_comercial')
+        self.comparar(
+            precios, ProductoFarmaciaSerializer,
+            fields='id_producto_farmacia,precio,farmacia', expand='producto'
+        )
+
+    def test_sucursal(self):
+        sucursales = list(Sucursal.objects.select_related('farmacia').order_by('pk'))
+        datos = self.comparar(sucursales, SucursalSerializer)
+        self.assertNotIn('geohash', datos[0])
+        self.comparar(sucursales, SucursalSerializer, fields='id_sucursal,latitud,longitud,farmacia', expand='')
+        self.comparar(sucursales[0], SucursalSerializer, many=False, expand='farmacia')
+
+    def test_precision_decimal(self):
+        # Valores en memoria (sin pasar por la base de datos) con más o menos decimales de los del campo
+        farmacia, producto = self.farmacias[0], self.productos[0]
+        precios = [
+            ProductoFarmacia(id_producto_farmacia=i, producto=producto, farmacia=farmacia, precio=Decimal(valor))
+            for i, valor in enumerate(['12.5', '3', '0.005', '2.675', '-1.999', '99999999.99'], 1)
+        ]
+        for precio in precios:
+            precio.fecha_actualizacion = timezone.now()
+        datos = self.comparar(precios, ProductoFarmaciaSerializer)
+        self.assertEqual(datos[0]['precio'], '12.50')
+        sucursal = Sucursal(
+            id_sucursal=1, farmacia=farmacia, ubicacion='Norte',
+            latitud=Decimal('-2.1'), longitud=Decimal('-79.1234567')
+        )
+        self.comparar(sucursal, SucursalSerializer, many=False)
+
+    def test_formato_fecha_hora(self):
+        precios = self.precios()[:3]
+        precios[0].fecha_actualizacion = datetime(2025, 3, 1, 12, 30, 45, 123456, tzinfo=dt_timezone.utc)
+        precios[1].fecha_actualizacion = datetime(2025, 3, 1, 23, 59, 59, tzinfo=zoneinfo.ZoneInfo('America/Guayaquil'))
+        precios[2].fecha_actualizacion = None
+        datos = self.comparar(precios, ProductoFarmaciaSerializer)
+        self.assertEqual(datos[0]['fecha_actualizacion'], '2025-03-01T12:30:45.123456Z')
+        self.assertIsNone(datos[2]['fecha_actualizacion'])
+        with timezone.override(zoneinfo.ZoneInfo('America/Guayaquil')):
+            datos = self.comparar(precios, ProductoFarmaciaSerializer)
+        self.assertEqual(datos[0]['fecha_actualizacion'], '2025-03-01T07:30:45.123456-05:00')
+
+    def test_fk_nulo(self):
+        detalles = list(
+            DetallePrescripcion.objects.select_related(
+                'farmacia', 'producto_farmacia__producto', 'producto_farmacia__farmacia'
+            ).order_by('pk')
+        )
+        datos = self.comparar(detalles, DetallePrescripcionPlanoSerializer)
+        self.assertIsInstance(datos[0]['producto_farmacia'], dict)
+        self.assertIsNone(datos[1]['producto_farmacia'])
+        datos = self.comparar(detalles, DetallePrescripcionPlanoSerializer, expand='farmacia')
+        self.assertEqual(datos[0]['producto_farmacia'], self.precio_oficial.pk)
+        self.assertIsNone(datos[1]['producto_farmacia'])
+
+    def test_detalle_prescripcion_usa_drf(self):
+        # to_representation propio: no se compila y se serializa con DRF
+        with self.assertRaises(NoCompilable):
+            SerializadorCompilado(DetallePrescripcionSerializer())
+        detalles = list(DetallePrescripcion.objects.order_by('pk'))
+        datos = self.comparar(detalles, DetallePrescripcionSerializer)
+        self.assertEqual(datos[0]['precio_origen'], 'ProductoFarmacia (precio oficial)')
+        self.assertEqual(datos[2]['precio_origen'], 'Manual/Scraping - Web scraping')
+        self.comparar(
+            detalles, DetallePrescripcionSerializer,
+            fields='id_detalle_prescripcion,precio_encontrado,farmacia', expand='farmacia'
+        )
+        self.comparar(detalles[1], DetallePrescripcionSerializer, many=False, expand='')
+
+    def test_serializer_no_compilable(self):
+        with self.assertRaises(NoCompilable):
+            SerializadorCompilado(ProductoConMetodoSerializer())
+        productos = list(Producto.objects.order_by('pk'))
+        datos = self.comparar(productos, ProductoConMetodoSerializer)
+        self.assertEqual(datos[0]['etiqueta'], 'Analgésico 0 (500mg)')
+        self.comparar(productos[0], ProductoConMetodoSerializer, many=False)
+
+
+class AutenticacionJWTTests(TestCase):
+    """Middleware + DRF: una verificación del JWT y a lo sumo una consulta del usuario por petición"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('medico', password='x')
+        Medico.objects.create(
+            user=cls.user, numero_licencia='L1', institucion='Hospital', ubicacion_consultorio='Centro'
+        )
+
+    def setUp(self):
+        cache_usuarios.limpiar()
+        cache_tokens.limpiar()
+        self.client = APIClient()
+        self.refresh = tokens_para(self.user)
+        self.access = str(self.refresh.access_token)
+
+    def get(self, url, token):
+        return self.client.get(url, HTTP_AUTHORIZATION=f'Bearer {token}')
+
+    def consultas_usuario(self, consultas):
+        return [c['sql'] for c in consultas if 'FROM "auth_user"' in c['sql']]
+
+    def test_una_verificacion_y_una_consulta_de_usuario(self):
+        for url in ('/tasks/', '/recetas/'):
+            cache_usuarios.limpiar()
+            cache_tokens.limpiar()
+            with mock.patch('jwt.decode', wraps=jwt.decode) as decode, \
+                    CaptureQueriesContext(connection) as consultas:
+                respuesta = self.get(url, self.access)
+            self.assertEqual(respuesta.status_code, 200, url)
+            self.assertEqual(decode.call_count, 1, url)
+            self.assertEqual(len(self.consultas_usuario(consultas.captured_queries)), 1, url)
+
+    def test_peticiones_siguientes_usan_la_cache(self):
+        self.get('/tasks/', self.access)
+        with mock.patch('jwt.decode', wraps=jwt.decode) as decode:
+            # Solo el perfil del médico (rol desde los claims, usuario desde la caché)
+            with self.assertNumQueries(1):
+                respuesta = self.get('/tasks/', self.access)
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta.json()['tipo_usuario'], 'medico')
+        self.assertEqual(decode.call_count, 0)
+
+    def assertTokenRechazado(self, token, estado_token):
+        respuesta = self.get('/tasks/', token)
+        self.assertEqual(respuesta.status_code, 401)
+        self.assertEqual(respuesta.json()['code'], 'token_not_valid')
+        self.assertEqual(respuesta['X-Token-Status'], estado_token)
+        self.assertTrue(respuesta['WWW-Authenticate'].startswith('Bearer'))
+
+    def test_firma_invalida(self):
+        payload = jwt.decode(self.access, options={'verify_signature': False})
+        self.assertTokenRechazado(jwt.encode(payload, 'otra-clave-de-firma-de-al-menos-32-bytes', algorithm='HS256'), 'invalid')
+
+    def test_token_expirado(self):
+        token = AccessToken.for_user(self.user)
+        token.set_exp(lifetime=-timedelta(minutes=1))
+        self.assertTokenRechazado(str(token), 'expired')
+
+    def test_refresh_token_como_access(self):
+        self.assertTokenRechazado(str(self.refresh), 'invalid')
+
+    def test_sin_token(self):
+        self.assertEqual(self.client.get('/tasks/').status_code, 401)
+        self.assertEqual(self.client.get('/farmacias/').status_code, 200)
+
+
+class CacheRespuestasTests(TestCase):
+    """Las versiones que invalidan la caché de respuestas son las de la base de datos"""
+
+    def setUp(self):
+        caches['default'].clear()
+        Farmacia.objects.create(nombre_comercial='Farmacia 1', horario_atencion='24h')
+
+    def test_escritura_en_otro_worker_invalida(self):
+        self.assertEqual(self.client.get('/farmacias/')['X-Cache'], 'MISS')
+        self.assertEqual(self.client.get('/farmacias/')['X-Cache'], 'HIT')
+        # Otro worker guarda una farmacia: cambian la tabla y la fila de versión, no la caché de este proceso
+        with mock.patch('django.db.models.signals.post_save.send'):
+            Farmacia.objects.create(nombre_comercial='Farmacia 2', horario_atencion='24h')
+        VersionModelo.objects.filter(modelo='login.farmacia').update(version=F('version') + 1)
+        respuesta = self.client.get('/farmacias/')
+        self.assertEqual(respuesta['X-Cache'], 'MISS')
+        self.assertContains(respuesta, 'Farmacia 2')
+
+    def escrituras(self, consultas):
+        return [
+            c['sql'] for c in consultas.captured_queries
+            if c['sql'].lstrip().upper().startswith(('INSERT', 'UPDATE', 'DELETE'))
+        ]
+
+    def test_lecturas_no_escriben(self):
+        self.assertEqual(
+            set(VersionModelo.objects.values_list('modelo', flat=True)),
+            {'login.producto', 'login.farmacia', 'login.sucursal', 'login.productofarmacia'}
+        )
+        # Sin filas (p. ej. réplica sin datos de versión) los GET tampoco escriben
+        for _ in range(2):
+            for url in ('/farmacias/', '/productos/', '/productos-farmacias/'):
+                with CaptureQueriesContext(connection) as consultas:
+                    self.assertEqual(self.client.get(url).status_code, 200, url)
+                self.assertEqual(self.escrituras(consultas), [], url)
+            VersionModelo.objects.all().delete()
+
+        self.assertEqual(self.client.get('/farmacias/')['X-Cache'], 'HIT')
+        Farmacia.objects.create(nombre_comercial='Farmacia 2', horario_atencion='24h')
+        self.assertEqual(VersionModelo.objects.get(modelo='login.farmacia').version, 1)
+        self.assertEqual(self.client.get('/farmacias/')['X-Cache'], 'MISS')
+
+
+class GetCondicionalTests(TestCase):
+    """ETag y Last-Modified salen de la base de datos: iguales en todos los workers"""
+
+    def setUp(self):
+        caches['default'].clear()
+        self.farmacia = Farmacia.objects.create(nombre_comercial='Farmacia 1', horario_atencion='24h')
+        self.producto = Producto.objects.create(
+            nombre_generico='Paracetamol', nombre_comercial='Analgésico', principio_activo='Paracetamol',
+            categoria='Analgésicos', presentacion='Tabletas', concentracion='500mg'
+        )
+        self.precios = [
+            ProductoFarmacia.objects.create(producto=self.producto, farmacia=self.farmacia, precio=Decimal('1.50')),
+            ProductoFarmacia.objects.create(
+                producto=self.producto,
+                farmacia=Farmacia.objects.create(nombre_comercial='Farmacia 2', horario_atencion='24h'),
+                precio=Decimal('2.50')
+            ),
+        ]
+
+    def test_mismo_etag_en_otro_worker(self):
+        url = f'/productos-farmacias/?producto={self.producto.pk}'
+        primera = self.client.get(url)
+        # Otro worker: caché local vacía
+        caches['default'].clear()
+        segunda = self.client.get(url, HTTP_IF_NONE_MATCH=primera['ETag'])
+        self.assertEqual(segunda.status_code, 304)
+
+    def test_eliminar_el_precio_mas_reciente_cambia_last_modified(self):
+        url = f'/productos-farmacias/?producto={self.producto.pk}'
+        # Fechas en el pasado: Last-Modified tiene resolución de segundos
+        hace_un_rato = timezone.now() - timedelta(minutes=10)
+        ProductoFarmacia.objects.filter(pk=self.precios[0].pk).update(fecha_actualizacion=hace_un_rato)
+        ProductoFarmacia.objects.filter(pk=self.precios[1].pk).update(
+            fecha_actualizacion=hace_un_rato + timedelta(minutes=5)
+        )
+        VersionModelo.objects.update(fecha_actualizacion=hace_un_rato - timedelta(minutes=1))
+        last_modified = self.client.get(url)['Last-Modified']
+
+        self.precios[1].delete()
+        respuesta = self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertNotEqual(respuesta['Last-Modified'], last_modified)
+
+
+class PaginacionTests(TestCase):
+    """Paginación keyset: recorrer con next_cursor devuelve todo una vez y en orden, aun con empates"""
+
+    @classmethod
+    def setUpTestData(cls):
+        farmacias = [
+            Farmacia.objects.create(nombre_comercial=f'Farmacia {i}', horario_atencion='24h') for i in range(3)
+        ]
+        productos = [
+            Producto.objects.create(
+                nombre_generico=f'Genérico {i}', nombre_comercial=f'Comercial {i}',
+                principio_activo='Activo', categoria='Analgésicos', presentacion='Tabletas',
+                concentracion='500mg', requiere_receta=False
+            )
+            for i in range(5)
+        ]
+        # Solo dos precios distintos: casi todas las claves de orden empatan
+        for i, producto in enumerate(productos):
+            for j, farmacia in enumerate(farmacias):
+                ProductoFarmacia.objects.create(
+                    producto=producto, farmacia=farmacia, precio=Decimal('1.50') if (i + j) % 2 else Decimal('3.00')
+                )
+
+    def setUp(self):
+        caches['default'].clear()
+
+    def recorrer(self, url, lista, clave, **params):
+        vistos, cursor = [], None
+        for _ in range(50):
+            respuesta = self.client.get(url, {**params, **({'cursor': cursor} if cursor else {})})
+            self.assertEqual(respuesta.status_code, 200, respuesta.json())
+            datos = respuesta.json()
+            vistos += [fila[clave] for fila in datos[lista]]
+            paginacion = datos['paginacion']
+            if not paginacion['has_more']:
+                self.assertIsNone(paginacion['next_cursor'])
+                return vistos
+            cursor = paginacion['next_cursor']
+        self.fail('La paginación no terminó')
+
+    def test_recorrido_con_empates_en_el_precio(self):
+        filas = list(ProductoFarmacia.objects.values_list('precio', 'id_producto_farmacia'))
+        ascendente = [pk for _, pk in sorted(filas)]
+        descendente = [pk for _, pk in sorted(filas, reverse=True)]
+        for limit in (1, 2, 4, 15):
+            self.assertEqual(
+                self.recorrer('/productos-farmacias/', 'resultados', 'id_producto_farmacia', limit=limit),
+                ascendente
+            )
+            self.assertEqual(
+                self.recorrer('/productos-farmacias/', 'resultados', 'id_producto_farmacia', limit=limit, orden='precio_desc'),
+                descendente
+            )
+
+    def test_recorrido_por_id_con_total(self):
+        ids = list(Producto.objects.order_by('pk').values_list('pk', flat=True))
+        self.assertEqual(self.recorrer('/productos/', 'productos', 'id_producto', limit=2), ids)
+        respuesta = self.client.get('/productos/', {'limit': 2, 'con_total': 'true'}).json()
+        self.assertEqual(respuesta['paginacion']['total_estimado'], len(ids))
+
+    def test_cursor_mal_formado(self):
+        def cursor(valores):
+            return base64.urlsafe_b64encode(json.dumps(valores).encode()).decode()
+
+        casos = {
+            '/productos-farmacias/': [
+                'no-es-base64!', cursor('1.50'), cursor(['1.50']), cursor(['abc', '1']), cursor(['1.50', 'x']),
+                cursor([None, None]), cursor(['1.50', [3]]), cursor([{'a': 1}, '2']),
+            ],
+            '/productos/': [cursor(['x']), cursor([[1]]), cursor(['1', '2'])],
+        }
+        for url, cursores in casos.items():
+            for valor in cursores:
+                respuesta = self.client.get(url, {'cursor': valor})
+                self.assertEqual(respuesta.status_code, 400, (url, valor))
+                self.assertEqual(respuesta.json()['error'], 'Cursor inválido')
+
+    def test_estimar_total_en_postgresql(self):
+        queryset = Producto.objects.all()
+        self.assertEqual(estimar_total(queryset), 5)  # Otros motores: count() exacto
+        conexion = mock.MagicMock(vendor='postgresql')
+        conexion.cursor.return_value.__enter__.return_value.fetchone.return_value = ['[{"Plan": {"Plan Rows": 4200}}]']
+        with mock.patch('login.services.paginacion.connections', {'default': conexion}):
+            self.assertEqual(estimar_total(queryset), 4200)
+        sql = conexion.cursor.return_value.__enter__.return_value.execute.call_args[0][0]
+        self.assertTrue(sql.startswith('EXPLAIN (FORMAT JSON) SELECT'))
+
+
+class BusquedaProductosTests(TestCase):
+    """?search= usa el índice FTS5 de SQLite: coincidencias por prefijo, sin tildes y ordenadas por bm25"""
+
+    @classmethod
+    def setUpTestData(cls):
+        def producto(comercial, generico, activo):
+            return Producto.objects.create(
+                nombre_comercial=comercial, nombre_generico=generico, principio_activo=activo,
+                categoria='Analgésicos', presentacion='Tabletas', concentracion='500mg', requiere_receta=False
+            )
+
+        # Creados en orden inverso al ranking esperado, así el id no explica el orden
+        cls.solo_activo = producto('Gripex Noche', 'Clorfenamina', 'Paracetamol')
+        cls.generico = producto('Dolofin', 'Paracetamol', 'Acetaminofén')
+        cls.todos = producto('Paracetamol', 'Paracetamol', 'Paracetamol')
+        cls.otro = producto('Ibuprofeno', 'Ibuprofeno', 'Ibuprofeno')
+        cls.parecido = producto('Dolofan', 'Naproxeno', 'Naproxeno')
+
+    def setUp(self):
+        caches['default'].clear()
+
+    def buscar(self, **params):
+        respuesta = self.client.get('/productos/', params)
+        self.assertEqual(respuesta.status_code, 200, respuesta.json())
+        return [producto['id_producto'] for producto in respuesta.json()['productos']]
+
+    def test_orden_por_relevancia(self):
+        self.assertTrue(busqueda.indice_disponible())
+        esperado = [self.todos.pk, self.generico.pk, self.solo_activo.pk]
+        self.assertEqual(self.buscar(search='paracetamol'), esperado)
+        # Prefijo, mayúsculas y tildes no cambian el resultado
+        self.assertEqual(self.buscar(search='PARACÉT'), esperado)
+        # Todos los términos deben coincidir
+        self.assertEqual(self.buscar(search='paracetamol noche'), [self.solo_activo.pk])
+        self.assertEqual(self.buscar(search='acetaminofen'), [self.generico.pk])
+        # El cursor (relevancia, pk) recorre el mismo orden
+        ids, cursor = [], None
+        while True:
+            datos = self.client.get(
+                '/productos/', {'search': 'paracetamol', 'limit': 1, **({'cursor': cursor} if cursor else {})}
+            ).json()
+            ids += [producto['id_producto'] for producto in datos['productos']]
+            cursor = datos['paginacion']['next_cursor']
+            if not cursor:
+                break
+        self.assertEqual(ids, esperado)
+
+    def test_busqueda_difusa_con_errores_de_escritura(self):
+        indice_difuso.construir()  # Índice del proceso con los productos de esta prueba
+        self.assertEqual(self.buscar(search='ibuprophen'), [])
+        self.assertEqual(self.buscar(search='ibuprophen', fuzzy='true'), [self.otro.pk])
+        # Misma distancia: el catálogo pagina por (relevancia, pk) descendente
+        self.assertEqual(
+            self.buscar(search='paracetamo', fuzzy='true'),
+            sorted([self.todos.pk, self.generico.pk, self.solo_activo.pk], reverse=True)
+        )
+        # Menor distancia total primero: 'dolofin' (1 error) antes que 'dolofan' (2)
+        self.assertEqual(self.buscar(search='dolofim', fuzzy='true'), [self.generico.pk, self.parecido.pk])
+        self.assertEqual(
+            self.buscar(search='paracetamol nohce', fuzzy='true'), [self.solo_activo.pk]
+        )
+        self.assertEqual(self.buscar(search='xyzxyz', fuzzy='true'), [])
+
+
+class AutocompletadoTests(TestCase):
+    """El índice devuelve el top-N exacto del ranking (posición, largo), aunque haya muchas coincidencias"""
+
+    def test_top_n_con_muchas_coincidencias(self):
+        productos = [
+            Producto(
+                id_producto=i, nombre_comercial=f'Aaa {i:04d} extra', nombre_generico='Genérico',
+                principio_activo='Activo'
+            )
+            for i in range(1, 1001)
+        ]
+        # Los mejores quedan al final en orden lexicográfico
+        productos.append(Producto(id_producto=2000, nombre_comercial='Ab', nombre_generico='X', principio_activo='Y'))
+        productos.append(Producto(id_producto=2001, nombre_comercial='Zeta A', nombre_generico='X', principio_activo='Y'))
+        indice = IndiceAutocompletado()
+        indice.construir(productos)
+
+        ids = [producto['id_producto'] for producto in indice.buscar('a', 3)]
+        self.assertEqual(ids, [2000, 1, 2])
+        ids = [producto['id_producto'] for producto in indice.buscar('a', 1002)]
+        self.assertEqual(ids[0], 2000)
+        self.assertEqual(ids[-1], 2001)  # Coincidencia en la segunda palabra
+
+    def productos(self, n, sufijo=''):
+        return [
+            Producto(
+                id_producto=i, nombre_comercial=f'Dolo {i}{sufijo}', nombre_generico=f'Genérico {i % 7}',
+                principio_activo='Paracetamol'
+            )
+            for i in range(1, n + 1)
+        ]
+
+    def test_escrituras_no_modifican_el_estado_publicado(self):
+        indice = IndiceAutocompletado()
+        indice.construir(self.productos(50))
+        publicado = indice._estado
+        copia = copy.deepcopy(publicado)
+
+        for producto in self.productos(10, ' forte'):
+            indice.actualizar(producto)
+        indice.eliminar(20)
+        self.assertEqual(publicado, copia)
+
+        # El estado nuevo coincide con reconstruir desde cero
+        esperado = IndiceAutocompletado()
+        esperado.construir([p for p in self.productos(10, ' forte') + self.productos(50)[10:] if p.pk != 20])
+        entradas = {grupo: arreglo for grupo, arreglo in indice._estado[0].items() if arreglo}
+        self.assertEqual(entradas, esperado._estado[0])
+        self.assertEqual(indice._estado[2], esperado._estado[2])
+        for texto in ('dolo', 'dolo 1', 'forte', 'generico 3', 'para'):
+            self.assertEqual(indice.buscar(texto, 20), esperado.buscar(texto, 20), texto)
+
+    def test_busquedas_concurrentes_con_escrituras(self):
+        indice = IndiceAutocompletado()
+        indice.construir(self.productos(300))
+        nuevos = self.productos(300, ' plus')
+        errores, terminado = [], threading.Event()
+
+        def escribir():
+            try:
+                for i, producto in enumerate(nuevos):
+                    indice.actualizar(producto)
+                    if i % 3 == 0:
+                        indice.eliminar(producto.pk)
+            except Exception as error:
+                errores.append(error)
+            finally:
+                terminado.set()
+
+        hilo = threading.Thread(target=escribir)
+        hilo.start()
+        try:
+            while not terminado.is_set():
+                for texto in ('dolo', 'plus', 'generico'):
+                    for producto in indice.buscar(texto, 50):
+                        nombres = ' '.join((producto['nombre_comercial'], producto['nombre_generico'])).lower()
+                        self.assertIn(texto, nombres.replace('é', 'e'))
+        finally:
+            hilo.join()
+        self.assertEqual(errores, [])
+
+
+class CercaniaTests(TestCase):
+    """El prefiltro indexado (caja + geohash) no pierde sucursales dentro del radio"""
+
+    @classmethod
+    def setUpTestData(cls):
+        farmacia = Farmacia.objects.create(nombre_comercial='Farmacia Polar', horario_atencion='24h')
+        aleatorio = random.Random(17)
+        puntos = [(aleatorio.uniform(86, 90), aleatorio.uniform(-180, 180)) for _ in range(150)]
+        puntos += [(aleatorio.uniform(-90, -86), aleatorio.uniform(-180, 180)) for _ in range(100)]
+        puntos += [(aleatorio.uniform(-3, -1), aleatorio.uniform(-80.5, -79.5)) for _ in range(100)]
+        Sucursal.objects.bulk_create([
+            Sucursal(
+                farmacia=farmacia, latitud=Decimal(f'{lat:.6f}'), longitud=Decimal(f'{lng:.6f}'),
+                geohash=geohash.codificar(Decimal(f'{lat:.6f}'), Decimal(f'{lng:.6f}'))
+            )
+            for lat, lng in puntos
+        ])
+        cls.filas = list(Sucursal.objects.values_list('id_sucursal', 'latitud', 'longitud'))
+
+    def assertIgualFuerzaBruta(self, lat, lng, radio_km):
+        esperado = {
+            id_sucursal for id_sucursal, latitud, longitud in self.filas
+            if haversine_km(lat, lng, float(latitud), float(longitud)) <= radio_km
+        }
+        obtenido = {fila[0] for _, fila in sucursales_en_radio(lat, lng, radio_km)}
+        self.assertEqual(obtenido, esperado, (lat, lng, radio_km))
+
+    def test_cerca_de_los_polos(self):
+        self.assertIgualFuerzaBruta(89.68, -79.30, 80)
+        self.assertIgualFuerzaBruta(89.44, -13.99, 80)
+        self.assertIgualFuerzaBruta(-89.82, 150.36, 25)
+        self.assertIgualFuerzaBruta(87.5, 179.9, 150)
+        self.assertIgualFuerzaBruta(-87.0, -179.9, 40)
+
+    def test_latitudes_bajas(self):
+        for radio_km in (1, 5, 25, 100):
+            self.assertIgualFuerzaBruta(-2.17, -79.92, radio_km)
+
+
+class CrearDetallesPrescripcionTests(TestCase):
+    """POST /detalle-prescripcion/: precio y distancia se validan antes de insertar"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.farmacia = Farmacia.objects.create(nombre_comercial='Farmacia', horario_atencion='08:00 - 22:00')
+        cls.producto = Producto.objects.create(
+            nombre_generico='Paracetamol', nombre_comercial='Analgésico', principio_activo='Paracetamol',
+            categoria='Analgésicos', presentacion='Tabletas', concentracion='500mg', requiere_receta=False
+        )
+        medico = Medico.objects.create(
+            user=User.objects.create_user('medico', password='x'), numero_licencia='L1',
+            institucion='Hospital', ubicacion_consultorio='Centro'
+        )
+        paciente = Paciente.objects.create(
+            user=User.objects.create_user('paciente', password='x'), fecha_nacimiento='1990-01-01',
+            cedula='0900000000', direccion='Centro', telefono='0999999999'
+        )
+        receta = Receta.objects.create(
+            medico=medico, paciente=paciente, fecha_emision='2025-01-01', diagnostico='Gripe',
+            ubicacion_emision='Guayaquil'
+        )
+        cls.detalle = DetalleReceta.objects.create(
+            receta=receta, producto=cls.producto, cantidad=1, dosis='1 tableta',
+            presentacion='Tabletas', duracion_tratamiento='3 días', instrucciones='Cada 8 horas'
+        )
+
+    def post(self, datos):
+        return APIClient().post('/detalle-prescripcion/', datos, format='json')
+
+    def item(self, **extra):
+        return {'farmacia': self.farmacia.pk, 'producto': self.producto.pk, **extra}
+
+    def test_lote_con_precio_invalido_responde_400_con_el_indice(self):
+        for precio in ('abc', '-1', None, '12345678901'):
+            respuesta = self.post({
+                'detalle_receta': self.detalle.pk,
+                'resultados': [self.item(precio_encontrado='2.50'), self.item(precio_encontrado=precio)],
+            })
+            self.assertEqual(respuesta.status_code, 400, precio)
+            self.assertTrue(respuesta.data['error'].startswith('resultados[1]: precio_encontrado'), respuesta.data)
+        self.assertFalse(DetallePrescripcion.objects.exists())
+
+    def test_lote_con_distancia_negativa_responde_400(self):
+        respuesta = self.post({'detalle_receta': self.detalle.pk, 'resultados': [self.item(distancia=-3)]})
+        self.assertEqual(respuesta.status_code, 400)
+        self.assertTrue(respuesta.data['error'].startswith('resultados[0]: distancia'))
+        self.assertFalse(DetallePrescripcion.objects.exists())
+
+    def test_lote_valido(self):
+        respuesta = self.post({
+            'detalle_receta': self.detalle.pk,
+            'resultados': [self.item(precio_encontrado='2.5', fuente='Web'), self.item()],
+        })
+        self.assertEqual(respuesta.status_code, 200, respuesta.data)
+        self.assertEqual(
+            list(DetallePrescripcion.objects.order_by('pk').values_list('precio_encontrado', 'fuente')),
+            [(Decimal('2.50'), 'Web'), (Decimal('0.00'), 'Manual')]
+        )
+
+    def test_ubicacion_del_paciente_reemplaza_la_distancia_enviada(self):
+        sin_sucursales = Farmacia.objects.create(nombre_comercial='Sin sucursales', horario_atencion='24h')
+        for latitud in ('-2.100000', '-2.200000'):
+            Sucursal.objects.create(
+                farmacia=self.farmacia, ubicacion='Guayaquil', latitud=Decimal(latitud), longitud=Decimal('-79.9')
+            )
+        respuesta = self.post({
+            'detalle_receta': self.detalle.pk, 'lat': -2.19, 'lng': -79.9,
+            'resultados': [
+                self.item(distancia='999'),
+                {'farmacia': sin_sucursales.pk, 'producto': self.producto.pk, 'distancia': '7.5'},
+            ],
+        })
+        self.assertEqual(respuesta.status_code, 200, respuesta.data)
+        esperado = Decimal(haversine_km(-2.19, -79.9, -2.2, -79.9)).quantize(Decimal('0.01'))
+        self.assertEqual(
+            list(DetallePrescripcion.objects.order_by('pk').values_list('distancia', flat=True)),
+            [esperado, Decimal('7.50')]  # La farmacia sin sucursales conserva la enviada
+        )
+
+        respuesta = self.post({'detalle_receta': self.detalle.pk, 'lat': -2.19, 'lng': -79.9, **self.item(distancia='5')})
+        self.assertEqual(respuesta.status_code, 200, respuesta.data)
+        self.assertEqual(DetallePrescripcion.objects.latest('pk').distancia, esperado)
+
+    def test_individual_con_precio_invalido_responde_400(self):
+        respuesta = self.post({'detalle_receta': self.detalle.pk, **self.item(precio_encontrado='abc')})
+        self.assertEqual(respuesta.status_code, 400)
+        self.assertTrue(respuesta.data['error'].startswith('precio_encontrado'))
+        self.assertFalse(DetallePrescripcion.objects.exists())
+
+
+class ResumenPreciosTests(TestCase):
+    """ResumenPrecioProducto se recalcula al confirmar el cambio de precio"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.farmacias = [
+            Farmacia.objects.create(nombre_comercial=f'Farmacia {i}', horario_atencion='08:00 - 22:00')
+            for i in range(3)
+        ]
+        cls.productos = [
+            Producto.objects.create(
+                nombre_generico=f'Paracetamol {i}', nombre_comercial=f'Analgésico {i}',
+                principio_activo='Paracetamol', categoria='Analgésicos', presentacion='Tabletas',
+                concentracion='500mg', requiere_receta=False
+            )
+            for i in range(2)
+        ]
+
+    def resumen(self, producto):
+        return ResumenPrecioProducto.objects.filter(producto=producto).values_list(
+            'precio_minimo', 'precio_maximo', 'precio_promedio', 'total_farmacias', 'farmacia_mas_barata_id'
+        ).first()
+
+    def test_recalcula_al_confirmar(self):
+        producto = self.productos[0]
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            for farmacia, precio in zip(self.farmacias, ('3.00', '1.50', '1.50')):
+                ProductoFarmacia.objects.create(producto=producto, farmacia=farmacia, precio=Decimal(precio))
+            # Aún sin confirmar: nada recalculado todavía
+            self.assertIsNone(self.resumen(producto))
+        self.assertEqual(len(callbacks), 3)
+        self.assertEqual(
+            self.resumen(producto),
+            (Decimal('1.50'), Decimal('3.00'), Decimal('2.00'), 3, self.farmacias[1].pk)
+        )
+
+        with self.captureOnCommitCallbacks(execute=True):
+            ProductoFarmacia.objects.filter(farmacia=self.farmacias[1]).get().delete()
+        self.assertEqual(
+            self.resumen(producto),
+            (Decimal('1.50'), Decimal('3.00'), Decimal('2.25'), 2, self.farmacias[2].pk)
+        )
+
+        with self.captureOnCommitCallbacks(execute=True):
+            for precio in ProductoFarmacia.objects.filter(producto=producto):
+                precio.delete()
+        self.assertIsNone(self.resumen(producto))
+
+    def test_migracion_0009_coincide_con_reconstruir(self):
+        for i, farmacia in enumerate(self.farmacias):
+            for j, producto in enumerate(self.productos):
+                ProductoFarmacia.objects.create(
+                    producto=producto, farmacia=farmacia, precio=Decimal(f'{(i * 7 + j * 3) % 5 + 1}.33')
+                )
+        reconstruir_resumenes()
+        esperado = list(ResumenPrecioProducto.objects.order_by('pk').values_list(
+            'producto_id', 'precio_minimo', 'precio_maximo', 'precio_promedio', 'total_farmacias',
+            'farmacia_mas_barata_id'
+        ))
+
+        ResumenPrecioProducto.objects.all().delete()
+        migracion = importlib.import_module('login.migrations.0009_resumenprecioproducto')
+        migracion.llenar_resumenes(django_apps, mock.Mock(connection=connection))
+        self.assertEqual(esperado, list(ResumenPrecioProducto.objects.order_by('pk').values_list(
+            'producto_id', 'precio_minimo', 'precio_maximo', 'precio_promedio', 'total_farmacias',
+            'farmacia_mas_barata_id'
+        )))
+        self.assertEqual(len(esperado), 2)
+
+
+class OptimizadorRecetasTests(TestCase):
+    """El plan dividido coincide con la fuerza bruta y /recetas/<id>/optimizar/ valida permisos y k"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.farmacias = [
+            Farmacia.objects.create(nombre_comercial=f'Farmacia {i}', horario_atencion='08:00 - 22:00')
+            for i in range(3)
+        ]
+        cls.productos = [
+            Producto.objects.create(
+                nombre_generico=f'Genérico {i}', nombre_comercial=f'Comercial {i}',
+                principio_activo='Activo', categoria='Analgésicos', presentacion='Tabletas',
+                concentracion='500mg', requiere_receta=False
+            )
+            for i in range(3)
+        ]
+        # Farmacia 0 vende todo caro; 1 y 2 abaratan productos distintos
+        precios = {
+            (0, 0): '5.00', (0, 1): '5.00', (0, 2): '5.00',
+            (1, 0): '1.00', (1, 1): '4.00',
+            (2, 1): '2.00', (2, 2): '1.50',
+        }
+        for (f, p), precio in precios.items():
+            ProductoFarmacia.objects.create(
+                farmacia=cls.farmacias[f], producto=cls.productos[p], precio=Decimal(precio)
+            )
+        cls.medico = Medico.objects.create(
+            user=User.objects.create_user('medico', password='x'), numero_licencia='L1',
+            institucion='Hospital', ubicacion_consultorio='Centro'
+        )
+        otro_medico = Medico.objects.create(
+            user=User.objects.create_user('otro', password='x'), numero_licencia='L2',
+            institucion='Hospital', ubicacion_consultorio='Centro'
+        )
+        paciente = Paciente.objects.create(
+            user=User.objects.create_user('paciente', password='x'), fecha_nacimiento='1990-01-01',
+            cedula='0900000000', direccion='Centro', telefono='0999999999'
+        )
+        cls.receta, cls.receta_ajena = [
+            Receta.objects.create(
+                medico=medico, paciente=paciente, fecha_emision='2025-01-01', diagnostico='Gripe',
+                ubicacion_emision='Guayaquil'
+            )
+            for medico in (cls.medico, otro_medico)
+        ]
+        for producto, cantidad in zip(cls.productos, (2, 1, 1)):
+            DetalleReceta.objects.create(
+                receta=cls.receta, producto=producto, cantidad=cantidad, dosis='1 tableta',
+                presentacion='Tabletas', duracion_tratamiento='3 días', instrucciones='Cada 8 horas'
+            )
+        cls.sin_perfil = User.objects.create_user('admin', password='x')
+
+    def setUp(self):
+        cache_usuarios.limpiar()
+        cache_tokens.limpiar()
+
+    def get(self, user, receta, k=None):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {tokens_para(user).access_token}')
+        return client.get(f'/recetas/{receta.pk}/optimizar/', {} if k is None else {'k': k})
+
+    def fuerza_bruta(self, costos, requeridos, k):
+        mejor = None
+        for tamano in range(1, k + 1):
+            for plan in itertools.combinations(costos, tamano):
+                if all(any(i in costos[f] for f in plan) for i in requeridos):
+                    total = sum(min(costos[f][i][1] for f in plan if i in costos[f]) for i in requeridos)
+                    mejor = total if mejor is None else min(mejor, total)
+        return mejor
+
+    def test_plan_dividido_coincide_con_fuerza_bruta(self):
+        aleatorio = random.Random(7)
+        for _ in range(150):
+            farmacias, productos = aleatorio.randint(1, 7), aleatorio.randint(1, 6)
+            costos = {}
+            for f in range(farmacias):
+                fila = {}
+                for i in range(productos):
+                    if aleatorio.random() < 0.6:
+                        centavos = aleatorio.randint(1, 40) * 25
+                        fila[i] = (Decimal(centavos) / 100, centavos * aleatorio.randint(1, 3))
+                if fila:
+                    costos[f] = fila
+            requeridos = sorted({i for fila in costos.values() for i in fila})
+            if not requeridos:
+                continue
+            unica = optimizador_recetas._mejor_farmacia_unica(costos, requeridos)
+            for k in (1, 2, 3):
+                total, plan, _, optimo = optimizador_recetas._plan_dividido(
+                    costos, requeridos, k, unica[1] if unica else None
+                )
+                self.assertTrue(optimo)
+                self.assertEqual(total, self.fuerza_bruta(costos, requeridos, k), (costos, k))
+                self.assertLessEqual(len(plan), k)
+            if unica:
+                self.assertEqual(unica[0], self.fuerza_bruta(costos, requeridos, 1))
+
+    def test_optimizar(self):
+        respuesta = self.get(self.medico.user, self.receta, k=2)
+        self.assertEqual(respuesta.status_code, 200, respuesta.data)
+        self.assertEqual(respuesta.data['farmacia_unica']['farmacia']['id_farmacia'], self.farmacias[0].pk)
+        self.assertEqual(respuesta.data['farmacia_unica']['total'], 20.0)
+        plan = respuesta.data['plan_dividido']
+        # 2 x 1.00 en la farmacia 1 + (2.00 + 1.50) en la farmacia 2
+        self.assertEqual(plan['total'], 5.5)
+        self.assertEqual(plan['ahorro_vs_farmacia_unica'], 14.5)
+        self.assertEqual(
+            sorted(f['farmacia']['id_farmacia'] for f in plan['farmacias']),
+            [self.farmacias[1].pk, self.farmacias[2].pk]
+        )
+        self.assertTrue(plan['optimo'])
+
+    def test_k_fuera_de_rango(self):
+        for k in (0, optimizador_recetas.K_MAXIMO + 1, 'dos'):
+            respuesta = self.get(self.medico.user, self.receta, k=k)
+            self.assertEqual(respuesta.status_code, 400, k)
+            self.assertIn('El parámetro k', respuesta.data['error'])
+
+    def test_receta_ajena(self):
+        respuesta = self.get(self.medico.user, self.receta_ajena)
+        self.assertEqual(respuesta.status_code, 404)
+
+    def test_usuario_sin_perfil(self):
+        respuesta = self.get(self.sin_perfil, self.receta)
+        self.assertEqual(respuesta.status_code, 403)
+
+
+class SincronizacionPreciosTests(TestCase):
+    """/sync/precios/: actualizaciones y eliminaciones en orden, sin duplicados ni huecos"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.farmacia = Farmacia.objects.create(nombre_comercial='Farmacia', horario_atencion='08:00 - 22:00')
+        cls.productos = [
+            Producto.objects.create(
+                nombre_generico=f'Genérico {i}', nombre_comercial=f'Comercial {i}',
+                principio_activo='Activo', categoria='Analgésicos', presentacion='Tabletas',
+                concentracion='500mg', requiere_receta=False
+            )
+            for i in range(2)
+        ]
+
+    def sync(self, **params):
+        return APIClient().get('/sync/precios/', params)
+
+    def cambios(self, respuesta):
+        self.assertEqual(respuesta.status_code, 200, respuesta.data)
+        return [
+            (cambio['tipo'], cambio['id_producto_farmacia'], cambio.get('precio'))
+            for cambio in respuesta.data['cambios']
+        ]
+
+    def fechar(self, precio, hace):
+        ProductoFarmacia.objects.filter(pk=precio.pk).update(fecha_actualizacion=timezone.now() - hace)
+
+    def test_actualizar_eliminar_y_resincronizar(self):
+        primero, segundo = [
+            ProductoFarmacia.objects.create(producto=producto, farmacia=self.farmacia, precio=Decimal('2.00'))
+            for producto in self.productos
+        ]
+        self.fechar(primero, timedelta(hours=3))
+        self.fechar(segundo, timedelta(hours=3))
+        # Primera sincronización hace dos horas: el cursor queda en ese horizonte
+        with mock.patch('django.utils.timezone.now', return_value=timezone.now() - timedelta(hours=2)):
+            respuesta = self.sync()
+        self.assertEqual(self.cambios(respuesta), [
+            ('actualizado', primero.pk, '2.00'), ('actualizado', segundo.pk, '2.00'),
+        ])
+        cursor = respuesta.data['sincronizacion']['next_cursor']
+
+        primero.precio = Decimal('1.75')
+        primero.save()
+        self.fechar(primero, timedelta(hours=1))
+        id_segundo = segundo.pk
+        segundo.delete()
+        PrecioEliminado.objects.update(fecha_eliminacion=timezone.now() - timedelta(hours=1))
+
+        # Solo lo que cambió desde el cursor, en orden (fecha, tipo, id)
+        respuesta = self.sync(cursor=cursor, limit=1)
+        self.assertEqual(self.cambios(respuesta), [('actualizado', primero.pk, '1.75')])
+        self.assertTrue(respuesta.data['sincronizacion']['has_more'])
+        respuesta = self.sync(cursor=respuesta.data['sincronizacion']['next_cursor'], limit=1)
+        self.assertEqual(self.cambios(respuesta), [('eliminado', id_segundo, None)])
+        self.assertFalse(respuesta.data['sincronizacion']['has_more'])
+
+        respuesta = self.sync(cursor=respuesta.data['sincronizacion']['next_cursor'])
+        self.assertEqual(self.cambios(respuesta), [])
+
+    def test_cambios_recientes_esperan_al_horizonte(self):
+        respuesta = self.sync()
+        cursor = respuesta.data['sincronizacion']['next_cursor']
+        precio = ProductoFarmacia.objects.create(
+            producto=self.productos[0], farmacia=self.farmacia, precio=Decimal('3.00')
+        )
+        # Más nuevo que ahora - MARGEN_SEGUNDOS: todavía no se entrega
+        self.assertEqual(self.cambios(self.sync(cursor=cursor)), [])
+        despues = timezone.now() + timedelta(seconds=MARGEN_SEGUNDOS + 1)
+        with mock.patch('django.utils.timezone.now', return_value=despues):
+            self.assertEqual(self.cambios(self.sync(cursor=cursor)), [('actualizado', precio.pk, '3.00')])
+
+    def test_posicion_fuera_de_la_retencion(self):
+        antigua = timezone.now() - timedelta(days=RETENCION_DIAS + 1)
+        self.assertEqual(self.sync(since=antigua.isoformat()).status_code, 410)
+        cursor = base64.urlsafe_b64encode(json.dumps([antigua.isoformat(), '-1', '0']).encode()).decode()
+        self.assertEqual(self.sync(cursor=cursor).status_code, 410)
+
+    def test_cursor_fabricado(self):
+        for valores in (
+            [1, 2, 3], [None, '0', '1'], ['2025-01-01T00:00:00+00:00', 0, '1'],
+            ['2025-01-01T00:00:00', '0', '1'], ['2025-13-01T00:00:00+00:00', '0', '1'],
+            ['2025-01-01T00:00:00+00:00', '2', '1'], ['2025-01-01T00:00:00+00:00', '0', '²'],
+            ['2025-01-01T00:00:00+00:00', '0'], {'a': 1},
+        ):
+            cursor = base64.urlsafe_b64encode(json.dumps(valores).encode()).decode()
+            respuesta = self.sync(cursor=cursor)
+            self.assertEqual(respuesta.status_code, 400, valores)
+            self.assertEqual(respuesta.data['error'], 'Cursor inválido')
+        self.assertEqual(self.sync(cursor='no-es-base64!').status_code, 400)
+
+
+class IndiceSucursalesTests(TestCase):
+    """Con el TTL vencido el índice se reconstruye en segundo plano (una vez) y sigue respondiendo"""
+
+    @classmethod
+    def setUpTestData(cls):
+        farmacia = Farmacia.objects.create(nombre_comercial='Farmacia', horario_atencion='24h')
+        for i in range(5):
+            Sucursal.objects.create(
+                farmacia=farmacia, ubicacion=f'Guayaquil {i}',
+                latitud=Decimal('-2.17') + Decimal(i) / 100, longitud=Decimal('-79.92')
+            )
+
+    def test_reconstruccion_en_segundo_plano(self):
+        indice = IndiceSucursales()
+        self.assertEqual(len(indice.cercanas(-2.17, -79.92, k=3)), 3)  # Primera construcción
+        indice.construido_en -= 10 ** 6
+
+        liberar, iniciadas = threading.Event(), []
+
+        def construir_lento():
+            iniciadas.append(threading.current_thread())
+            liberar.wait(5)
+
+        with mock.patch.object(indice, 'construir', side_effect=construir_lento), \
+                mock.patch('login.services.indice_geografico.connection'):
+            # Varias peticiones con el TTL vencido: responden con el árbol anterior sin esperar
+            for _ in range(5):
+                self.assertEqual(len(indice.cercanas(-2.17, -79.92, k=3)), 3)
+            liberar.set()
+            for hilo in iniciadas:
+                hilo.join(5)
+        self.assertEqual(len(iniciadas), 1)
+        self.assertIsNot(iniciadas[0], threading.current_thread())
+        self.assertFalse(indice._construccion.locked())
+
+
+class MapaSucursalesTests(TestCase):
+    """Los grupos del mapa suman total_sucursales, también cruzando el antimeridiano"""
+
+    @classmethod
+    def setUpTestData(cls):
+        farmacia = Farmacia.objects.create(nombre_comercial='Farmacia', horario_atencion='24h')
+        aleatorio = random.Random(5)
+        puntos = [(aleatorio.uniform(-2.3, -2.0), aleatorio.uniform(-80.1, -79.8)) for _ in range(40)]
+        # Fiji: a ambos lados del antimeridiano
+        puntos += [(-17.8, 179.5), (-17.9, 179.9), (-18.1, -179.8)]
+        puntos += [(40.4, -3.7)]
+        for i, (lat, lng) in enumerate(puntos):
+            Sucursal.objects.create(
+                farmacia=farmacia, ubicacion=f'Sucursal {i}',
+                latitud=Decimal(f'{lat:.6f}'), longitud=Decimal(f'{lng:.6f}')
+            )
+        cls.total = len(puntos)
+
+    def setUp(self):
+        self.mapa = MapaSucursales()
+        self.mapa.construir()
+
+    def assertSumaTotal(self, vista):
+        self.assertEqual(
+            sum(cluster['total'] for cluster in vista['clusters']) + len(vista['sucursales']),
+            vista['total_sucursales']
+        )
+
+    def test_grupos_suman_el_total(self):
+        for zoom in range(0, ZOOM_PUNTOS):
+            vista = self.mapa.vista(-90, -180, 90, 180, zoom)
+            self.assertEqual(vista['total_sucursales'], self.total, zoom)
+            self.assertSumaTotal(vista)
+        vista = self.mapa.vista(-2.4, -80.2, -1.9, -79.7, 9)
+        self.assertEqual(vista['total_sucursales'], 40)
+        self.assertSumaTotal(vista)
+
+    def test_vista_que_cruza_el_antimeridiano(self):
+        vista = self.mapa.vista(-18.5, 179, -17.5, -179, 8)
+        self.assertEqual(vista['total_sucursales'], 3)
+        self.assertSumaTotal(vista)
+        # Sin cruzar solo quedan las del lado este
+        self.assertEqual(self.mapa.vista(-18.5, 179, -17.5, 180, 8)['total_sucursales'], 2)
+
+        vista = self.mapa.vista(-18.5, 179, -17.5, -179, ZOOM_PUNTOS)
+        self.assertEqual(
+            sorted(punto['longitud'] for punto in vista['sucursales']), [-179.8, 179.5, 179.9]
+        )
+        self.assertEqual(vista['clusters'], [])
+
+    def test_precision_menor_si_la_vista_tiene_demasiadas_celdas(self):
+        vista = self.mapa.vista(-90, -180, 90, 180, 12)
+        self.assertLess(vista['precision'], precision_para_zoom(12))
+        self.assertLessEqual(len(vista['clusters']) + len(vista['sucursales']), MAX_CELDAS)
+        self.assertEqual(vista['total_sucursales'], self.total)
+        self.assertSumaTotal(vista)
+
+    def test_sucursales_individuales_con_zoom_alto(self):
+        vista = self.mapa.vista(-2.3, -80.1, -2.15, -79.95, ZOOM_PUNTOS)
+        esperado = sorted(
+            pk for pk, lat, lng in Sucursal.objects.values_list('id_sucursal', 'latitud', 'longitud')
+            if -2.3 <= lat <= -2.15 and -80.1 <= lng <= -79.95
+        )
+        self.assertEqual([punto['id_sucursal'] for punto in vista['sucursales']], esperado)
+        self.assertEqual(vista['clusters'], [])
+
+    def test_reconstruccion_en_segundo_plano(self):
+        self.mapa.construido_en -= 10 ** 6
+        liberar, iniciadas = threading.Event(), []
+
+        def construir_lento():
+            iniciadas.append(threading.current_thread())
+            liberar.wait(5)
+
+        with mock.patch.object(self.mapa, 'construir', side_effect=construir_lento), \
+                mock.patch('login.services.mapa_sucursales.connection'):
+            for _ in range(5):
+                self.assertEqual(self.mapa.vista(-90, -180, 90, 180, 0)['total_sucursales'], self.total)
+            liberar.set()
+            for hilo in iniciadas:
+                hilo.join(5)
+        self.assertEqual(len(iniciadas), 1)
+        self.assertFalse(self.mapa._construccion.locked())
+
+
+class DistanciasTests(TestCase):
+    """Distancia a la sucursal más cercana de cada farmacia: NumPy, Python puro y fuerza bruta coinciden"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.farmacias = [
+            Farmacia.objects.create(nombre_comercial=f'Farmacia {i}', horario_atencion='24h') for i in range(6)
+        ]
+        aleatorio = random.Random(11)
+        for farmacia in cls.farmacias[:5]:
+            for _ in range(aleatorio.randint(1, 30)):
+                Sucursal.objects.create(
+                    farmacia=farmacia, ubicacion='Sucursal',
+                    latitud=Decimal(f'{aleatorio.uniform(-4, 1):.6f}'),
+                    longitud=Decimal(f'{aleatorio.uniform(-81, -78):.6f}')
+                )
+        cls.filas = list(Sucursal.objects.order_by('farmacia_id').values_list('farmacia_id', 'latitud', 'longitud'))
+
+    def fuerza_bruta(self, lat, lng):
+        minimos = {}
+        for farmacia_id, latitud, longitud in self.filas:
+            km = haversine_km(lat, lng, float(latitud), float(longitud))
+            minimos[farmacia_id] = min(km, minimos.get(farmacia_id, km))
+        return minimos
+
+    def assertDistanciasIguales(self, obtenido, esperado):
+        self.assertEqual(set(obtenido), set(esperado))
+        for farmacia_id, km in esperado.items():
+            self.assertAlmostEqual(obtenido[farmacia_id], km, places=6)
+
+    def test_python_puro(self):
+        ids = [farmacia.pk for farmacia in self.farmacias]
+        with mock.patch.object(distancias, 'np', None):
+            for lat, lng in ((-2.19, -79.9), (0.5, -78.1), (-3.9, -80.9)):
+                self.assertDistanciasIguales(distancias.distancias_a_farmacias(lat, lng, ids), self.fuerza_bruta(lat, lng))
+
+    @unittest.skipIf(distancias.np is None, 'numpy no está instalado')
+    def test_numpy_coincide_con_python(self):
+        farmacias, latitudes, longitudes = zip(*((f, float(a), float(b)) for f, a, b in self.filas))
+        for lat, lng in ((-2.19, -79.9), (0.5, -78.1), (-3.9, -80.9), (45.0, 179.0)):
+            self.assertDistanciasIguales(
+                distancias._minimos_numpy(farmacias, latitudes, longitudes, lat, lng),
+                distancias._minimos_python(farmacias, latitudes, longitudes, lat, lng),
+            )
+        # Una sola sucursal y farmacias de un solo elemento
+        self.assertDistanciasIguales(
+            distancias._minimos_numpy((7,), (1.0,), (2.0,), 1.0, 2.0), {7: 0.0}
+        )
+
+
+class ExportacionTests(TestCase):
+    """Las exportaciones en streaming tienen todas las filas y usan las mismas consultas sin importar el tamaño"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.farmacias = [
+            Farmacia.objects.create(nombre_comercial=f'Farmacia, {i}', horario_atencion='24h') for i in range(3)
+        ]
+        cls.agregar_productos(7)
+
+    @classmethod
+    def agregar_productos(cls, cantidad):
+        # Los resúmenes de precios se recalculan al confirmar (ver resumen_precios.py)
+        with cls.captureOnCommitCallbacks(execute=True):
+            inicio = Producto.objects.count()
+            for i in range(inicio, inicio + cantidad):
+                producto = Producto.objects.create(
+                    nombre_generico=f'Genérico "{i}"', nombre_comercial=f'Comercial {i}',
+                    principio_activo='Activo', categoria='Analgésicos', presentacion='Tabletas',
+                    concentracion='500mg', requiere_receta=False
+                )
+                # El primero de cada tanda queda sin precios
+                for j, farmacia in enumerate(cls.farmacias[:(i - inicio) % 4]):
+                    ProductoFarmacia.objects.create(
+                        producto=producto, farmacia=farmacia, precio=Decimal(f'{i + j}.25')
+                    )
+
+    def descargar(self, url):
+        with CaptureQueriesContext(connection) as consultas:
+            respuesta = self.client.get(url)
+            self.assertTrue(respuesta.streaming)
+            contenido = b''.join(respuesta.streaming_content).decode()
+        return respuesta, contenido, len(consultas.captured_queries)
+
+    def test_csv_de_precios(self):
+        with mock.patch('login.services.exportacion.LINEAS_POR_BLOQUE', 2):
+            respuesta, contenido, consultas = self.descargar('/export/precios.csv')
+        self.assertEqual(respuesta['Content-Type'], 'text/csv; charset=utf-8')
+        filas = list(csv.reader(StringIO(contenido)))
+        self.assertEqual(tuple(filas[0]), ENCABEZADO_PRECIOS)
+        self.assertEqual(len(filas) - 1, ProductoFarmacia.objects.count())
+        primera = ProductoFarmacia.objects.order_by('pk').select_related('producto', 'farmacia').first()
+        self.assertEqual(filas[1][:7], [
+            str(primera.pk), str(primera.producto_id), primera.producto.nombre_comercial,
+            primera.producto.nombre_generico, str(primera.farmacia_id), primera.farmacia.nombre_comercial,
+            str(primera.precio),
+        ])
+
+        self.agregar_productos(20)
+        _, contenido, consultas_despues = self.descargar('/export/precios.csv')
+        self.assertEqual(len(list(csv.reader(StringIO(contenido)))) - 1, ProductoFarmacia.objects.count())
+        self.assertEqual(consultas_despues, consultas)
+
+    def test_ndjson_de_productos(self):
+        respuesta, contenido, consultas = self.descargar('/export/productos.ndjson')
+        self.assertEqual(respuesta['Content-Type'], 'application/x-ndjson; charset=utf-8')
+        lineas = [json.loads(linea) for linea in contenido.splitlines()]
+        self.assertEqual([linea['id_producto'] for linea in lineas], list(
+            Producto.objects.order_by('pk').values_list('pk', flat=True)
+        ))
+        for linea in lineas:
+            precios = ProductoFarmacia.objects.filter(producto_id=linea['id_producto'])
+            self.assertEqual(len(linea['precios_por_farmacia']), precios.count())
+            if precios:
+                self.assertEqual(linea['precio_minimo'], float(min(precios.values_list('precio', flat=True))))
+                self.assertEqual(
+                    [Decimal(precio['precio']) for precio in linea['precios_por_farmacia']],
+                    sorted(Decimal(precio['precio']) for precio in linea['precios_por_farmacia'])
+                )
+            else:
+                self.assertIsNone(linea['precio_minimo'])
+
+        self.agregar_productos(20)
+        _, contenido, consultas_despues = self.descargar('/export/productos.ndjson')
+        self.assertEqual(len(contenido.splitlines()), Producto.objects.count())
+        self.assertEqual(consultas_despues, consultas)
+
+
+class MejoresOpcionesTests(TestCase):
+    """Ranking por precio + peso_km * distancia (sucursal más cercana de cada farmacia) y sus desempates"""
+
+    LAT, LNG = -2.17, -79.92
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.producto = Producto.objects.create(
+            nombre_generico='Paracetamol', nombre_comercial='Analgésico', principio_activo='Paracetamol',
+            categoria='Analgésicos', presentacion='Tabletas', concentracion='500mg', requiere_receta=False
+        )
+        # (precio, sucursales como desplazamiento en grados de latitud: 0.01° ≈ 1.11 km)
+        datos = [
+            ('5.00', [0.01, 0.2]),   # A
+            ('4.00', [0.03]),        # B: más barata pero más lejos
+            ('5.00', [0.01]),        # C: empata con A en precio y distancia
+            ('5.00', [0.3, 0.005]),  # D: su sucursal más cercana es la segunda
+            ('1.00', [0.5]),         # E: fuera del radio de 25 km
+            ('9.00', [0.001]),       # F: la más cercana pero cara
+        ]
+        cls.farmacias = []
+        for i, (precio, desplazamientos) in enumerate(datos):
+            farmacia = Farmacia.objects.create(nombre_comercial=f'Farmacia {"ABCDEF"[i]}', horario_atencion='24h')
+            for desplazamiento in desplazamientos:
+                Sucursal.objects.create(
+                    farmacia=farmacia, ubicacion='Guayaquil',
+                    latitud=Decimal(f'{cls.LAT + desplazamiento:.6f}'), longitud=Decimal(f'{cls.LNG:.6f}')
+                )
+            ProductoFarmacia.objects.create(producto=cls.producto, farmacia=farmacia, precio=Decimal(precio))
+            cls.farmacias.append(farmacia.pk)
+
+    def fuerza_bruta(self, n, peso_km, radio_km=25):
+        opciones = []
+        for farmacia_id, precio in ProductoFarmacia.objects.filter(producto=self.producto).values_list(
+            'farmacia_id', 'precio'
+        ):
+            distancias = [
+                haversine_km(self.LAT, self.LNG, float(lat), float(lng))
+                for lat, lng in Sucursal.objects.filter(farmacia_id=farmacia_id).values_list('latitud', 'longitud')
+            ]
+            distancia = min(distancias)
+            if distancia <= radio_km:
+                opciones.append((float(precio) + peso_km * distancia, float(precio), distancia, farmacia_id))
+        return [opcion[3] for opcion in sorted(opciones)[:n]]
+
+    def ids(self, opciones):
+        return [opcion['farmacia']['id_farmacia'] for opcion in opciones]
+
+    def test_orden_y_desempates(self):
+        a, b, c, d, e, f = self.farmacias
+        opciones, busqueda = mejores_opciones(self.producto.pk, self.LAT, self.LNG, n=10, peso_km=0)
+        # Solo precio: B; luego a igual precio la más cercana (D) y a igual distancia el menor id (A, C)
+        self.assertEqual(self.ids(opciones), [b, d, a, c, f])
+        self.assertEqual(busqueda['estrategia'], 'sucursales')
+        self.assertAlmostEqual(opciones[1]['distancia_km'], 0.556, places=3)
+
+        opciones, _ = mejores_opciones(self.producto.pk, self.LAT, self.LNG, n=3, peso_km=0.5)
+        self.assertEqual(self.ids(opciones), [d, a, c])
+        self.assertEqual([opcion['puntaje'] for opcion in opciones], sorted(opcion['puntaje'] for opcion in opciones))
+
+    def test_coincide_con_fuerza_bruta_en_ambas_estrategias(self):
+        for prefiltro, estrategia in ((500, 'sucursales'), (0, 'precios')):
+            with mock.patch('login.services.mejores_opciones.MAX_SUCURSALES_PREFILTRO', prefiltro), \
+                    mock.patch('login.services.mejores_opciones.TAMANO_LOTE', 2):
+                for n in (1, 2, 4, 10):
+                    for peso_km in (0, 0.5, 3, 50):
+                        opciones, busqueda = mejores_opciones(
+                            self.producto.pk, self.LAT, self.LNG, n=n, peso_km=peso_km
+                        )
+                        self.assertEqual(busqueda['estrategia'], estrategia)
+                        self.assertEqual(self.ids(opciones), self.fuerza_bruta(n, peso_km), (estrategia, n, peso_km))
+
+    def test_endpoint(self):
+        url = f'/productos/{self.producto.pk}/mejores-opciones/'
+        respuesta = self.client.get(url, {'lat': self.LAT, 'lng': self.LNG, 'n': 2, 'peso_km': 0})
+        self.assertEqual(respuesta.status_code, 200, respuesta.json())
+        datos = respuesta.json()
+        self.assertEqual(self.ids(datos['opciones']), self.fuerza_bruta(2, 0))
+        self.assertEqual(datos['opciones'][0]['precio'], '4.00')
+        self.assertEqual(datos['criterio'], {'peso_km': 0.0, 'radio_km': 25})
+
+        self.assertEqual(self.client.get(url, {'lng': self.LNG}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'lat': self.LAT, 'lng': self.LNG, 'n': 0}).status_code, 400)
+        self.assertEqual(
+            self.client.get('/productos/999999/mejores-opciones/', {'lat': self.LAT, 'lng': self.LNG}).status_code, 404
+        )
+
+    def test_indice_de_la_migracion_0012(self):
+        with connection.cursor() as cursor:
+            restricciones = connection.introspection.get_constraints(cursor, ProductoFarmacia._meta.db_table)
+        self.assertEqual(
+            restricciones['login_pf_producto_precio_idx']['columns'], ['producto_id', 'precio', 'id_producto_farmacia']
+        )
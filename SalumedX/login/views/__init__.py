@@ -3,11 +3,13 @@ from .signup_view import signup
 from .tasks_view import tasks
 from .signout_view import signout
 from .signin_view import signin
-from .recetas_view import recetas
+from .recetas_view import recetas, optimizar_compra_receta
 from .detalle_prescripcion_view import detalle_prescripcion
 from .utils_view import paciente_info, medico_info
-from .productos_view import productos
+from .productos_view import productos, productos_autocomplete, mejores_opciones_producto
 from .farmacias_view import farmacias
-from .sucursales_view import sucursales
+from .sucursales_view import sucursales, sucursales_cercanas_view, sucursales_mapa_view
 from .auth_proxy import signin_proxy, signup_proxy
 from .token_status_view import token_status
+from .exportacion_view import exportar_productos_ndjson, exportar_precios_csv
+from .sincronizacion_view import sincronizar_precios
@@ -12,9 +12,12 @@ from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated, IsAdminUser
 from rest_framework.response import Response
 from rest_framework import status
-from django.db.models import Q
 from login.models import Producto, ProductoFarmacia, Farmacia
 from login.serializers import ProductoSerializer, ProductoFarmaciaSerializer, FarmaciaSerializer
+from login.services.catalogo import productos_con_precios, filtrar_productos, serializar_catalogo
+from login.services.paginacion import paginar, CursorInvalido
+from login.services.campos import opciones_serializacion, optimizar_queryset
+from login.services.serializacion_rapida import serializar_rapido
 
 
 class IsStaff(IsAuthenticated):
@@ -36,6 +39,7 @@ def admin_productos_list(request):
     Filtros opcionales:
     - ?search=nombre
     - ?categoria=categoria
+    - ?requiere_receta=true
     - ?con_precios=true
     
     POST /api/admin/productos/
@@ -68,43 +72,9 @@ def admin_productos_list(request):
     
     # GET method
     try:
-        queryset = Producto.objects.all()
-        
-        # Filtros
-        search = request.query_params.get('search')
-        if search:
-            queryset = queryset.filter(
-                Q(nombre_generico__icontains=search) | 
-                Q(nombre_comercial__icontains=search) |
-                Q(principio_activo__icontains=search)
-            )
-        
-        categoria = request.query_params.get('categoria')
-        if categoria:
-            queryset = queryset.filter(categoria__icontains=categoria)
-        
-        con_precios = request.query_params.get('con_precios')
-        if con_precios and con_precios.lower() == 'true':
-            queryset = queryset.filter(precios_por_farmacia__isnull=False).distinct()
-        
-        # Construir respuesta con precios
-        productos_data = []
-        for producto in queryset:
-            producto_dict = ProductoSerializer(producto).data
-            precios = ProductoFarmacia.objects.filter(producto=producto).select_related('farmacia')
-            producto_dict['precios_por_farmacia'] = ProductoFarmaciaSerializer(precios, many=True).data
-            
-            if precios.exists():
-                precios_list = [float(p.precio) for p in precios]
-                producto_dict['precio_minimo'] = min(precios_list)
-                producto_dict['precio_maximo'] = max(precios_list)
-                producto_dict['precio_promedio'] = round(sum(precios_list) / len(precios_list), 2)
-            else:
-                producto_dict['precio_minimo'] = None
-                producto_dict['precio_maximo'] = None
-                producto_dict['precio_promedio'] = None
-            
-            productos_data.append(producto_dict)
+        # Filtros y estadísticas resueltos en la base de datos (número fijo de consultas)
+        queryset = filtrar_productos(productos_con_precios(), request.query_params)
+        productos_data = serializar_catalogo(queryset)
         
         return Response({
             'success': True,
@@ -122,7 +92,7 @@ def admin_productos_list(request):
 def admin_farmacias_list(request):
     """
     GET /api/admin/farmacias/
-    Devuelve todas las farmacias.
+    Devuelve las farmacias paginadas por cursor (?limit=50&cursor=<next_cursor>).
     Requiere: JWT + is_staff=True
     
     POST /api/admin/farmacias/
@@ -153,12 +123,17 @@ def admin_farmacias_list(request):
     
     # GET method
     try:
-        farmacias = Farmacia.objects.all()
-        serializer = FarmaciaSerializer(farmacias, many=True)
+        try:
+            pagina, paginacion = paginar(Farmacia.objects.all(), request.query_params)
+        except CursorInvalido as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        serializer = FarmaciaSerializer(pagina, many=True)
         return Response({
             'success': True,
             'farmacias': serializer.data,
-            'total': farmacias.count()
+            'total': len(serializer.data),
+            'paginacion': paginacion
         })
     except Exception as e:
         return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
@@ -169,15 +144,15 @@ def admin_farmacias_list(request):
 def admin_producto_farmacia(request):
     """
     GET /api/admin/producto-farmacia/
-    Devuelve todas las relaciones producto-farmacia con precios.
+    Devuelve las relaciones producto-farmacia con precios, paginadas por cursor
+    (?limit=50&cursor=<next_cursor>&con_total=true). Acepta ?fields= y ?expand=.
     
     POST /api/admin/producto-farmacia/
     Crea o actualiza un precio de producto en farmacia.
     Body: {
         "producto": 1,
         "farmacia": 2,
-        "precio": "15.50",
-        "disponible": true
+        "precio": "15.50"
     }
     
     Requiere: JWT + is_staff=True
@@ -195,11 +170,20 @@ def admin_producto_farmacia(request):
             if farmacia_id:
                 queryset = queryset.filter(farmacia_id=farmacia_id)
             
-            serializer = ProductoFarmaciaSerializer(queryset, many=True)
+            opciones = opciones_serializacion(request.query_params)
+            queryset = optimizar_queryset(queryset, ProductoFarmaciaSerializer(**opciones))
+            
+            try:
+                pagina, paginacion = paginar(queryset, request.query_params)
+            except CursorInvalido as e:
+                return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+            
+            precios = serializar_rapido(pagina, ProductoFarmaciaSerializer, **opciones)
             return Response({
                 'success': True,
-                'precios': serializer.data,
-                'total': queryset.count()
+                'precios': precios,
+                'total': len(precios),
+                'paginacion': paginacion
             })
         except Exception as e:
             return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
@@ -209,7 +193,6 @@ def admin_producto_farmacia(request):
             producto_id = request.data.get('producto')
             farmacia_id = request.data.get('farmacia')
             precio = request.data.get('precio')
-            disponible = request.data.get('disponible', True)
             
             if not all([producto_id, farmacia_id, precio]):
                 return Response({
@@ -225,13 +208,12 @@ def admin_producto_farmacia(request):
             except Farmacia.DoesNotExist:
                 return Response({'error': 'Farmacia no encontrada'}, status=status.HTTP_404_NOT_FOUND)
             
-            # Crear o actualizar
+            # Crear o actualizar (la señal post_save actualiza ResumenPrecioProducto)
             producto_farmacia, created = ProductoFarmacia.objects.update_or_create(
                 producto=producto,
                 farmacia=farmacia,
                 defaults={
-                    'precio': precio,
-                    'disponible': disponible
+                    'precio': precio
                 }
             )
             
@@ -279,6 +261,9 @@ def admin_stats(request):
     """
     try:
         from login.models import Paciente, Medico, Receta
+        from login.services.autocompletado import indice_autocompletado
+        from login.services import cache_respuestas
+        from login.services.cache_autenticacion import cache_usuarios, cache_tokens
         
         stats = {
             'productos': Producto.objects.count(),
@@ -292,7 +277,11 @@ def admin_stats(request):
         
         return Response({
             'success': True,
-            'stats': stats
+            'stats': stats,
+            'autocompletado': indice_autocompletado.estadisticas(),
+            'cache_respuestas': cache_respuestas.estadisticas(),
+            'cache_usuarios': cache_usuarios.estadisticas(),
+            'cache_tokens': cache_tokens.estadisticas()
         })
     except Exception as e:
         return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
@@ -1,8 +1,27 @@
+from django.db import transaction
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework.response import Response
 from login.models import DetallePrescripcion, DetalleReceta, Farmacia, Producto, ProductoFarmacia
-from login.serializers import DetallePrescripcionSerializer
+from login.serializers import DetallePrescripcionSerializer, ValoresPrescripcionSerializer
+from login.services.campos import opciones_serializacion, optimizar_queryset
+from login.services.distancias import asignar_distancias, parsear_ubicacion
+
+MAX_RESULTADOS_LOTE = 100
+
+
+def _validar_valores(datos):
+    """
+    Precio, distancia y fuente validados (Decimal no negativos con 2 decimales)
+
+    Returns:
+        tuple: (valores validados, None) o (None, mensaje de error)
+    """
+    valores = ValoresPrescripcionSerializer(data=datos)
+    if valores.is_valid():
+        return valores.validated_data, None
+    campo, errores = next(iter(valores.errors.items()))
+    return None, f'{campo}: {errores[0]}'
 
 
 @api_view(['GET', 'POST'])
@@ -16,6 +35,9 @@ def detalle_prescripcion(request):
          
          Puedes filtrar adicionalmente por farmacia, producto o detalle_receta usando query params.
          Ejemplo: /detalle-prescripcion/?farmacia=1&producto=5
+         
+         ?fields= y ?expand= limitan los campos y las relaciones anidadas.
+         Ejemplo: /detalle-prescripcion/?fields=id_detalle_prescripcion,precio_encontrado,farmacia&expand=farmacia
     
     POST: crea un nuevo detalle de prescripción. Formato esperado (JSON):
     {
@@ -24,8 +46,14 @@ def detalle_prescripcion(request):
       "producto": <id_producto>,
       "precio_encontrado": 12.50,
       "distancia": 2.5,
-      "fuente": "Página web oficial"
+      "fuente": "Página web oficial",
+      "lat": -2.17, "lng": -79.92
     }
+    Con lat/lng (ubicación del paciente) la distancia se calcula en el servidor hasta la
+    sucursal más cercana de la farmacia, ignorando "distancia".
+    
+    Varios resultados de un mismo detalle de receta en una sola petición:
+    {"detalle_receta": 1, "lat": -2.17, "lng": -79.92, "resultados": [{"farmacia": 2, "producto": 5, ...}, ...]}
     """
     
     try:
@@ -37,16 +65,16 @@ def detalle_prescripcion(request):
                     'error': 'Debe autenticarse para consultar prescripciones.'
                 }, status=401)
             
-            user = request.user
+            principal = request.principal
             queryset = DetallePrescripcion.objects.all()
             
             # Filtrar según tipo de usuario
-            if hasattr(user, 'medico'):
+            if principal.es_medico:
                 # Médico: solo prescripciones de recetas que él emitió
-                queryset = queryset.filter(detalle_receta__receta__medico=user.medico)
-            elif hasattr(user, 'paciente'):
+                queryset = queryset.filter(detalle_receta__receta__medico_id=principal.perfil_id)
+            elif principal.es_paciente:
                 # Paciente: solo prescripciones de sus propias recetas
-                queryset = queryset.filter(detalle_receta__receta__paciente=user.paciente)
+                queryset = queryset.filter(detalle_receta__receta__paciente_id=principal.perfil_id)
             else:
                 # Usuario sin perfil de médico o paciente: sin acceso
                 return Response({
@@ -65,11 +93,22 @@ def detalle_prescripcion(request):
             if detalle_receta_id:
                 queryset = queryset.filter(detalle_receta_id=detalle_receta_id)
             
-            data = DetallePrescripcionSerializer(queryset, many=True).data
+            opciones = opciones_serializacion(request.query_params)
+            queryset = optimizar_queryset(queryset, DetallePrescripcionSerializer(**opciones))
+            
+            data = DetallePrescripcionSerializer(queryset, many=True, **opciones).data
             return Response({'detalle_prescripciones': data, 'total': len(data)})
         
-        # POST: crear detalle de prescripción
+        # POST: crear detalle(s) de prescripción
         payload = request.data
+        try:
+            ubicacion = parsear_ubicacion(payload)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=400)
+        
+        if 'resultados' in payload:
+            return _crear_resultados(payload, ubicacion)
+        
         detalle_receta_id = payload.get('detalle_receta')
         farmacia_id = payload.get('farmacia')
         producto_id = payload.get('producto')
@@ -79,6 +118,9 @@ def detalle_prescripcion(request):
             return Response({
                 'error': 'Se requieren los campos: detalle_receta, farmacia, producto'
             }, status=400)
+        valores, error = _validar_valores(payload)
+        if error:
+            return Response({'error': error}, status=400)
         
         # Validar existencia de objetos relacionados
         try:
@@ -98,8 +140,8 @@ def detalle_prescripcion(request):
         
         # Buscar si existe ProductoFarmacia para esta combinación
         producto_farmacia_obj = None
-        precio_a_usar = payload.get('precio_encontrado', 0)
-        fuente_precio = payload.get('fuente', 'Manual')
+        precio_a_usar = valores['precio_encontrado']
+        fuente_precio = valores['fuente']
         
         try:
             producto_farmacia_obj = ProductoFarmacia.objects.get(
@@ -114,18 +156,85 @@ def detalle_prescripcion(request):
             pass
         
         # Crear el detalle de prescripción
-        detalle_prescripcion = DetallePrescripcion.objects.create(
+        detalle_prescripcion = DetallePrescripcion(
             detalle_receta=detalle_receta,
             farmacia=farmacia,
             producto=producto,
             producto_farmacia=producto_farmacia_obj,  # Asignar la referencia si existe
             precio_encontrado=precio_a_usar,
-            distancia=payload.get('distancia', 0),
+            distancia=valores['distancia'],
             fuente=fuente_precio
         )
+        if ubicacion:
+            asignar_distancias([detalle_prescripcion], *ubicacion)
+        detalle_prescripcion.save()
         
         result = DetallePrescripcionSerializer(detalle_prescripcion).data
         return Response({'success': True, 'detalle_prescripcion': result})
     
     except Exception as e:
-        return Response({'error': f'Error en el servidor: {str(e)}'}, status=500)
\ No newline at end of file
+        return Response({'error': f'Error en el servidor: {str(e)}'}, status=500)
+
+
+def _crear_resultados(payload, ubicacion):
+    """
+    POST con "resultados": crea todos los detalles de prescripción de un detalle de receta
+    con una consulta por modelo relacionado y un solo INSERT
+    """
+    resultados = payload.get('resultados')
+    if not isinstance(resultados, list) or not resultados:
+        return Response({'error': '"resultados" debe ser una lista no vacía'}, status=400)
+    if len(resultados) > MAX_RESULTADOS_LOTE:
+        return Response({'error': f'Máximo {MAX_RESULTADOS_LOTE} resultados por petición'}, status=400)
+    valores = []
+    for i, item in enumerate(resultados):
+        if not isinstance(item, dict) or not item.get('farmacia') or not item.get('producto'):
+            return Response({'error': f'resultados[{i}]: se requieren los campos farmacia y producto'}, status=400)
+        valores_item, error = _validar_valores(item)
+        if error:
+            return Response({'error': f'resultados[{i}]: {error}'}, status=400)
+        valores.append(valores_item)
+    
+    try:
+        detalle_receta = DetalleReceta.objects.get(pk=payload.get('detalle_receta'))
+    except (DetalleReceta.DoesNotExist, ValueError, TypeError):
+        return Response({'error': 'Detalle de receta no encontrado.'}, status=404)
+    
+    try:
+        farmacias = Farmacia.objects.in_bulk({int(item['farmacia']) for item in resultados})
+        productos = Producto.objects.in_bulk({int(item['producto']) for item in resultados})
+    except (TypeError, ValueError):
+        return Response({'error': 'Los campos farmacia y producto deben ser ids'}, status=400)
+    for i, item in enumerate(resultados):
+        if int(item['farmacia']) not in farmacias:
+            return Response({'error': f'resultados[{i}]: Farmacia no encontrada.'}, status=404)
+        if int(item['producto']) not in productos:
+            return Response({'error': f'resultados[{i}]: Producto no encontrado.'}, status=404)
+    
+    # Precios oficiales de todas las combinaciones pedidas en una consulta
+    precios_oficiales = {
+        (pf.producto_id, pf.farmacia_id): pf
+        for pf in ProductoFarmacia.objects.filter(producto_id__in=productos, farmacia_id__in=farmacias)
+    }
+    
+    detalles = []
+    for item, valores_item in zip(resultados, valores):
+        farmacia, producto = farmacias[int(item['farmacia'])], productos[int(item['producto'])]
+        producto_farmacia_obj = precios_oficiales.get((producto.pk, farmacia.pk))
+        detalles.append(DetallePrescripcion(
+            detalle_receta=detalle_receta,
+            farmacia=farmacia,
+            producto=producto,
+            producto_farmacia=producto_farmacia_obj,
+            precio_encontrado=producto_farmacia_obj.precio if producto_farmacia_obj else valores_item['precio_encontrado'],
+            distancia=valores_item['distancia'],
+            fuente='ProductoFarmacia (precio oficial)' if producto_farmacia_obj else valores_item['fuente']
+        ))
+    if ubicacion:
+        asignar_distancias(detalles, *ubicacion)
+    
+    with transaction.atomic():
+        detalles = DetallePrescripcion.objects.bulk_create(detalles)
+    
+    data = DetallePrescripcionSerializer(detalles, many=True).data
+    return Response({'success': True, 'detalle_prescripciones': data, 'total': len(data)})
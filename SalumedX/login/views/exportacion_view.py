@@ -0,0 +1,34 @@
+from django.http import StreamingHttpResponse
+from django.views.decorators.http import require_GET
+from login.services.exportacion import lineas_productos_ndjson, lineas_precios_csv
+
+
+def _descarga(lineas, content_type, nombre_archivo):
+    response = StreamingHttpResponse(lineas, content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="{nombre_archivo}"'
+    # Evita que un proxy (nginx) acumule la respuesta completa antes de enviarla
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+@require_GET
+def exportar_productos_ndjson(request):
+    """
+    GET /export/productos.ndjson
+    Catálogo completo, un producto por línea (JSON) con sus precios por farmacia.
+    Se envía en streaming: la memoria del servidor no crece con el tamaño del catálogo.
+    
+    Vista de Django (no de DRF) para que la negociación de contenido no rechace
+    clientes que piden 'Accept: application/x-ndjson'.
+    """
+    return _descarga(lineas_productos_ndjson(), 'application/x-ndjson; charset=utf-8', 'productos.ndjson')
+
+
+@require_GET
+def exportar_precios_csv(request):
+    """
+    GET /export/precios.csv
+    Todos los precios (una fila por producto y farmacia) en CSV con encabezado.
+    Se envía en streaming, igual que /export/productos.ndjson.
+    """
+    return _descarga(lineas_precios_csv(), 'text/csv; charset=utf-8', 'precios.csv')
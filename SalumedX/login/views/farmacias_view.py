@@ -3,16 +3,21 @@ from rest_framework.permissions import AllowAny
 from rest_framework.response import Response
 from login.models import Farmacia
 from login.serializers import FarmaciaSerializer
+from login.services.paginacion import paginar, CursorInvalido
+from login.services.cache_respuestas import cache_respuesta
 
 
 @api_view(['GET'])
 @permission_classes([AllowAny])
+@cache_respuesta('farmacias', (Farmacia,))
 def farmacias(request):
     """
     GET: Devuelve todas las farmacias disponibles.
     Puedes filtrar por:
     - id: /farmacias/?id=1
     - search: /farmacias/?search=cruz (busca en nombre_comercial)
+    
+    Paginación por cursor: ?limit=50&cursor=<next_cursor>
     """
     try:
         queryset = Farmacia.objects.all()
@@ -31,8 +36,13 @@ def farmacias(request):
         if search:
             queryset = queryset.filter(nombre_comercial__icontains=search)
         
-        data = FarmaciaSerializer(queryset, many=True).data
-        return Response({'farmacias': data, 'total': len(data)})
+        try:
+            pagina, paginacion = paginar(queryset, request.query_params)
+        except CursorInvalido as e:
+            return Response({'error': str(e)}, status=400)
+        
+        data = FarmaciaSerializer(pagina, many=True).data
+        return Response({'farmacias': data, 'total': len(data), 'paginacion': paginacion})
     
     except Exception as e:
         return Response({'error': f'Error en el servidor: {str(e)}'}, status=500)
@@ -3,10 +3,18 @@ from rest_framework.permissions import AllowAny
 from rest_framework.response import Response
 from login.models import ProductoFarmacia, Producto, Farmacia
 from login.serializers import ProductoFarmaciaSerializer
+from login.services.paginacion import paginar, CursorInvalido
+from login.services.catalogo import comparacion_precios, leer_items_lote, comparar_precios_lote, LoteInvalido
+from login.services.cache_respuestas import cache_respuesta
+from login.services.condicional import get_condicional, filtros_precios
+from login.services.campos import opciones_serializacion, optimizar_queryset
+from login.services.serializacion_rapida import serializar_rapido
 
 
+@get_condicional('producto_farmacia_list', filtros_precios)
 @api_view(['GET'])
 @permission_classes([AllowAny])
+@cache_respuesta('producto_farmacia_list', (ProductoFarmacia, Producto, Farmacia))
 def producto_farmacia_list(request):
     """
     GET: Lista precios de productos por farmacia. Acepta filtros:
@@ -20,6 +28,10 @@ def producto_farmacia_list(request):
     /productos-farmacias/?farmacia=2
     /productos-farmacias/?nombre=paracetamol
     /productos-farmacias/?producto=5&farmacia=2
+    
+    Paginación por cursor sobre (precio, id): ?limit=50&cursor=<next_cursor>
+    Campos y expansión: ?fields=precio,producto.nombre_comercial&expand=producto
+    Soporta GET condicional (If-None-Match / If-Modified-Since -> 304).
     """
     try:
         queryset = ProductoFarmacia.objects.select_related('producto', 'farmacia').all()
@@ -43,19 +55,30 @@ def producto_farmacia_list(request):
                 Q(producto__nombre_generico__icontains=nombre)
             )
         
-        # Ordenar por precio (ascendente por defecto)
+        # Solo se consultan las columnas y relaciones que se van a devolver
+        opciones = opciones_serializacion(request.query_params)
+        queryset = optimizar_queryset(
+            queryset, ProductoFarmaciaSerializer(**opciones), columnas_extra=('precio',)
+        )
+        
+        # Ordenar por precio (ascendente por defecto); el id desempata para el cursor
         orden = request.query_params.get('orden', 'precio')
-        if orden == 'precio_desc':
-            queryset = queryset.order_by('-precio')
-        else:
-            queryset = queryset.order_by('precio')
+        try:
+            pagina, paginacion = paginar(
+                queryset, request.query_params,
+                claves=('precio', 'id_producto_farmacia'),
+                descendente=(orden == 'precio_desc')
+            )
+        except CursorInvalido as e:
+            return Response({'error': str(e)}, status=400)
         
-        serializer = ProductoFarmaciaSerializer(queryset, many=True)
+        resultados = serializar_rapido(pagina, ProductoFarmaciaSerializer, **opciones)
         
         return Response({
             'success': True,
-            'resultados': serializer.data,
-            'total': len(serializer.data)
+            'resultados': resultados,
+            'total': len(resultados),
+            'paginacion': paginacion
         })
     
     except Exception as e:
@@ -64,14 +87,19 @@ def producto_farmacia_list(request):
         }, status=500)
 
 
+@get_condicional('comparar_precios', filtros_precios)
 @api_view(['GET'])
 @permission_classes([AllowAny])
+@cache_respuesta('comparar_precios', (ProductoFarmacia, Producto, Farmacia))
 def comparar_precios(request):
     """
     GET: Compara precios de un producto específico en todas las farmacias.
     Requiere: ?producto=<id>
     
     Retorna el producto con la lista de farmacias y sus precios ordenados de menor a mayor.
+    Las estadísticas se leen de ResumenPrecioProducto (no se recalculan en cada petición).
+    ?fields= / ?expand= aplican a cada elemento de precios_por_farmacia.
+    Soporta GET condicional (If-None-Match / If-Modified-Since -> 304).
     """
     try:
         producto_id = request.query_params.get('producto')
@@ -82,53 +110,57 @@ def comparar_precios(request):
             }, status=400)
         
         try:
-            producto = Producto.objects.get(pk=producto_id)
+            producto = Producto.objects.select_related(
+                'resumen_precios', 'resumen_precios__farmacia_mas_barata'
+            ).get(pk=producto_id)
         except Producto.DoesNotExist:
             return Response({
                 'error': 'Producto no encontrado'
             }, status=404)
         
         # Obtener precios en todas las farmacias
-        precios = ProductoFarmacia.objects.filter(
-            producto_id=producto_id
-        ).select_related('farmacia').order_by('precio')
-        
-        if not precios.exists():
-            return Response({
-                'producto': {
-                    'id': producto.id_producto,
-                    'nombre_comercial': producto.nombre_comercial,
-                    'nombre_generico': producto.nombre_generico,
-                },
-                'precios_por_farmacia': [],
-                'mensaje': 'Este producto aún no tiene precios registrados en farmacias'
-            })
+        opciones = opciones_serializacion(request.query_params)
+        precios = list(optimizar_queryset(
+            ProductoFarmacia.objects.filter(producto_id=producto_id),
+            ProductoFarmaciaSerializer(**opciones)
+        ).order_by('precio', 'id_producto_farmacia'))
         
-        precios_data = ProductoFarmaciaSerializer(precios, many=True).data
+        precios_data = serializar_rapido(precios, ProductoFarmaciaSerializer, **opciones)
+        return Response(comparacion_precios(producto, precios_data))
+    
+    except Exception as e:
+        return Response({
+            'error': f'Error en el servidor: {str(e)}'
+        }, status=500)
+
+
+@api_view(['POST'])
+@permission_classes([AllowAny])
+def comparar_precios_lote_view(request):
+    """
+    POST: Compara precios de varios productos en una sola solicitud (ej: el carrito).
+    Body: {"items": [5, [7, 2], {"producto": 9, "farmacia": 1}]}
+    - un id compara el producto en todas las farmacias
+    - un par (producto, farmacia) agrega además el precio en esa farmacia
+    
+    Cada resultado tiene el mismo formato que GET /comparar-precios/?producto=<id>.
+    Se resuelve con dos consultas SQL sin importar el número de items.
+    ?fields= / ?expand= aplican a cada elemento de precios_por_farmacia.
+    """
+    try:
+        try:
+            pares = leer_items_lote(request.data)
+        except LoteInvalido as e:
+            return Response({'error': str(e)}, status=400)
         
-        # Calcular estadísticas
-        precios_list = [float(p.precio) for p in precios]
-        precio_min = min(precios_list)
-        precio_max = max(precios_list)
-        precio_promedio = sum(precios_list) / len(precios_list)
+        opciones = opciones_serializacion(request.query_params)
+        resultados, no_encontrados = comparar_precios_lote(pares, opciones)
         
         return Response({
-            'producto': {
-                'id': producto.id_producto,
-                'nombre_comercial': producto.nombre_comercial,
-                'nombre_generico': producto.nombre_generico,
-                'presentacion': producto.presentacion,
-                'concentracion': producto.concentracion
-            },
-            'estadisticas': {
-                'precio_minimo': precio_min,
-                'precio_maximo': precio_max,
-                'precio_promedio': round(precio_promedio, 2),
-                'diferencia': round(precio_max - precio_min, 2),
-                'ahorro_porcentual': round(((precio_max - precio_min) / precio_max * 100), 2) if precio_max > 0 else 0
-            },
-            'precios_por_farmacia': precios_data,
-            'total_farmacias': len(precios_data)
+            'success': True,
+            'resultados': resultados,
+            'total': len(resultados),
+            'no_encontrados': no_encontrados
         })
     
     except Exception as e:
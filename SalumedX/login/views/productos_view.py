@@ -1,13 +1,22 @@
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import AllowAny
 from rest_framework.response import Response
-from login.models import Producto, ProductoFarmacia
-from login.serializers import ProductoSerializer, ProductoFarmaciaSerializer
-from django.db.models import Q
+from login.models import Producto, ProductoFarmacia, Farmacia
+from login.services.catalogo import (
+    productos_con_precios, filtrar_productos, orden_catalogo,
+    serializar_producto, serializar_catalogo
+)
+from login.services.paginacion import paginar, CursorInvalido
+from login.services.cache_respuestas import cache_respuesta
+from login.services.condicional import get_condicional, filtros_producto
+from login.services.autocompletado import autocompletar, indice_autocompletado, LIMITE_POR_DEFECTO
+from login.services.mejores_opciones import mejores_opciones, parsear_parametros
 
 
+@get_condicional('productos', filtros_producto)
 @api_view(['GET'])
 @permission_classes([AllowAny])
+@cache_respuesta('productos', (Producto, ProductoFarmacia, Farmacia))
 def productos(request):
     """
     GET: Devuelve todos los productos con sus precios por farmacia.
@@ -15,99 +24,123 @@ def productos(request):
     - id: /productos/?id=1
     - categoria: /productos/?categoria=Analgésicos
     - requiere_receta: /productos/?requiere_receta=true
-    - search: /productos/?search=paracetamol (busca en nombre_generico, nombre_comercial, principio_activo)
+    - search: /productos/?search=paracetamol (busca en nombre_generico, nombre_comercial, principio_activo;
+      sin distinguir tildes ni mayúsculas, resultados ordenados por relevancia)
+    - fuzzy: /productos/?search=ibuprophen&fuzzy=true (tolera errores de escritura en search)
     - con_precios: /productos/?con_precios=true (solo productos con precios en farmacias)
+    
+    Paginación por cursor (ordenado por id, o por relevancia si hay search):
+    - limit: /productos/?limit=50
+    - cursor: /productos/?cursor=<next_cursor de la página anterior>
+    - con_total: /productos/?con_total=true (agrega total_estimado)
+    
+    Soporta GET condicional: envía If-None-Match (ETag) o If-Modified-Since para recibir 304.
     """
     try:
-        queryset = Producto.objects.all()
+        queryset = productos_con_precios()
         
         # Filtro por id específico
         producto_id = request.query_params.get('id')
         if producto_id:
             try:
-                producto = Producto.objects.get(pk=producto_id)
-                producto_dict = ProductoSerializer(producto).data
-                
-                # Agregar precios por farmacia
-                precios = ProductoFarmacia.objects.filter(
-                    producto=producto
-                ).select_related('farmacia')
-                
-                producto_dict['precios_por_farmacia'] = ProductoFarmaciaSerializer(
-                    precios, many=True
-                ).data
-                
-                # Estadísticas de precio
-                if precios.exists():
-                    precios_list = [float(p.precio) for p in precios]
-                    producto_dict['precio_minimo'] = min(precios_list)
-                    producto_dict['precio_maximo'] = max(precios_list)
-                    producto_dict['precio_promedio'] = round(sum(precios_list) / len(precios_list), 2)
-                else:
-                    producto_dict['precio_minimo'] = None
-                    producto_dict['precio_maximo'] = None
-                    producto_dict['precio_promedio'] = None
-                
-                return Response(producto_dict)
+                producto = queryset.get(pk=producto_id)
+                return Response(serializar_producto(producto))
             except Producto.DoesNotExist:
                 return Response({'error': 'Producto no encontrado'}, status=404)
         
-        # Filtro por categoría
-        categoria = request.query_params.get('categoria')
-        if categoria:
-            queryset = queryset.filter(categoria__icontains=categoria)
-        
-        # Filtro por requiere_receta
-        requiere_receta = request.query_params.get('requiere_receta')
-        if requiere_receta:
-            requiere = requiere_receta.lower() in ['true', '1', 'yes']
-            queryset = queryset.filter(requiere_receta=requiere)
+        # Filtros por categoría, requiere_receta, búsqueda por nombre y con_precios
+        queryset = filtrar_productos(queryset, request.query_params)
         
-        # Búsqueda por nombre
-        search = request.query_params.get('search')
-        if search:
-            queryset = queryset.filter(
-                Q(nombre_generico__icontains=search) | 
-                Q(nombre_comercial__icontains=search) |
-                Q(principio_activo__icontains=search)
+        try:
+            pagina, paginacion = paginar(
+                queryset, request.query_params, **orden_catalogo(request.query_params)
             )
+        except CursorInvalido as e:
+            return Response({'error': str(e)}, status=400)
         
-        # Filtro: solo productos con precios
-        con_precios = request.query_params.get('con_precios')
-        if con_precios and con_precios.lower() == 'true':
-            queryset = queryset.filter(precios_por_farmacia__isnull=False).distinct()
-        
-        # Construir respuesta con precios
-        productos_data = []
-        for producto in queryset:
-            producto_dict = ProductoSerializer(producto).data
-            
-            # Agregar precios por farmacia
-            precios = ProductoFarmacia.objects.filter(
-                producto=producto
-            ).select_related('farmacia')
-            
-            producto_dict['precios_por_farmacia'] = ProductoFarmaciaSerializer(
-                precios, many=True
-            ).data
-            
-            # Estadísticas de precio
-            if precios.exists():
-                precios_list = [float(p.precio) for p in precios]
-                producto_dict['precio_minimo'] = min(precios_list)
-                producto_dict['precio_maximo'] = max(precios_list)
-                producto_dict['precio_promedio'] = round(sum(precios_list) / len(precios_list), 2)
-            else:
-                producto_dict['precio_minimo'] = None
-                producto_dict['precio_maximo'] = None
-                producto_dict['precio_promedio'] = None
-            
-            productos_data.append(producto_dict)
+        # Construir respuesta con precios (número fijo de consultas)
+        productos_data = serializar_catalogo(pagina)
         
         return Response({
             'success': True,
             'productos': productos_data,
-            'total': len(productos_data)
+            'total': len(productos_data),
+            'paginacion': paginacion
+        })
+    
+    except Exception as e:
+        return Response({'error': f'Error en el servidor: {str(e)}'}, status=500)
+
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def productos_autocomplete(request):
+    """
+    GET: Sugerencias de medicamentos mientras el usuario escribe.
+    Se resuelve con un índice en memoria del proceso (sin consultar la base de datos).
+    
+    Parámetros:
+    - q: texto escrito (requerido). Ej: /productos/autocomplete/?q=parac
+    - limit: número de sugerencias (por defecto 10, máximo 50)
+    """
+    try:
+        texto = request.query_params.get('q', '').strip()
+        if not texto:
+            return Response({'error': 'Se requiere el parámetro "q"'}, status=400)
+        
+        try:
+            limite = int(request.query_params.get('limit', LIMITE_POR_DEFECTO))
+        except ValueError:
+            return Response({'error': 'El parámetro "limit" debe ser un entero'}, status=400)
+        
+        resultados, tiempo_ms = autocompletar(texto, max(limite, 1))
+        
+        return Response({
+            'success': True,
+            'resultados': resultados,
+            'total': len(resultados),
+            'tiempo_ms': tiempo_ms,
+            'indice': indice_autocompletado.estadisticas()
+        })
+    
+    except Exception as e:
+        return Response({'error': f'Error en el servidor: {str(e)}'}, status=500)
+
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def mejores_opciones_producto(request, pk):
+    """
+    GET: Mejores farmacias para comprar un producto según precio y distancia.
+    Cada farmacia se evalúa con su sucursal más cercana y puntaje = precio + peso_km * distancia_km.
+    
+    Parámetros:
+    - lat, lng: ubicación del usuario en grados decimales (requeridos)
+    - n: número de opciones (por defecto 5, máximo 50)
+    - peso_km: costo asignado a cada km de distancia (por defecto 0.5; 0 = solo precio)
+    - radio_km: distancia máxima a la sucursal (por defecto 25, máximo 100)
+    
+    Ejemplo: /productos/5/mejores-opciones/?lat=-2.17&lng=-79.92&n=3&peso_km=0.3
+    """
+    try:
+        try:
+            lat, lng, n, peso_km, radio_km = parsear_parametros(request.query_params)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=400)
+        
+        producto = Producto.objects.filter(pk=pk).values('id_producto', 'nombre_comercial').first()
+        if producto is None:
+            return Response({'error': 'Producto no encontrado'}, status=404)
+        
+        opciones, busqueda = mejores_opciones(pk, lat, lng, n, peso_km, radio_km)
+        
+        return Response({
+            'success': True,
+            'producto': producto,
+            'opciones': opciones,
+            'total': len(opciones),
+            'criterio': {'peso_km': peso_km, 'radio_km': radio_km},
+            'busqueda': busqueda
         })
     
     except Exception as e:
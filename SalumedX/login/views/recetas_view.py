@@ -3,6 +3,8 @@ from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from login.models import Receta, Medico, Paciente, Producto, DetalleReceta
 from login.serializers import RecetaSerializer
+from login.services.campos import opciones_serializacion, optimizar_queryset
+from login.services.optimizador_recetas import optimizar_receta, obtener_k
 from datetime import date
 
 
@@ -13,6 +15,7 @@ def recetas(request):
     GET: devuelve las recetas del médico autenticado O del paciente autenticado.
     - Médicos: ven las recetas que ellos escribieron
     - Pacientes: ven las recetas que les escribieron
+    Acepta ?fields= y ?expand= (p. ej. ?fields=id_receta,fecha_emision,detalles&expand=detalles.producto)
     
     POST: crea una receta (solo para médicos). Formato esperado (JSON):
     {
@@ -28,32 +31,35 @@ def recetas(request):
     }
     """
     try:
-        user = request.user
+        principal = request.principal
 
         # GET: listar recetas según tipo de usuario
         if request.method == 'GET':
             # Determinar si es médico o paciente
-            if hasattr(user, 'medico'):
+            if principal.es_medico:
                 # Médico: ver las recetas que él escribió
-                recetas_qs = Receta.objects.filter(medico=user.medico)
-            elif hasattr(user, 'paciente'):
+                recetas_qs = Receta.objects.filter(medico_id=principal.perfil_id)
+            elif principal.es_paciente:
                 # Paciente: ver las recetas que le escribieron
-                recetas_qs = Receta.objects.filter(paciente=user.paciente)
+                recetas_qs = Receta.objects.filter(paciente_id=principal.perfil_id)
             else:
                 return Response({'error': 'Usuario sin perfil de médico o paciente'}, status=403)
             
+            opciones = opciones_serializacion(request.query_params)
+            recetas_qs = optimizar_queryset(recetas_qs, RecetaSerializer(**opciones))
+            
             # Filtro por ID de receta específica
             receta_id = request.query_params.get('id')
             if receta_id:
                 try:
                     receta = recetas_qs.get(pk=receta_id)
-                    return Response({'receta': RecetaSerializer(receta).data})
+                    return Response({'receta': RecetaSerializer(receta, **opciones).data})
                 except Receta.DoesNotExist:
                     return Response({'error': 'Receta no encontrada o no tienes permiso para verla'}, status=404)
             
             # Filtro por paciente (solo para médicos)
             paciente_id = request.query_params.get('paciente')
-            if paciente_id and hasattr(user, 'medico'):
+            if paciente_id and principal.es_medico:
                 recetas_qs = recetas_qs.filter(paciente_id=paciente_id)
             
             # Filtro por fecha
@@ -61,11 +67,11 @@ def recetas(request):
             if fecha:
                 recetas_qs = recetas_qs.filter(fecha_emision=fecha)
             
-            data = RecetaSerializer(recetas_qs, many=True).data
+            data = RecetaSerializer(recetas_qs, many=True, **opciones).data
             return Response({'recetas': data, 'total': len(data)})
 
         # POST: crear receta (solo médicos)
-        if not hasattr(user, 'medico'):
+        if not principal.es_medico:
             return Response({'error': 'Solo los médicos pueden crear recetas.'}, status=403)
         payload = request.data
         paciente_id = payload.get('paciente') or payload.get('paciente_id')
@@ -83,7 +89,7 @@ def recetas(request):
         ubicacion_emision = payload.get('ubicacion_emision', '')
 
         receta = Receta.objects.create(
-            medico=user.medico,
+            medico_id=principal.perfil_id,
             paciente=paciente,
             fecha_emision=fecha_emision,
             diagnostico=diagnostico,
@@ -116,4 +122,38 @@ def recetas(request):
         return Response({'success': True, 'receta': result})
     
     except Exception as e:
-        return Response({'error': f'Error en el servidor: {str(e)}'}, status=500)
\ No newline at end of file
+        return Response({'error': f'Error en el servidor: {str(e)}'}, status=500)
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def optimizar_compra_receta(request, pk):
+    """
+    GET /recetas/<id>/optimizar/?k=2
+    Dónde comprar todos los medicamentos de la receta:
+    - farmacia_unica: la farmacia que vende todo con el menor total (cantidad x precio)
+    - plan_dividido: el menor total repartiendo la compra entre como máximo k farmacias
+    
+    Solo el médico que escribió la receta o el paciente al que pertenece pueden consultarla.
+    """
+    try:
+        principal = request.principal
+        if principal.es_medico:
+            recetas_qs = Receta.objects.filter(medico_id=principal.perfil_id)
+        elif principal.es_paciente:
+            recetas_qs = Receta.objects.filter(paciente_id=principal.perfil_id)
+        else:
+            return Response({'error': 'Usuario sin perfil de médico o paciente'}, status=403)
+        
+        try:
+            k = obtener_k(request.query_params)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=400)
+        
+        if not recetas_qs.filter(pk=pk).exists():
+            return Response({'error': 'Receta no encontrada o no tienes permiso para verla'}, status=404)
+        
+        resultado = optimizar_receta(pk, k)
+        return Response({'success': True, 'receta': pk, **resultado})
+    
+    except Exception as e:
+        return Response({'error': f'Error en el servidor: {str(e)}'}, status=500)
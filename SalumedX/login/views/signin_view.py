@@ -2,7 +2,7 @@ from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import AllowAny
 from rest_framework.response import Response
 from django.contrib.auth import authenticate, login
-from rest_framework_simplejwt.tokens import RefreshToken
+from login.services.principal import resolver_principal, tokens_para
 
 @api_view(['POST'])
 @permission_classes([AllowAny])
@@ -19,29 +19,29 @@ def signin(request):
             # Crear sesión (para soporte de cookies)
             login(request, user)
             
-            # Generar tokens JWT (para API/GraphQL)
-            refresh = RefreshToken.for_user(user)
-            
-            # Determinar tipo de usuario
-            tipo_usuario = None
+            # Determinar tipo de usuario (una consulta con ambos perfiles)
+            principal = resolver_principal(user)
+            tipo_usuario = principal.tipo
+            perfil = principal.perfil()
             perfil_data = None
             
-            if hasattr(user, 'medico'):
-                tipo_usuario = 'medico'
+            if principal.es_medico:
                 perfil_data = {
-                    'numero_licencia': user.medico.numero_licencia,
-                    'institucion': user.medico.institucion,
-                    'ubicacion_consultorio': user.medico.ubicacion_consultorio
+                    'numero_licencia': perfil.numero_licencia,
+                    'institucion': perfil.institucion,
+                    'ubicacion_consultorio': perfil.ubicacion_consultorio
                 }
-            elif hasattr(user, 'paciente'):
-                tipo_usuario = 'paciente'
+            elif principal.es_paciente:
                 perfil_data = {
-                    'cedula': user.paciente.cedula,
-                    'fecha_nacimiento': str(user.paciente.fecha_nacimiento),
-                    'direccion': user.paciente.direccion,
-                    'telefono': user.paciente.telefono
+                    'cedula': perfil.cedula,
+                    'fecha_nacimiento': str(perfil.fecha_nacimiento),
+                    'direccion': perfil.direccion,
+                    'telefono': perfil.telefono
                 }
             
+            # Generar tokens JWT (para API/GraphQL), con el rol en los claims
+            refresh = tokens_para(user, principal)
+            
             return Response({
                 "success": True,
                 "message": "Login exitoso",
@@ -3,9 +3,9 @@ from rest_framework.permissions import AllowAny
 from rest_framework.response import Response
 from django.contrib.auth.models import User
 from django.db import IntegrityError
-from rest_framework_simplejwt.tokens import RefreshToken
 from login.models import Medico, Paciente
 from login.serializers import MedicoSerializer, PacienteSerializer, UserSerializer
+from login.services.principal import MEDICO, PACIENTE, Principal, tokens_para
 
 @api_view(['POST'])
 @permission_classes([AllowAny])
@@ -43,7 +43,7 @@ def signup(request):
                                            institucion=institucion, ubicacion_consultorio=ubicacion)
             
             # Generar tokens JWT
-            refresh = RefreshToken.for_user(user)
+            refresh = tokens_para(user, Principal(user.pk, MEDICO, medico.pk, medico))
             
             return Response({
                 'success': True,
@@ -61,7 +61,7 @@ def signup(request):
                                                cedula=cedula, direccion=direccion, telefono=telefono)
             
             # Generar tokens JWT
-            refresh = RefreshToken.for_user(user)
+            refresh = tokens_para(user, Principal(user.pk, PACIENTE, paciente.pk, paciente))
             
             return Response({
                 'success': True,
@@ -0,0 +1,40 @@
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import AllowAny
+from rest_framework.response import Response
+from login.services.paginacion import CursorInvalido
+from login.services.sincronizacion import cambios_precios, SincronizacionExpirada
+
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def sincronizar_precios(request):
+    """
+    GET /sync/precios/?since=<fecha ISO>
+    Cambios de precios (creados, actualizados y eliminados) posteriores a 'since',
+    en orden cronológico, para clientes que mantienen una copia local del catálogo.
+    
+    Ejemplos:
+    /sync/precios/                                  (sincronización inicial)
+    /sync/precios/?since=2025-01-31T10:00:00Z
+    /sync/precios/?cursor=<next_cursor>&limit=500
+    
+    El cliente guarda 'next_cursor' (siempre presente) y lo envía en la próxima
+    sincronización; mientras has_more sea true hay más cambios disponibles ya.
+    Responde 410 si la posición es más antigua que la retención de eliminaciones.
+    """
+    try:
+        try:
+            cambios, sincronizacion = cambios_precios(request.query_params)
+        except CursorInvalido as e:
+            return Response({'error': str(e)}, status=400)
+        except SincronizacionExpirada as e:
+            return Response({'error': str(e)}, status=410)
+        
+        return Response({
+            'success': True,
+            'cambios': cambios,
+            'total': len(cambios),
+            'sincronizacion': sincronizacion,
+        })
+    except Exception as e:
+        return Response({'error': str(e)}, status=500)
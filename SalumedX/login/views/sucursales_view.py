@@ -1,12 +1,20 @@
+import time
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import AllowAny
 from rest_framework.response import Response
 from login.models import Sucursal, Farmacia
 from login.serializers import SucursalSerializer
+from login.services.paginacion import paginar, CursorInvalido
+from login.services.cache_respuestas import cache_respuesta
+from login.services.serializacion_rapida import serializar_rapido
+from login.services.cercania import sucursales_cercanas_bd
+from login.services.indice_geografico import EN_MEMORIA, indice_sucursales, parsear_coordenadas, sucursales_cercanas
+from login.services.mapa_sucursales import mapa_sucursales, parsear_vista, vista_mapa
 
 
 @api_view(['GET'])
 @permission_classes([AllowAny])
+@cache_respuesta('sucursales', (Sucursal, Farmacia))
 def sucursales(request):
     """
     GET: Devuelve todas las sucursales disponibles.
@@ -16,16 +24,17 @@ def sucursales(request):
     - ubicacion: /sucursales/?ubicacion=Guayaquil
     
     Incluye información completa de la farmacia asociada.
+    Paginación por cursor: ?limit=50&cursor=<next_cursor>
     """
     try:
-        queryset = Sucursal.objects.all()
+        queryset = Sucursal.objects.select_related('farmacia')
         
         # Filtro por id
         sucursal_id = request.query_params.get('id')
         if sucursal_id:
             try:
-                sucursal = Sucursal.objects.get(pk=sucursal_id)
-                return Response(SucursalSerializer(sucursal).data)
+                sucursal = queryset.get(pk=sucursal_id)
+                return Response(serializar_rapido(sucursal, SucursalSerializer, many=False))
             except Sucursal.DoesNotExist:
                 return Response({'error': 'Sucursal no encontrada'}, status=404)
         
@@ -39,8 +48,93 @@ def sucursales(request):
         if ubicacion:
             queryset = queryset.filter(ubicacion__icontains=ubicacion)
         
-        data = SucursalSerializer(queryset, many=True).data
-        return Response({'sucursales': data, 'total': len(data)})
+        try:
+            pagina, paginacion = paginar(queryset, request.query_params)
+        except CursorInvalido as e:
+            return Response({'error': str(e)}, status=400)
+        
+        data = serializar_rapido(pagina, SucursalSerializer)
+        return Response({'sucursales': data, 'total': len(data), 'paginacion': paginacion})
+    
+    except Exception as e:
+        return Response({'error': f'Error en el servidor: {str(e)}'}, status=500)
+
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def sucursales_cercanas_view(request):
+    """
+    GET: Sucursales más cercanas a un punto, ordenadas por distancia.
+    Se resuelve con un índice espacial en memoria del proceso (sin consultar la base de datos),
+    o con la columna geohash indexada si INDICE_GEOGRAFICO['EN_MEMORIA'] es False.
+    
+    Parámetros:
+    - lat, lng: coordenadas en grados decimales (requeridos)
+    - k: número de sucursales (por defecto 10, máximo 100)
+    - radio_km: solo sucursales a menos de esta distancia (opcional)
+    
+    Ejemplo: /sucursales/cercanas/?lat=-2.17&lng=-79.92&k=5&radio_km=3
+    """
+    try:
+        try:
+            lat, lng, k, radio_km = parsear_coordenadas(request.query_params)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=400)
+        
+        if not EN_MEMORIA:
+            inicio = time.perf_counter()
+            resultados = sucursales_cercanas_bd(lat, lng, k, radio_km)
+            return Response({
+                'success': True,
+                'sucursales': resultados,
+                'total': len(resultados),
+                'tiempo_ms': round((time.perf_counter() - inicio) * 1000, 3),
+                'indice': None
+            })
+        
+        resultados, tiempo_ms = sucursales_cercanas(lat, lng, k, radio_km)
+        
+        return Response({
+            'success': True,
+            'sucursales': resultados,
+            'total': len(resultados),
+            'tiempo_ms': tiempo_ms,
+            'indice': indice_sucursales.estadisticas()
+        })
+    
+    except Exception as e:
+        return Response({'error': f'Error en el servidor: {str(e)}'}, status=500)
+
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def sucursales_mapa_view(request):
+    """
+    GET: Sucursales agrupadas para mostrar en un mapa.
+    Devuelve grupos (cantidad y centroide) precalculados en memoria para el zoom pedido;
+    las sucursales individuales solo con zoom alto o en grupos de una sola sucursal.
+    
+    Parámetros:
+    - zoom: nivel de zoom del mapa, 0 a 22 (requerido)
+    - bbox: vista como oeste,sur,este,norte en grados decimales (opcional, por defecto el mundo)
+    
+    Ejemplo: /sucursales/mapa/?bbox=-80.1,-2.3,-79.8,-2.0&zoom=12
+    """
+    try:
+        try:
+            sur, oeste, norte, este, zoom = parsear_vista(request.query_params)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=400)
+        
+        vista, tiempo_ms = vista_mapa(sur, oeste, norte, este, zoom)
+        
+        return Response({
+            'success': True,
+            'zoom': zoom,
+            **vista,
+            'tiempo_ms': tiempo_ms,
+            'indice': mapa_sucursales.estadisticas()
+        })
     
     except Exception as e:
         return Response({'error': f'Error en el servidor: {str(e)}'}, status=500)
@@ -148,12 +148,135 @@ CORS_ALLOW_CREDENTIALS = True
 # Soporta tanto JWT (para Sinatra/GraphQL) como Session (para frontend local durante migración)
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'login.authentication.JWTMiddlewareAuthentication',  # Reutiliza el JWT validado por login.middleware
         'rest_framework.authentication.SessionAuthentication',  # ⬅️ Agregado para soporte de cookies
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticatedOrReadOnly',
     ],
+    # JSON con orjson si está instalado; si no, json estándar (ver login/renderers.py y login/parsers.py)
+    'DEFAULT_RENDERER_CLASSES': [
+        'login.renderers.JSONRapidoRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'login.parsers.JSONRapidoParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
+}
+
+# Caché
+# Por defecto memoria local (por proceso). Con REDIS_URL se usa Redis compartido entre
+# workers (requiere el paquete 'redis', no incluido en requirements.txt).
+# Las versiones que invalidan la caché de respuestas están en la base de datos
+# (login.models.VersionModelo), así que la memoria local no deja datos viejos en otros workers.
+if os.getenv('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.getenv('REDIS_URL'),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'salumedx',
+            'OPTIONS': {'MAX_ENTRIES': 2000},
+        }
+    }
+
+# Caché de respuestas de los endpoints públicos de lectura (ver login/services/cache_respuestas.py)
+CACHE_RESPUESTAS = {
+    'ALIAS': 'default',
+    'TIMEOUT': int(os.getenv('CACHE_RESPUESTAS_TIMEOUT', '600')),  # Segundos
+}
+
+# Cachés por proceso de la autenticación JWT (ver login/services/cache_autenticacion.py)
+CACHE_AUTENTICACION = {
+    'MAX_USUARIOS': int(os.getenv('CACHE_USUARIOS_MAX', '10000')),  # Usuarios guardados (LRU)
+    'TTL_USUARIO_SEGUNDOS': int(os.getenv('CACHE_USUARIOS_TTL', '60')),  # Demora máxima de cambios hechos en otro worker
+    'MAX_TOKENS': int(os.getenv('CACHE_TOKENS_MAX', '10000')),  # Tokens verificados guardados (LRU)
+    'TTL_TOKEN_SEGUNDOS': 5 * 3600,  # Tope; cada token se guarda hasta su 'exp'
+}
+
+# Paginación por cursor de los listados del catálogo (ver login/services/paginacion.py)
+PAGINACION_CATALOGO = {
+    'PAGE_SIZE': int(os.getenv('CATALOGO_PAGE_SIZE', '50')),       # Filas por página si no se envía ?limit=
+    'MAX_PAGE_SIZE': int(os.getenv('CATALOGO_MAX_PAGE_SIZE', '500')),  # Límite superior para ?limit=
+}
+
+# Índice en memoria de /productos/autocomplete/ (ver login/services/autocompletado.py)
+AUTOCOMPLETADO = {
+    'TTL_SEGUNDOS': int(os.getenv('AUTOCOMPLETADO_TTL', '300')),  # Reconstrucción completa periódica
+    'LIMITE': 10,          # Sugerencias por defecto
+    'LIMITE_MAXIMO': 50,   # Máximo permitido en ?limit=
+}
+
+# Índice en memoria de ?search=...&fuzzy=true (ver login/services/busqueda_difusa.py)
+BUSQUEDA_DIFUSA = {
+    'TTL_SEGUNDOS': int(os.getenv('BUSQUEDA_DIFUSA_TTL', '300')),
+    'MAX_RESULTADOS': 200,  # Máximo de productos candidatos por búsqueda
+}
+
+# Índice espacial en memoria de /sucursales/cercanas/ (ver login/services/indice_geografico.py)
+INDICE_GEOGRAFICO = {
+    'TTL_SEGUNDOS': int(os.getenv('INDICE_GEOGRAFICO_TTL', '300')),  # Reconstrucción completa periódica
+    'K': 10,                  # Sucursales por defecto
+    'K_MAXIMO': 100,          # Máximo permitido en ?k=
+    'RADIO_MAXIMO_KM': 100,   # Máximo permitido en ?radio_km=
+    # False: /sucursales/cercanas/ consulta la base de datos (geohash + caja) en vez de
+    # armar el índice en cada proceso; conviene en workers de vida corta
+    'EN_MEMORIA': os.getenv('INDICE_GEOGRAFICO_EN_MEMORIA', 'True') == 'True',
+}
+
+# Grupos de sucursales de /sucursales/mapa/ (ver login/services/mapa_sucursales.py)
+MAPA_SUCURSALES = {
+    'TTL_SEGUNDOS': int(os.getenv('MAPA_SUCURSALES_TTL', '300')),  # Reconstrucción completa periódica
+    'MAX_CELDAS': 400,    # Máximo de grupos por respuesta
+    'MAX_PUNTOS': 500,    # Máximo de sucursales individuales por respuesta
+    'ZOOM_PUNTOS': 15,    # Desde este zoom se devuelven las sucursales en lugar de grupos
+}
+
+# Serialización precompilada de los listados de Producto/ProductoFarmacia/Sucursal
+# (ver login/services/serializacion_rapida.py)
+SERIALIZACION_RAPIDA = {
+    'ACTIVA': os.getenv('SERIALIZACION_RAPIDA', 'True') == 'True',
+}
+
+# Exportación en streaming /export/productos.ndjson y /export/precios.csv
+# (ver login/services/exportacion.py)
+EXPORTACION = {
+    'CHUNK_SIZE': 2000,        # Filas por bloque leídas de la base de datos
+    'LINEAS_POR_BLOQUE': 200,  # Líneas por escritura al cliente
+}
+
+# GET /recetas/<id>/optimizar/ (ver login/services/optimizador_recetas.py)
+OPTIMIZADOR_RECETAS = {
+    'K_POR_DEFECTO': 2,    # Farmacias del plan dividido si no se envía ?k=
+    'K_MAXIMO': 3,            # Con k = 3 y cientos de farmacias la búsqueda ya puede llegar al límite de tiempo
+    'TIEMPO_MAXIMO_MS': 500,  # Límite de la búsqueda; al alcanzarlo se devuelve la mejor solución encontrada
+}
+
+# POST /comparar-precios/lote/ (ver login/services/catalogo.py)
+COMPARACION_PRECIOS = {
+    'MAX_ITEMS_LOTE': 100,  # Items por solicitud
+}
+
+# GET /productos/<id>/mejores-opciones/ (ver login/services/mejores_opciones.py)
+MEJORES_OPCIONES = {
+    'N': 5,                  # Opciones por defecto
+    'N_MAXIMO': 50,
+    'PESO_KM': 0.5,          # Costo por km en el puntaje (precio + PESO_KM * distancia_km)
+    'RADIO_KM': 25,          # Distancia máxima a la sucursal por defecto
+    'RADIO_MAXIMO_KM': 100,
+}
+
+# Sincronización incremental /sync/precios/ (ver login/services/sincronizacion.py)
+SINCRONIZACION = {
+    'MARGEN_SEGUNDOS': 5,  # Los cambios más recientes que esto se entregan en la próxima sincronización
+    'RETENCION_DIAS': int(os.getenv('SINCRONIZACION_RETENCION_DIAS', '90')),  # Conservación de eliminaciones
 }
 
 # Configuración de JWT
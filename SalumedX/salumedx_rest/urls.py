@@ -20,12 +20,13 @@ from django.contrib import admin
 from django.urls import path, include
 from rest_framework_simplejwt.views import TokenRefreshView
 from login.views import (
-    home, signup, tasks, signout, signin, recetas, 
+    home, signup, tasks, signout, signin, recetas, optimizar_compra_receta,
     detalle_prescripcion, paciente_info, medico_info,
-    productos, farmacias, sucursales,
-    signin_proxy, signup_proxy, token_status
+    productos, productos_autocomplete, mejores_opciones_producto, farmacias, sucursales, sucursales_cercanas_view, sucursales_mapa_view,
+    signin_proxy, signup_proxy, token_status,
+    exportar_productos_ndjson, exportar_precios_csv, sincronizar_precios
 )
-from login.views.producto_farmacia_view import producto_farmacia_list, comparar_precios
+from login.views.producto_farmacia_view import producto_farmacia_list, comparar_precios, comparar_precios_lote_view
 from login.views.admin_api_view import (
     admin_productos_list, admin_farmacias_list, 
     admin_producto_farmacia, admin_producto_farmacia_delete,
@@ -52,14 +53,27 @@ urlpatterns = [
     # Endpoints principales
     path('tasks/', tasks, name='tasks'),
     path('recetas/', recetas, name='recetas'),
+    path('recetas/<int:pk>/optimizar/', optimizar_compra_receta, name='optimizar_compra_receta'),
     path('detalle-prescripcion/', detalle_prescripcion, name='detalle_prescripcion'),
     path('paciente-info/', paciente_info, name='paciente_info'),
     path('medico-info/', medico_info, name='medico_info'),
     path('productos/', productos, name='productos'),
+    path('productos/autocomplete/', productos_autocomplete, name='productos_autocomplete'),
+    path('productos/<int:pk>/mejores-opciones/', mejores_opciones_producto, name='mejores_opciones_producto'),
     path('farmacias/', farmacias, name='farmacias'),
     path('sucursales/', sucursales, name='sucursales'),
+    path('sucursales/cercanas/', sucursales_cercanas_view, name='sucursales_cercanas'),
+    path('sucursales/mapa/', sucursales_mapa_view, name='sucursales_mapa'),
     path('productos-farmacias/', producto_farmacia_list, name='producto_farmacia_list'),
     path('comparar-precios/', comparar_precios, name='comparar_precios'),
+    path('comparar-precios/lote/', comparar_precios_lote_view, name='comparar_precios_lote'),
+    
+    # Exportación completa en streaming
+    path('export/productos.ndjson', exportar_productos_ndjson, name='exportar_productos_ndjson'),
+    path('export/precios.csv', exportar_precios_csv, name='exportar_precios_csv'),
+    
+    # Sincronización incremental de precios (clientes offline)
+    path('sync/precios/', sincronizar_precios, name='sincronizar_precios'),
 
     # API endpoints para admin (requieren JWT + is_staff)
     path('api/admin/health/', admin_health_check, name='admin_health_check'),  # Público - para testing